@@ -0,0 +1,11 @@
+"""
+Throughput benchmarks for SuperMock
+
+Measures requests per second and latency of the Bot API endpoints, both
+in-process and over loopback, and compares runs against saved baselines.
+
+Run from the repository root:
+
+    python -m benchmarks run --output benchmarks/results/baseline.json
+    python -m benchmarks compare benchmarks/results/baseline.json benchmarks/results/latest.json
+"""
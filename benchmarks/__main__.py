@@ -0,0 +1,84 @@
+"""
+Command-line entry point for the SuperMock benchmarks
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+from .compare import compare_results, format_rows, load_results
+from .suite import BENCHMARKS, TRANSPORTS, run_suite
+
+
+DEFAULT_OUTPUT = Path(__file__).resolve().parent / 'results' / 'latest.json'
+
+
+def run(args):
+    """Run the suite and save the results"""
+    transports = TRANSPORTS if args.transport == 'both' else (args.transport,)
+
+    def progress(entry):
+        if 'latency_ms' in entry:
+            latency = entry['latency_ms']
+            print(f"{entry['name']:<34} {entry['transport']:<10} {entry['ops_per_s']:>10}/s  "
+                  f"p50 {latency['p50']:.3f}ms  p99 {latency['p99']:.3f}ms")
+        else:
+            print(f"{entry['name']:<34} {entry['transport']:<10} {entry['bytes_per_message']:>10} bytes/message")
+
+    results = run_suite(transports, iterations=args.iterations, only=args.only, progress=progress)
+
+    output = Path(args.output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"\n📝 Results written to {output}")
+
+
+def compare(args):
+    """Compare two saved runs; exit with status 1 on regressions"""
+    rows = compare_results(load_results(args.baseline), load_results(args.current), threshold=args.threshold)
+    print(format_rows(rows))
+
+    regressions = [row for row in rows if row['regression']]
+    if regressions:
+        print(f"\n❌ {len(regressions)} regression(s) beyond {args.threshold:.0%}")
+        sys.exit(1)
+    print(f"\n✅ No regressions beyond {args.threshold:.0%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks',
+        description='SuperMock endpoint throughput benchmarks'
+    )
+    subparsers = parser.add_subparsers(dest='command', help='Command to run')
+
+    run_parser = subparsers.add_parser('run', help='Run the benchmarks and save the results as JSON')
+    run_parser.add_argument('--transport', choices=list(TRANSPORTS) + ['both'], default='both',
+                            help='Route requests in-process, over loopback, or both (default: both)')
+    run_parser.add_argument('--iterations', type=int, default=2000,
+                            help='Requests per measured case (default: 2000)')
+    run_parser.add_argument('--only', nargs='+', choices=list(BENCHMARKS), default=None,
+                            help='Run only these benchmarks')
+    run_parser.add_argument('--output', type=str, default=str(DEFAULT_OUTPUT),
+                            help='Results file (default: benchmarks/results/latest.json)')
+
+    compare_parser = subparsers.add_parser('compare', help='Flag regressions between two saved runs')
+    compare_parser.add_argument('baseline', help='Baseline results file')
+    compare_parser.add_argument('current', help='Results file to check')
+    compare_parser.add_argument('--threshold', type=float, default=0.10,
+                                help='Relative change counted as a regression (default: 0.10)')
+
+    args = parser.parse_args()
+    if args.command == 'run':
+        run(args)
+    elif args.command == 'compare':
+        compare(args)
+    else:
+        parser.print_help()
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
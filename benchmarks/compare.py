@@ -0,0 +1,97 @@
+"""
+Regression checks between two benchmark runs
+
+Matches results by name and transport and flags throughput drops, latency
+increases and memory growth beyond a relative threshold.
+"""
+
+import json
+from pathlib import Path
+from typing import Dict, List, Any, Tuple, Union
+
+
+# Metric -> True if higher is better
+METRICS = {
+    'ops_per_s': True,
+    'p50_ms': False,
+    'p99_ms': False,
+    'bytes_per_message': False
+}
+
+
+def load_results(path: Union[str, Path]) -> Dict[str, Any]:
+    """Read a results document written by `python -m benchmarks run`"""
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _metrics(entry: Dict[str, Any]) -> Dict[str, float]:
+    """Comparable metrics of one result entry"""
+    metrics = {}
+    if 'latency_ms' in entry:
+        metrics['ops_per_s'] = entry['ops_per_s']
+        metrics['p50_ms'] = entry['latency_ms']['p50']
+        metrics['p99_ms'] = entry['latency_ms']['p99']
+    if 'bytes_per_message' in entry:
+        metrics['bytes_per_message'] = entry['bytes_per_message']
+    return metrics
+
+
+def compare_results(baseline: Dict[str, Any], current: Dict[str, Any],
+                    threshold: float = 0.10) -> List[Dict[str, Any]]:
+    """
+    Compare every metric present in both runs
+
+    Args:
+        baseline: Results document to compare against
+        current: Results document of the new run
+        threshold: Relative change counted as a regression, e.g. 0.10 for 10%
+
+    Returns:
+        One row per metric with baseline and current values, the relative
+        change (positive is worse) and a regression flag
+    """
+    if threshold < 0:
+        raise ValueError("threshold must not be negative")
+
+    baseline_entries: Dict[Tuple[str, str], Dict[str, Any]] = {
+        (entry['name'], entry['transport']): entry for entry in baseline.get('results', [])
+    }
+    rows = []
+    for entry in current.get('results', []):
+        key = (entry['name'], entry['transport'])
+        old = baseline_entries.get(key)
+        if old is None:
+            continue
+        old_metrics = _metrics(old)
+        for metric, value in _metrics(entry).items():
+            if metric not in old_metrics:
+                continue
+            before = old_metrics[metric]
+            if before:
+                change = (value - before) / before
+                worse = -change if METRICS[metric] else change
+            else:
+                worse = 0.0
+            rows.append({
+                "name": key[0],
+                "transport": key[1],
+                "metric": metric,
+                "baseline": before,
+                "current": value,
+                "change": round(worse, 4),
+                "regression": worse > threshold
+            })
+    return rows
+
+
+def format_rows(rows: List[Dict[str, Any]]) -> str:
+    """Render comparison rows as a plain-text table"""
+    lines = [f"{'benchmark':<34} {'transport':<10} {'metric':<18} {'baseline':>12} {'current':>12} {'worse by':>9}"]
+    for row in rows:
+        flag = '  REGRESSION' if row['regression'] else ''
+        lines.append(
+            f"{row['name']:<34} {row['transport']:<10} {row['metric']:<18} "
+            f"{row['baseline']:>12} {row['current']:>12} {row['change']:>+8.1%}{flag}"
+        )
+    return '\n'.join(lines)
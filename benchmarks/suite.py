@@ -0,0 +1,272 @@
+"""
+Benchmark cases for SuperMock
+
+Each case drives a fresh TelegramMockServer through a requests session,
+either routed in-process or over a loopback socket, and reports throughput
+and latency percentiles.
+"""
+
+import gc
+import logging
+import platform
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Any, Optional, Sequence, Tuple
+
+# Benchmarks run from a source checkout
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
+
+from requests import Session  # noqa: E402
+
+from supermock.api import TelegramMockServer, create_session, IN_PROCESS_BASE_URL  # noqa: E402
+from supermock.utils import LatencyHistogram  # noqa: E402
+
+
+TRANSPORTS = ('inprocess', 'loopback')
+
+TOKEN = 'bench_token'
+
+# Format version of saved results
+RESULTS_VERSION = 1
+
+
+@contextmanager
+def connect(transport: str) -> Iterator[Tuple[TelegramMockServer, Session, str]]:
+    """
+    Start a fresh server and open a session to it
+
+    Yields:
+        (server, session, bot base URL)
+    """
+    server = TelegramMockServer(host='127.0.0.1')
+    if transport == 'inprocess':
+        session = create_session(server)
+        base_url = IN_PROCESS_BASE_URL
+    elif transport == 'loopback':
+        host, port = server.start()
+        session = Session()
+        base_url = f"http://{host}:{port}"
+    else:
+        raise ValueError(f"Unknown transport: {transport}")
+    try:
+        yield server, session, f"{base_url}/bot{TOKEN}"
+    finally:
+        session.close()
+        server.stop()
+
+
+def measure(name: str, transport: str, call: Callable[[], Any], iterations: int,
+            warmup: int = 0, **extra: Any) -> Dict[str, Any]:
+    """
+    Time call() iterations times
+
+    Returns:
+        Result with throughput and latency percentiles in milliseconds
+    """
+    for _ in range(warmup):
+        call()
+
+    histogram = LatencyHistogram()
+    clock = time.perf_counter
+    started = clock()
+    for _ in range(iterations):
+        before = clock()
+        call()
+        histogram.record(clock() - before)
+    elapsed = clock() - started
+
+    return result(name, transport, histogram, elapsed, **extra)
+
+
+def result(name: str, transport: str, histogram: LatencyHistogram, elapsed: float, **extra: Any) -> Dict[str, Any]:
+    """Build a result entry from a latency histogram"""
+    summary = histogram.summary()
+    entry = {
+        "name": name,
+        "transport": transport,
+        "ops": histogram.count,
+        "ops_per_s": round(histogram.count / elapsed, 1) if elapsed > 0 else 0.0,
+        "latency_ms": {key: summary[key] for key in ('mean', 'p50', 'p90', 'p99', 'max')}
+    }
+    entry.update(extra)
+    return entry
+
+
+def bench_get_updates(transport: str, iterations: int) -> List[Dict[str, Any]]:
+    """getUpdates with an empty, 1-update and 100-update backlog"""
+    results = []
+    for backlog in (0, 1, 100):
+        with connect(transport) as (server, session, url):
+            for i in range(backlog):
+                server.send_user_message(f"backlog {i}")
+            # Without an offset nothing is confirmed, so every call returns the full backlog
+            results.append(measure(f"getUpdates[backlog={backlog}]", transport,
+                                   lambda: session.post(f"{url}/getUpdates", json={'timeout': 0}),
+                                   iterations, warmup=iterations // 10))
+    return results
+
+
+def bench_send_message(transport: str, iterations: int) -> List[Dict[str, Any]]:
+    """sendMessage with a short text"""
+    with connect(transport) as (server, session, url):
+        payload = {'chat_id': 12345, 'text': 'Benchmark reply'}
+        return [measure("sendMessage", transport, lambda: session.post(f"{url}/sendMessage", json=payload),
+                        iterations, warmup=iterations // 10)]
+
+
+def bench_media(transport: str, iterations: int) -> List[Dict[str, Any]]:
+    """sendPhoto by file ID and sendDocument as a multipart upload"""
+    with connect(transport) as (server, session, url):
+        photo = {'chat_id': 12345, 'photo': 'mock_photo_id', 'caption': 'Photo'}
+        document = b'x' * 16 * 1024
+        return [
+            measure("sendPhoto", transport, lambda: session.post(f"{url}/sendPhoto", json=photo),
+                    iterations, warmup=iterations // 10),
+            measure("sendDocument[multipart 16KiB]", transport,
+                    lambda: session.post(f"{url}/sendDocument", data={'chat_id': '12345'},
+                                         files={'document': ('bench.bin', document)}),
+                    iterations, warmup=iterations // 10)
+        ]
+
+
+def bench_long_poll_wakeup(transport: str, iterations: int) -> List[Dict[str, Any]]:
+    """Time from injecting an update to a waiting long-poll returning it"""
+    iterations = max(1, iterations // 10)
+    histogram = LatencyHistogram()
+    with connect(transport) as (server, session, url):
+        started = time.perf_counter()
+        offset = 0
+        for _ in range(iterations):
+            returned: List[float] = []
+
+            def poll():
+                session.post(f"{url}/getUpdates", json={'offset': offset, 'timeout': 5})
+                returned.append(time.perf_counter())
+
+            poller = threading.Thread(target=poll)
+            poller.start()
+            # Give the request time to reach the wait before injecting
+            time.sleep(0.005)
+            injected_at = time.perf_counter()
+            offset = server.send_user_message("wake")['update_id'] + 1
+            poller.join(10)
+            if returned:
+                histogram.record(returned[0] - injected_at)
+        elapsed = time.perf_counter() - started
+    return [result("getUpdates[long-poll wake-up]", transport, histogram, elapsed)]
+
+
+def bench_history_growth(transport: str, iterations: int) -> List[Dict[str, Any]]:
+    """sendMessage throughput once the history already holds many messages"""
+    results = []
+    payload = {'chat_id': 12345, 'text': 'Benchmark reply'}
+    for size in (0, 50000):
+        with connect(transport) as (server, session, url):
+            for i in range(size):
+                server.send_user_message(f"history {i}")
+            server.updates_queue.clear()
+            results.append(measure(f"sendMessage[history={size}]", transport,
+                                   lambda: session.post(f"{url}/sendMessage", json=payload),
+                                   iterations, warmup=iterations // 10))
+    return results
+
+
+def bench_capture(transport: str, iterations: int) -> List[Dict[str, Any]]:
+    """sendMessage with traffic capture streaming to a gzipped JSON Lines file"""
+    payload = {'chat_id': 12345, 'text': 'Benchmark reply'}
+    with tempfile.TemporaryDirectory() as directory, connect(transport) as (server, session, url):
+        server.capture.start(path=str(Path(directory) / 'capture.jsonl.gz'))
+        try:
+            return [measure("sendMessage[capture=jsonl.gz]", transport,
+                            lambda: session.post(f"{url}/sendMessage", json=payload),
+                            iterations, warmup=iterations // 10)]
+        finally:
+            server.capture.stop()
+
+
+def bench_memory_per_message(transport: str, iterations: int) -> List[Dict[str, Any]]:
+    """Bytes retained per injected user message (history, update queue and tracking)"""
+    count = max(1000, iterations * 10)
+    server = TelegramMockServer()
+    gc.collect()
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        started = time.perf_counter()
+        for i in range(count):
+            server.send_user_message(f"memory {i}")
+        elapsed = time.perf_counter() - started
+        gc.collect()
+        retained = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        if not tracing:
+            tracemalloc.stop()
+    return [{
+        "name": "memory per message",
+        "transport": transport,
+        "ops": count,
+        "ops_per_s": round(count / elapsed, 1) if elapsed > 0 else 0.0,
+        "bytes_per_message": round(retained / count, 1)
+    }]
+
+
+# Name -> (function, runs per transport); memory does not depend on the transport
+BENCHMARKS: Dict[str, Tuple[Callable[[str, int], List[Dict[str, Any]]], bool]] = {
+    'get_updates': (bench_get_updates, True),
+    'send_message': (bench_send_message, True),
+    'media': (bench_media, True),
+    'long_poll': (bench_long_poll_wakeup, True),
+    'history': (bench_history_growth, True),
+    'capture': (bench_capture, True),
+    'memory': (bench_memory_per_message, False)
+}
+
+
+def run_suite(transports: Sequence[str] = TRANSPORTS, iterations: int = 2000,
+              only: Optional[Sequence[str]] = None,
+              progress: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+    """
+    Run the benchmarks
+
+    Args:
+        transports: 'inprocess' and/or 'loopback'
+        iterations: Requests per measured case
+        only: Benchmark names to run (default: all)
+        progress: Called with each result as it is produced
+
+    Returns:
+        Results document with environment details, ready to save as JSON
+    """
+    names = list(only) if only else list(BENCHMARKS)
+    unknown = set(names) - set(BENCHMARKS)
+    if unknown:
+        raise ValueError(f"Unknown benchmarks: {', '.join(sorted(unknown))}")
+
+    # Werkzeug logs every loopback request, which would dominate the timings
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+
+    results = []
+    for name in names:
+        function, per_transport = BENCHMARKS[name]
+        for transport in (transports if per_transport else ['any']):
+            for entry in function(transport, iterations):
+                results.append(entry)
+                if progress is not None:
+                    progress(entry)
+
+    return {
+        "version": RESULTS_VERSION,
+        "created": datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "iterations": iterations,
+        "results": results
+    }
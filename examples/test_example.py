@@ -5,23 +5,15 @@ This example demonstrates how to write automated tests for Telegram bots using S
 """
 
 import pytest
-import threading
-import time
-from supermock.api import TelegramMockServer
+from supermock.api import TelegramMockServer, create_session
 
 
 @pytest.fixture
 def mock_server():
     """Setup and teardown mock server for testing"""
+    # No thread or sleep needed: tests drive the server in-process
     server = TelegramMockServer(host='localhost', port=8082)
     
-    # Start server in background thread
-    server_thread = threading.Thread(target=lambda: server.run(debug=False), daemon=True)
-    server_thread.start()
-    
-    # Wait for server to start
-    time.sleep(1)
-    
     yield server
     
     # Cleanup
@@ -97,5 +89,18 @@ def test_clear_messages(mock_server):
     assert len(mock_server.get_messages_history()) == 0
 
 
+def test_bot_api_in_process(mock_server):
+    """Test calling the Bot API without opening a socket"""
+    session = create_session(mock_server)
+    
+    response = session.post(
+        "http://supermock/bot123456:ABC-DEF/sendMessage",
+        json={"chat_id": 12345, "text": "Hi from the bot"}
+    )
+    
+    assert response.json()["ok"] is True
+    assert mock_server.get_messages_history()[0]["message"]["text"] == "Hi from the bot"
+
+
 if __name__ == '__main__':
     pytest.main([__file__, '-v'])
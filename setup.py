@@ -32,6 +32,9 @@ setup(
         "python-socketio>=5.9.0",
     ],
     extras_require={
+        "httpx": [
+            "httpx>=0.23.0",
+        ],
         "dev": [
             "pytest>=6.0.0",
             "pytest-asyncio>=0.18.0",
@@ -41,5 +44,8 @@ setup(
         "console_scripts": [
             "supermock=supermock.cli:main",
         ],
+        "pytest11": [
+            "supermock=supermock.pytest_plugin",
+        ],
     },
 )
@@ -1,5 +1,11 @@
 """API module for SuperMock"""
 
 from .mock_server import TelegramMockServer
+from .transport import InProcessAdapter, InProcessClient, create_session, IN_PROCESS_BASE_URL
+from .scenario import Scenario, ScenarioRecorder, ScenarioReplayer, replay_report
+from .loadgen import LoadGenerator
+from .session_diff import diff_sessions, format_diff, read_session
 
-__all__ = ['TelegramMockServer']
+__all__ = ['TelegramMockServer', 'InProcessAdapter', 'InProcessClient', 'create_session', 'IN_PROCESS_BASE_URL',
+           'Scenario', 'ScenarioRecorder', 'ScenarioReplayer', 'replay_report', 'LoadGenerator',
+           'diff_sessions', 'format_diff', 'read_session']
@@ -0,0 +1,131 @@
+"""
+Bot API call log for SuperMock
+
+Keeps the most recent Bot API calls and wakes waiters the instant a matching
+call arrives, so tests can wait for bot replies without sleeping.
+"""
+
+import threading
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Hashable, List, Optional, Tuple
+
+
+Call = Dict[str, Any]
+
+
+class CallWaiter:
+    """A pending wait for a matching call"""
+
+    __slots__ = ('match', 'since', 'callback', 'on_error')
+
+    def __init__(self, match: Callable[[Call], bool], since: int, callback: Callable[[Call], None],
+                 on_error: Callable[[Exception], None]):
+        self.match = match
+        self.since = since
+        self.callback = callback
+        self.on_error = on_error
+
+
+class CallLog:
+    """Recent Bot API calls with wait support"""
+
+    def __init__(self, maxlen: int = 10000):
+        self.lock = threading.Lock()
+        self.calls: Deque[Call] = deque(maxlen=maxlen)
+        self.seq = 0
+        self.injection_seq = 0
+        self.cursors: Dict[Hashable, int] = {}
+        self.waiters: List[CallWaiter] = []
+
+    def record(self, call: Call) -> Call:
+        """
+        Number and store a call, then wake the waiters it matches
+
+        Waiter predicates run on the bot's request thread; one that raises
+        is dropped and its waiting caller gets the exception, so the bot's
+        call and the other waiters are unaffected.
+        """
+        matched: List[CallWaiter] = []
+        failed: List[Tuple[CallWaiter, Exception]] = []
+        with self.lock:
+            self.seq += 1
+            call['seq'] = self.seq
+            self.calls.append(call)
+            if self.waiters:
+                for waiter in self.waiters:
+                    try:
+                        if waiter.match(call):
+                            matched.append(waiter)
+                    except Exception as e:
+                        failed.append((waiter, e))
+                for waiter in matched:
+                    self.waiters.remove(waiter)
+                for waiter, _ in failed:
+                    self.waiters.remove(waiter)
+
+        for waiter in matched:
+            waiter.callback(call)
+        for waiter, error in failed:
+            waiter.on_error(error)
+        return call
+
+    def mark_injection(self):
+        """Remember that an update was just injected; later waits start here"""
+        self.injection_seq = self.seq
+
+    def find_or_wait(self, match: Callable[[Call], bool], key: Hashable, since: Optional[int],
+                     callback: Callable[[Call], None],
+                     on_error: Callable[[Exception], None]) -> Tuple[Optional[Call], Optional[CallWaiter]]:
+        """
+        Return a recorded match, or register a waiter for the next one
+
+        Args:
+            match: Call predicate
+            key: Cursor key; consecutive waits on the same key return
+                consecutive matches
+            since: Only consider calls with a greater seq. Defaults to the
+                later of the last injection and the key's cursor.
+            callback: Called with the matching call if none is recorded yet
+            on_error: Called with the exception if match raises on a later call
+
+        Returns:
+            (call, None) if a recorded call matches, else (None, waiter)
+        """
+        with self.lock:
+            if since is None:
+                since = max(self.injection_seq, self.cursors.get(key, 0))
+            for call in self.calls:
+                if call['seq'] > since and match(call):
+                    return call, None
+
+            waiter = CallWaiter(lambda c: c['seq'] > since and match(c), since, callback, on_error)
+            self.waiters.append(waiter)
+            return None, waiter
+
+    def cancel(self, waiter: CallWaiter):
+        """Drop a waiter that timed out"""
+        with self.lock:
+            if waiter in self.waiters:
+                self.waiters.remove(waiter)
+
+    def advance(self, key: Hashable, seq: int):
+        """Move a wait cursor past a returned call"""
+        with self.lock:
+            if seq > self.cursors.get(key, 0):
+                self.cursors[key] = seq
+
+    def resize(self, maxlen: int):
+        """Change how many calls are kept, dropping the oldest beyond it"""
+        with self.lock:
+            if maxlen != self.calls.maxlen:
+                self.calls = deque(self.calls, maxlen=maxlen)
+
+    def copy(self) -> 'CallLog':
+        """Copy the recorded calls and cursors (waiters are not copied)"""
+        log = CallLog(self.calls.maxlen)
+        with self.lock:
+            log.calls = deque(self.calls, maxlen=self.calls.maxlen)
+            log.seq = self.seq
+            log.injection_seq = self.injection_seq
+            log.cursors = dict(self.cursors)
+        return log
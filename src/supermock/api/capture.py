@@ -0,0 +1,261 @@
+"""
+Traffic capture for SuperMock
+
+Records every Bot API request and response (method, token, parameters,
+upload sizes, status, body and timing) into an in-memory ring buffer. A
+background writer streams new records to a JSON Lines or HAR file, gzipped
+when the path ends in .gz, so request threads never wait on disk I/O.
+"""
+
+import gzip
+import itertools
+import json
+import threading
+from collections import deque
+from datetime import datetime, timezone
+from typing import Deque, Dict, Iterable, List, Any, Optional, TextIO
+
+from .ids import normalize_chat_id
+from .. import __version__
+
+
+FORMATS = ('jsonl', 'har')
+
+# Records kept in memory by default
+DEFAULT_CAPACITY = 100000
+
+Record = Dict[str, Any]
+
+
+class TrafficCapture:
+    """Ring buffer of Bot API calls with optional asynchronous file output"""
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY):
+        self.lock = threading.Lock()
+        self.active = False
+        self.capacity = capacity
+        self.ring: Deque[Record] = deque(maxlen=capacity)
+        self.seq = 0
+        self.methods: Optional[frozenset] = None
+        self.chats: Optional[frozenset] = None
+        self.writer: Optional[CaptureWriter] = None
+        self.counters = {"seen": 0, "captured": 0, "filtered": 0}
+
+    def start(self, path: Optional[str] = None, format: str = 'jsonl',
+              methods: Optional[Iterable[str]] = None, chats: Optional[Iterable[Any]] = None,
+              capacity: Optional[int] = None, flush_interval: float = 1.0) -> Dict[str, Any]:
+        """
+        Start capturing, discarding any previous capture
+
+        Args:
+            path: Also stream records to this file (.gz to compress)
+            format: 'jsonl' (one record per line) or 'har' (HTTP Archive)
+            methods: Only capture these Bot API methods (default: all)
+            chats: Only capture calls to these chat IDs (default: all)
+            capacity: Records kept in memory (default: unchanged)
+            flush_interval: Seconds between file writes
+
+        Returns:
+            The capture status
+        """
+        if format not in FORMATS:
+            raise ValueError(f"Unsupported capture format: {format}")
+        self.stop()
+        writer = CaptureWriter(self, path, format, flush_interval) if path else None
+        with self.lock:
+            if capacity is not None:
+                self.capacity = int(capacity)
+            self.ring = deque(maxlen=self.capacity)
+            self.seq = 0
+            self.methods = frozenset(methods) if methods else None
+            self.chats = frozenset(normalize_chat_id(chat) for chat in chats) if chats else None
+            self.counters = {"seen": 0, "captured": 0, "filtered": 0}
+            self.writer = writer
+            self.active = True
+        if writer is not None:
+            writer.start()
+        return self.status()
+
+    def stop(self) -> Dict[str, Any]:
+        """Stop capturing and write out the file; the ring buffer is kept for inspection"""
+        with self.lock:
+            self.active = False
+            writer = self.writer
+            self.writer = None
+        if writer is not None:
+            writer.close()
+        status = self.status()
+        if writer is not None:
+            status["file"] = writer.status()
+        return status
+
+    def wants(self, method: str, chat_id: Any) -> bool:
+        """Whether a call passes the method and chat filters"""
+        self.counters["seen"] += 1
+        if (self.methods is not None and method not in self.methods) or \
+                (self.chats is not None and chat_id not in self.chats):
+            self.counters["filtered"] += 1
+            return False
+        return True
+
+    def record(self, record: Record):
+        """Add a record; it is numbered with a seq field"""
+        with self.lock:
+            self.seq += 1
+            record['seq'] = self.seq
+            self.ring.append(record)
+            self.counters["captured"] += 1
+
+    def entries(self, method: Optional[str] = None, chat_id: Any = None, since: int = 0,
+                limit: Optional[int] = None) -> List[Record]:
+        """
+        Captured records still in memory, oldest first
+
+        Args:
+            method: Only records of this method
+            chat_id: Only records for this chat
+            since: Only records with a greater seq
+            limit: Return at most this many (the newest)
+        """
+        chat_id = normalize_chat_id(chat_id)
+        with self.lock:
+            records = self.since(since)
+        if method is not None:
+            records = [r for r in records if r['method'] == method]
+        if chat_id is not None:
+            records = [r for r in records if r['chat_id'] == chat_id]
+        if limit is not None:
+            records = records[-limit:] if limit > 0 else []
+        return records
+
+    def since(self, seq: int) -> List[Record]:
+        """Records with a seq greater than seq (caller holds the lock)"""
+        ring = self.ring
+        if not ring or ring[-1]['seq'] <= seq:
+            return []
+        start = max(0, len(ring) - (ring[-1]['seq'] - seq))
+        return list(itertools.islice(ring, start, None)) if start else list(ring)
+
+    def status(self) -> Dict[str, Any]:
+        """Whether capture is on, its filters and record counts"""
+        writer = self.writer
+        return {
+            "active": self.active,
+            "capacity": self.capacity,
+            "buffered": len(self.ring),
+            "methods": sorted(self.methods) if self.methods is not None else None,
+            "chats": sorted(self.chats, key=str) if self.chats is not None else None,
+            **self.counters,
+            "file": writer.status() if writer is not None else None
+        }
+
+    def clear(self):
+        """Drop the records in memory"""
+        with self.lock:
+            self.ring.clear()
+
+
+class CaptureWriter:
+    """Streams new capture records to a file from a background thread"""
+
+    def __init__(self, capture: TrafficCapture, path: str, format: str = 'jsonl', flush_interval: float = 1.0):
+        self.capture = capture
+        self.path = path
+        self.format = format
+        self.flush_interval = flush_interval
+        self.written_seq = 0
+        self.written = 0
+        # Records overwritten in the ring buffer before they were written
+        self.lost = 0
+        self.error: Optional[str] = None
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.file: Optional[TextIO]
+        if path.endswith('.gz'):
+            self.file = gzip.open(path, 'wt', encoding='utf-8', compresslevel=6)
+        else:
+            self.file = open(path, 'w', encoding='utf-8')
+        if format == 'har':
+            self.file.write(json.dumps({"log": {
+                "version": "1.2",
+                "creator": {"name": "SuperMock", "version": __version__}
+            }})[:-2] + ', "entries": [\n')
+
+    def start(self):
+        """Start the background flush thread"""
+        self._thread = threading.Thread(target=self._run, name="supermock-capture", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        """Write the remaining records and close the file"""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self.file is not None:
+            self.flush()
+            if self.format == 'har':
+                self.file.write('\n]}}\n')
+            self.file.close()
+            self.file = None
+
+    def status(self) -> Dict[str, Any]:
+        return {"path": self.path, "format": self.format, "written": self.written,
+                "lost": self.lost, "error": self.error}
+
+    def _run(self):
+        while not self._stopped.wait(self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        """Write the records captured since the last flush"""
+        capture = self.capture
+        with capture.lock:
+            records = capture.since(self.written_seq)
+        if not records:
+            return
+        self.lost += records[0]['seq'] - self.written_seq - 1
+        self.written_seq = records[-1]['seq']
+        try:
+            if self.format == 'har':
+                separator = ',\n' if self.written else ''
+                self.file.write(separator + ',\n'.join(json.dumps(to_har_entry(r), default=str) for r in records))
+            else:
+                self.file.write(''.join(json.dumps(r, default=str) + '\n' for r in records))
+            self.file.flush()
+            self.written += len(records)
+        except (OSError, ValueError) as e:
+            self.error = str(e)
+
+
+def to_har_entry(record: Record) -> Dict[str, Any]:
+    """Convert a capture record to a HAR 1.2 entry"""
+    request_body = json.dumps(record.get('params'), default=str)
+    response_body = json.dumps(record.get('response'), default=str)
+    return {
+        "startedDateTime": datetime.fromtimestamp(record['time'], timezone.utc).isoformat(timespec='milliseconds'),
+        "time": record['duration_ms'],
+        "request": {
+            "method": "POST",
+            "url": f"/bot{record.get('token')}/{record['method']}",
+            "httpVersion": "HTTP/1.1",
+            "headers": [],
+            "queryString": [],
+            "postData": {"mimeType": "application/json", "text": request_body},
+            "headersSize": -1,
+            "bodySize": record.get('request_bytes') or -1
+        },
+        "response": {
+            "status": record['status'],
+            "statusText": "",
+            "httpVersion": "HTTP/1.1",
+            "headers": [],
+            "content": {"size": len(response_body), "mimeType": "application/json", "text": response_body},
+            "redirectURL": "",
+            "headersSize": -1,
+            "bodySize": -1
+        },
+        "cache": {},
+        "timings": {"send": 0, "wait": record['duration_ms'], "receive": 0},
+        "_supermock": {"seq": record['seq'], "chat_id": record.get('chat_id'), "uploads": record.get('uploads')}
+    }
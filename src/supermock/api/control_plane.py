@@ -0,0 +1,350 @@
+"""
+Admin control plane for SuperMock
+
+Exposes every simulator operation under /admin/ on the Bot API server, so
+test drivers in other processes or languages can inject private and group
+messages, button presses and inline queries, manage groups, and reset,
+snapshot or restore the state. The threaded server speaks HTTP/1.1, so a
+driver can keep one connection open for all of its calls.
+"""
+
+import itertools
+import threading
+from typing import Dict, Any, Optional
+
+from flask import jsonify, request
+
+from ..utils.chatter import GroupChatter
+from ..utils.group_chat import GroupChatSimulator
+from ..utils.inline_mode import InlineModeSimulator
+from .state import ServerState
+
+
+class ControlPlaneError(Exception):
+    """A control-plane request that cannot be served"""
+
+    def __init__(self, description: str, error_code: int = 400):
+        super().__init__(description)
+        self.description = description
+        self.error_code = error_code
+
+
+class ControlPlane:
+    """Registers the /admin/ simulator routes on a mock server"""
+
+    def __init__(self, server):
+        self.server = server
+        self.groups = GroupChatSimulator(server)
+        self.inline = InlineModeSimulator(server)
+        self.lock = threading.Lock()
+        self.ids = itertools.count(1)
+        self.snapshots: Dict[str, ServerState] = {}
+        self.chatters: Dict[str, GroupChatter] = {}
+
+    def _data(self) -> Dict[str, Any]:
+        data = self.server._get_request_data()
+        if not isinstance(data, dict):
+            raise ControlPlaneError("Bad Request: expected a JSON object")
+        return data
+
+    def _user(self, data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Sender from a "from" user object or a "user_id" (registered on first use)"""
+        if data.get('from') is not None:
+            return self.groups.users.register(data['from'])
+        if data.get('user_id') is not None:
+            user_id = int(data['user_id'])
+            return self.groups.users.get(user_id) or self.groups.users.register({
+                "id": user_id,
+                "is_bot": False,
+                "first_name": f"User{user_id}",
+                "username": f"user{user_id}"
+            })
+        return None
+
+    def _group(self, group_id: int) -> Dict[str, Any]:
+        group = self.groups.get_group_info(group_id)
+        if group is None:
+            raise ControlPlaneError(f"Not Found: group {group_id} does not exist", 404)
+        return group
+
+    def _group_info(self, group_id: int) -> Dict[str, Any]:
+        return {
+            "chat": self._group(group_id),
+            "member_count": self.groups.get_member_count(group_id)
+        }
+
+    def _private_spec(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """inject_batch() spec for a private-chat message or button press"""
+        spec = {key: data[key] for key in ('text', 'chat_id', 'message_id') if key in data}
+        user = self._user(data)
+        if user is not None:
+            spec['from'] = user
+            spec.setdefault('chat_id', user['id'])
+        return spec
+
+    def _stop_chatters(self):
+        with self.lock:
+            chatters = list(self.chatters.values())
+            self.chatters.clear()
+        for chatter in chatters:
+            chatter.stop()
+
+    def register(self):
+        """Add the routes to the server's Flask app"""
+        app = self.server.app
+        server = self.server
+
+        def route(rule, methods):
+            """Register a handler that returns a result or raises ControlPlaneError"""
+            def decorator(handler):
+                def view(**kwargs):
+                    try:
+                        result = handler(**kwargs)
+                    except ControlPlaneError as e:
+                        return jsonify({
+                            "ok": False,
+                            "error_code": e.error_code,
+                            "description": e.description
+                        }), e.error_code
+                    except (ValueError, TypeError, KeyError) as e:
+                        return jsonify({
+                            "ok": False,
+                            "error_code": 400,
+                            "description": f"Bad Request: {e}"
+                        }), 400
+                    return jsonify({
+                        "ok": True,
+                        "result": result
+                    })
+
+                app.add_url_rule(rule, f"admin_{handler.__name__}", view, methods=methods)
+                return handler
+            return decorator
+
+        # Private chats
+
+        @route('/admin/messages', ['GET', 'POST'])
+        def messages():
+            if request.method == 'GET':
+                since = request.args.get('since', 0, type=int)
+                return server.get_messages_history()[since:]
+            data = self._data()
+            if 'text' not in data:
+                raise ControlPlaneError("Bad Request: text is required")
+            return server.inject_batch([self._private_spec(data)])[0]
+
+        @route('/admin/callbacks', ['POST'])
+        def callbacks():
+            data = self._data()
+            spec = self._private_spec(data)
+            spec['callback_data'] = data.get('data', '')
+            spec.pop('text', None)
+            return server.inject_batch([spec])[0]
+
+        # Users
+
+        @route('/admin/users', ['POST'])
+        def users():
+            count = int(self._data().get('count', 1))
+            if count < 1:
+                raise ControlPlaneError("Bad Request: count must be positive")
+            ids = server.state.users.create_ids(count)
+            return {"count": count, "first_id": ids[0], "last_id": ids[-1]}
+
+        @route('/admin/users/<int:user_id>', ['GET'])
+        def user(user_id):
+            user = server.state.users.get(user_id)
+            if user is None:
+                raise ControlPlaneError(f"Not Found: user {user_id} does not exist", 404)
+            return {"user": user, "chat": server.state.users.private_chat(user_id)}
+
+        # Groups
+
+        @route('/admin/groups', ['GET', 'POST'])
+        def groups():
+            if request.method == 'GET':
+                return [self._group_info(group_id) for group_id in list(self.groups.groups)]
+            data = self._data()
+            group_id = self.groups.create_group(
+                data.get('title', 'Test Group'),
+                member_count=int(data.get('member_count', 3)),
+                supergroup=bool(data.get('supergroup', False))
+            )
+            return self._group_info(group_id)
+
+        @route('/admin/groups/<int(signed=True):group_id>', ['GET'])
+        def group(group_id):
+            info = self._group_info(group_id)
+            if request.args.get('members'):
+                info['members'] = self.groups.get_group_members(group_id)
+            return info
+
+        @route('/admin/groups/<int(signed=True):group_id>/messages', ['POST'])
+        def group_messages(group_id):
+            self._group(group_id)
+            data = self._data()
+            fields = {key: data[key] for key in ('entities', 'reply_to_message') if key in data}
+            return self.groups.send_group_message(group_id, data.get('text', ''), self._user(data), **fields)
+
+        @route('/admin/groups/<int(signed=True):group_id>/commands', ['POST'])
+        def group_commands(group_id):
+            self._group(group_id)
+            data = self._data()
+            command = data.get('command', '/start')
+            if data.get('mention_bot', True):
+                command = f"{command}@{server.settings.bot.username}"
+            entities = [{"type": "bot_command", "offset": 0, "length": len(command)}]
+            return self.groups.send_group_message(group_id, command, self._user(data), entities=entities)
+
+        @route('/admin/groups/<int(signed=True):group_id>/members', ['POST'])
+        def group_members(group_id):
+            self._group(group_id)
+            data = self._data()
+            users = data.get('users')
+            if users is None:
+                count = int(data.get('count', 1))
+                users = self.groups.users.create_many(count)
+            added = self.groups.add_members(group_id, users)
+            return {"added": added, "member_count": self.groups.get_member_count(group_id)}
+
+        @route('/admin/groups/<int(signed=True):group_id>/members/<int:user_id>', ['DELETE'])
+        def group_member(group_id, user_id):
+            self._group(group_id)
+            return self.groups.remove_member(group_id, user_id)
+
+        @route('/admin/groups/<int(signed=True):group_id>/join', ['POST'])
+        def group_join(group_id):
+            self._group(group_id)
+            user = self._user(self._data()) or self.groups.users.create()
+            return self.groups.simulate_user_joined(group_id, user)
+
+        @route('/admin/groups/<int(signed=True):group_id>/leave', ['POST'])
+        def group_leave(group_id):
+            self._group(group_id)
+            data = self._data()
+            user = self.groups.get_member(group_id, int(data['user_id'])) if 'user_id' in data else None
+            if user is None:
+                raise ControlPlaneError("Not Found: user is not a member of the group", 404)
+            return self.groups.simulate_user_left(group_id, user)
+
+        @route('/admin/groups/<int(signed=True):group_id>/upgrade', ['POST'])
+        def group_upgrade(group_id):
+            self._group(group_id)
+            return self._group_info(self.groups.upgrade_to_supergroup(group_id))
+
+        @route('/admin/groups/<int(signed=True):group_id>/chatter', ['POST'])
+        def group_chatter(group_id):
+            self._group(group_id)
+            data = self._data()
+            chatter = self.groups.simulate_chatter(
+                group_id,
+                rate=float(data.get('rate', 1.0)),
+                duration=data.get('duration'),
+                count=data.get('count'),
+                mix=data.get('mix'),
+                zipf_exponent=float(data.get('zipf_exponent', 1.1)),
+                seed=data.get('seed')
+            )
+            with self.lock:
+                chatter_id = str(next(self.ids))
+                self.chatters[chatter_id] = chatter
+            return {"chatter_id": chatter_id, **chatter.stats()}
+
+        @route('/admin/chatter/<chatter_id>', ['GET', 'DELETE'])
+        def chatter(chatter_id):
+            with self.lock:
+                chatter = self.chatters.get(chatter_id)
+                if chatter is not None and request.method == 'DELETE':
+                    del self.chatters[chatter_id]
+            if chatter is None:
+                raise ControlPlaneError(f"Not Found: chatter {chatter_id} does not exist", 404)
+            if request.method == 'DELETE':
+                chatter.stop()
+            return chatter.stats()
+
+        # Inline mode
+
+        @route('/admin/inline/queries', ['POST'])
+        def inline_queries():
+            data = self._data()
+            if data.get('use_cache'):
+                try:
+                    return self.inline.request_results(data.get('query', ''), self._user(data), data.get('offset', ''),
+                                                       timeout=min(float(data.get('timeout', 5.0)), 60.0))
+                except TimeoutError as e:
+                    raise ControlPlaneError(f"Request Timeout: {e}", 408)
+            return self.inline.send_inline_query(data.get('query', ''), self._user(data), data.get('offset', ''))
+
+        @route('/admin/inline/chosen', ['POST'])
+        def inline_chosen():
+            data = self._data()
+            return self.inline.send_chosen_inline_result(data['result_id'], data.get('query', ''), self._user(data))
+
+        @route('/admin/inline/typing', ['POST'])
+        def inline_typing():
+            data = self._data()
+            if not data.get('text'):
+                raise ControlPlaneError("Bad Request: text is required")
+            return self.inline.simulate_typing(
+                data['text'],
+                self._user(data),
+                cps=float(data.get('cps', 8.0)),
+                jitter=float(data.get('jitter', 0.3)),
+                use_cache=bool(data.get('use_cache', True)),
+                timeout=min(float(data.get('timeout', 5.0)), 60.0),
+                seed=data.get('seed')
+            )
+
+        @route('/admin/inline/results/<query_id>', ['GET'])
+        def inline_results(query_id):
+            return self.inline.get_cached_results(query_id)
+
+        @route('/admin/inline/cache', ['GET'])
+        def inline_cache():
+            return self.inline.cache_stats()
+
+        # Waiting for the bot
+
+        @route('/admin/wait', ['POST'])
+        def wait():
+            data = self._data()
+            timeout = min(float(data.get('timeout', 5.0)), 60.0)
+            try:
+                if 'method' in data:
+                    return server.wait_for_call(data['method'], timeout=timeout)
+                return server.wait_for_bot_message(chat_id=data.get('chat_id'), timeout=timeout)
+            except TimeoutError as e:
+                raise ControlPlaneError(f"Request Timeout: {e}", 408)
+
+        # State
+
+        @route('/admin/reset', ['POST'])
+        def reset():
+            self._stop_chatters()
+            server.reset()
+            return True
+
+        @route('/admin/snapshots', ['POST'])
+        def snapshots():
+            snapshot = server.snapshot()
+            with self.lock:
+                snapshot_id = str(next(self.ids))
+                self.snapshots[snapshot_id] = snapshot
+            return {"snapshot_id": snapshot_id}
+
+        @route('/admin/snapshots/<snapshot_id>', ['DELETE'])
+        def snapshot(snapshot_id):
+            with self.lock:
+                if self.snapshots.pop(snapshot_id, None) is None:
+                    raise ControlPlaneError(f"Not Found: snapshot {snapshot_id} does not exist", 404)
+            return True
+
+        @route('/admin/snapshots/<snapshot_id>/restore', ['POST'])
+        def snapshot_restore(snapshot_id):
+            with self.lock:
+                snapshot = self.snapshots.get(snapshot_id)
+            if snapshot is None:
+                raise ControlPlaneError(f"Not Found: snapshot {snapshot_id} does not exist", 404)
+            self._stop_chatters()
+            server.restore(snapshot)
+            return True
@@ -0,0 +1,47 @@
+"""
+httpx transports for the SuperMock in-process mode
+
+Requires the optional ``httpx`` package. python-telegram-bot (v20+) talks to
+the Bot API through httpx, so an in-process server can be plugged in with e.g.
+``HTTPXRequest(httpx_kwargs={"transport": AsyncInProcessTransport(server)})``.
+"""
+
+import asyncio
+
+import httpx
+
+from .transport import InProcessClient
+
+
+def _forward(client: InProcessClient, request: httpx.Request) -> httpx.Response:
+    """Run an httpx request through the in-process client"""
+    headers = [(key.decode('latin-1'), value.decode('latin-1')) for key, value in request.headers.raw]
+    status, response_headers, content = client.request(request.method, str(request.url), headers, request.read())
+    return httpx.Response(status, headers=response_headers, content=content, request=request)
+
+
+class InProcessTransport(httpx.BaseTransport):
+    """Synchronous httpx transport that serves calls in-process"""
+
+    def __init__(self, server):
+        self.client = InProcessClient(server)
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        return _forward(self.client, request)
+
+
+class AsyncInProcessTransport(httpx.AsyncBaseTransport):
+    """
+    Asynchronous httpx transport that serves calls in-process
+
+    The WSGI app runs on the loop's default executor so long-polling
+    getUpdates never blocks the event loop.
+    """
+
+    def __init__(self, server):
+        self.client = InProcessClient(server)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        await request.aread()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, _forward, self.client, request)
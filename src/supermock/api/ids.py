@@ -0,0 +1,119 @@
+"""
+ID allocation and chat ID handling for SuperMock
+
+Update, callback query and message IDs come from small counters that each
+hold their next value under their own lock. Message IDs are numbered per
+chat, as Telegram does, so every chat's messages start at 1 and request
+threads only contend when they post to the same chat. Update IDs are one
+sequence for the whole server, so every injection takes its lock briefly;
+batches take all their IDs with one acquisition.
+"""
+
+import threading
+from typing import Dict, Any, List
+
+
+def normalize_chat_id(chat_id: Any) -> Any:
+    """Convert numeric chat IDs sent as strings to int"""
+    if isinstance(chat_id, str):
+        try:
+            return int(chat_id)
+        except ValueError:
+            return chat_id
+    return chat_id
+
+
+class IdSequence:
+    """Thread-safe counter whose next value can be read without advancing it"""
+
+    __slots__ = ('lock', 'value', 'step')
+
+    def __init__(self, start: int = 1, step: int = 1):
+        self.lock = threading.Lock()
+        self.value = start
+        self.step = step
+
+    def next(self) -> int:
+        with self.lock:
+            value = self.value
+            self.value += self.step
+        return value
+
+    def take(self, count: int) -> List[int]:
+        """The next count values at once"""
+        with self.lock:
+            first = self.value
+            self.value += count * self.step
+        return list(range(first, first + count * self.step, self.step))
+
+    def peek(self) -> int:
+        """Value the next call to next() will return"""
+        return self.value
+
+    def copy(self) -> 'IdSequence':
+        return IdSequence(self.value, self.step)
+
+
+class IdAllocator:
+    """Update, callback query and per-chat message ID sequences"""
+
+    __slots__ = ('updates', 'callback_queries', 'messages', 'groups', 'supergroups')
+
+    def __init__(self):
+        self.updates = IdSequence(1)
+        self.callback_queries = IdSequence(1)
+        # chat ID -> sequence of that chat's message IDs
+        self.messages: Dict[Any, IdSequence] = {}
+        self.groups = IdSequence(-1000000000, -1)  # Negative IDs for groups
+        self.supergroups = IdSequence(-1001000000000, -1)  # Supergroup IDs start with -100
+
+    def next_update_id(self) -> int:
+        return self.updates.next()
+
+    def take_update_ids(self, count: int) -> List[int]:
+        """Allocate consecutive update IDs for a batch"""
+        return self.updates.take(count)
+
+    def next_callback_query_id(self) -> str:
+        return str(self.callback_queries.next())
+
+    def next_message_id(self, chat_id: Any) -> int:
+        """Next message ID in a chat (the chat's first message is 1)"""
+        sequence = self.messages.get(chat_id)
+        if sequence is None:
+            # setdefault is atomic, so concurrent first messages share one sequence
+            sequence = self.messages.setdefault(chat_id, IdSequence(1))
+        return sequence.next()
+
+    def peek_update_id(self) -> int:
+        """Update ID the next allocation will return"""
+        return self.updates.peek()
+
+    def peek_message_id(self, chat_id: Any) -> int:
+        """Message ID the next message in a chat will get"""
+        sequence = self.messages.get(chat_id)
+        return sequence.peek() if sequence is not None else 1
+
+    def last_message_id(self, chat_id: Any) -> int:
+        """ID of the latest message in a chat, or 0 if it has none"""
+        sequence = self.messages.get(chat_id)
+        return sequence.peek() - 1 if sequence is not None else 0
+
+    def set_next_update_id(self, update_id: int):
+        self.updates = IdSequence(update_id)
+
+    def set_next_message_id(self, chat_id: Any, message_id: int):
+        self.messages[chat_id] = IdSequence(message_id)
+
+    def next_group_id(self, supergroup: bool = False) -> int:
+        return (self.supergroups if supergroup else self.groups).next()
+
+    def copy(self) -> 'IdAllocator':
+        """Independent allocator continuing from the current positions"""
+        ids = IdAllocator()
+        ids.updates = self.updates.copy()
+        ids.callback_queries = self.callback_queries.copy()
+        ids.messages = {chat_id: sequence.copy() for chat_id, sequence in list(self.messages.items())}
+        ids.groups = self.groups.copy()
+        ids.supergroups = self.supergroups.copy()
+        return ids
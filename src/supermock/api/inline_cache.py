@@ -0,0 +1,185 @@
+"""
+Inline results cache for SuperMock
+
+Keeps the bot's answerInlineQuery results the way Telegram's servers do:
+keyed by (user, query, offset), expiring after the answer's cache_time, and
+shared between users unless the answer is personal. Both the cache and the
+index of sent queries are bounded LRU maps.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Any, Optional, Tuple
+
+from ..utils.clock import Clock
+
+
+# Telegram's default cache_time for answerInlineQuery
+DEFAULT_CACHE_TIME = 300
+
+# Cached answers and sent queries kept at most
+MAX_ENTRIES = 10000
+
+# (user ID or None for answers shared by all users, query, offset)
+CacheKey = Tuple[Optional[int], str, str]
+
+
+class InlineAnswer:
+    """One answerInlineQuery call"""
+
+    __slots__ = ('query_id', 'results', 'next_offset', 'is_personal', 'expires_at')
+
+    def __init__(self, query_id: str, results: List[Dict[str, Any]], next_offset: str,
+                 is_personal: bool, expires_at: float):
+        self.query_id = query_id
+        self.results = results
+        self.next_offset = next_offset
+        self.is_personal = is_personal
+        self.expires_at = expires_at
+
+    def to_dict(self, cached: bool = False) -> Dict[str, Any]:
+        return {
+            "query_id": self.query_id,
+            "results": self.results,
+            "next_offset": self.next_offset,
+            "is_personal": self.is_personal,
+            "cached": cached
+        }
+
+
+class InlineResultsCache:
+    """Bounded LRU + TTL cache of inline answers, shared by the server and simulators"""
+
+    def __init__(self, clock: Optional[Clock] = None, max_entries: int = MAX_ENTRIES):
+        self.lock = threading.Lock()
+        self.clock = clock or Clock()
+        self.max_entries = max_entries
+        # Queries sent to the bot: query_id -> cache key
+        self.queries: 'OrderedDict[str, CacheKey]' = OrderedDict()
+        # Every answer by query_id, including ones that cannot be cached
+        self.answers: 'OrderedDict[str, InlineAnswer]' = OrderedDict()
+        # Cacheable answers by key
+        self.entries: 'OrderedDict[CacheKey, InlineAnswer]' = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0, "answers": 0, "expired": 0, "evicted": 0}
+
+    def record_query(self, query_id: str, user_id: Optional[int], query: str, offset: str = ""):
+        """Remember which (user, query, offset) a sent inline query stands for"""
+        with self.lock:
+            self.queries[query_id] = (user_id, query, offset)
+            if len(self.queries) > self.max_entries:
+                self.queries.popitem(last=False)
+
+    def lookup(self, user_id: Optional[int], query: str, offset: str = "") -> Optional[InlineAnswer]:
+        """
+        Cached answer for a query, as Telegram would serve it
+
+        A personal answer for this user wins over one shared by all users.
+        Expired entries are dropped on the way.
+
+        Returns:
+            The answer, or None on a miss
+        """
+        now = self.clock.time()
+        with self.lock:
+            for key in ((user_id, query, offset), (None, query, offset)):
+                answer = self.entries.get(key)
+                if answer is None:
+                    continue
+                if answer.expires_at <= now:
+                    del self.entries[key]
+                    self.stats["expired"] += 1
+                    continue
+                self.entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return answer
+            self.stats["misses"] += 1
+            return None
+
+    def store(self, query_id: str, results: List[Dict[str, Any]], cache_time: int = DEFAULT_CACHE_TIME,
+              is_personal: bool = False, next_offset: str = "") -> InlineAnswer:
+        """
+        Record the bot's answer to an inline query
+
+        The answer is always kept by query_id; it is also cached by key when
+        the query was sent through the simulator and cache_time is positive.
+
+        Args:
+            query_id: inline_query_id of the answer
+            results: InlineQueryResult objects
+            cache_time: Seconds the answer may be served from cache
+            is_personal: Only serve the cached answer to the same user
+            next_offset: Offset of the next page ("" for the last page)
+
+        Returns:
+            The stored answer
+        """
+        answer = InlineAnswer(query_id, results, next_offset, is_personal,
+                              self.clock.time() + cache_time)
+        with self.lock:
+            self.stats["answers"] += 1
+            self.answers[query_id] = answer
+            self.answers.move_to_end(query_id)
+            if len(self.answers) > self.max_entries:
+                self.answers.popitem(last=False)
+
+            key = self.queries.get(query_id)
+            if key is None or cache_time <= 0:
+                return answer
+            user_id, query, offset = key
+            key = (user_id if is_personal else None, query, offset)
+            self.entries[key] = answer
+            self.entries.move_to_end(key)
+            if len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.stats["evicted"] += 1
+        return answer
+
+    def answer(self, query_id: str) -> Optional[InlineAnswer]:
+        """The bot's answer to an inline query, if it has answered"""
+        with self.lock:
+            return self.answers.get(query_id)
+
+    def results(self, query_id: str) -> Optional[List[Dict[str, Any]]]:
+        """Results the bot answered an inline query with"""
+        answer = self.answer(query_id)
+        return answer.results if answer is not None else None
+
+    def report(self) -> Dict[str, Any]:
+        """Hit, miss and eviction counts, the hit ratio and the cache size"""
+        with self.lock:
+            stats = dict(self.stats)
+            stats["size"] = len(self.entries)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        return stats
+
+    def resize(self, max_entries: int):
+        """Change the cache bound, evicting the least recently used entries beyond it"""
+        with self.lock:
+            self.max_entries = max_entries
+            for entries in (self.queries, self.answers):
+                while len(entries) > max_entries:
+                    entries.popitem(last=False)
+            while len(self.entries) > max_entries:
+                self.entries.popitem(last=False)
+                self.stats["evicted"] += 1
+
+    def clear(self):
+        """Forget all queries and answers (counters are kept)"""
+        with self.lock:
+            self.queries.clear()
+            self.answers.clear()
+            self.entries.clear()
+
+    def copy(self) -> 'InlineResultsCache':
+        """Copy the cache, sharing the answer objects"""
+        cache = InlineResultsCache(self.clock, self.max_entries)
+        with self.lock:
+            cache.queries = OrderedDict(self.queries)
+            cache.answers = OrderedDict(self.answers)
+            cache.entries = OrderedDict(self.entries)
+            cache.stats = dict(self.stats)
+        return cache
+
+    def __len__(self) -> int:
+        return len(self.entries)
@@ -0,0 +1,321 @@
+"""
+Virtual-user load generator for SuperMock
+
+Simulates many users sending messages, commands and button presses across
+private chats and groups, either at a target rate (open loop) or with each
+user waiting for the bot's reply and a think time before acting again
+(closed loop), and measures how quickly the bot responds.
+"""
+
+import heapq
+import random
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, Hashable, List, Any, Optional, Tuple
+
+from .ids import normalize_chat_id
+from .mock_server import TelegramMockServer
+from .responses import RESPONSE_METHODS
+from ..utils.group_chat import GroupChatSimulator
+from ..utils.histogram import percentile
+
+
+# Default share of each event kind
+DEFAULT_MIX = {'message': 0.7, 'command': 0.2, 'callback': 0.1}
+
+COMMANDS = ('/start', '/help', '/settings', '/status')
+
+# Sleep only when the next event is at least this far ahead; due events are
+# sent back to back, so pacing stays accurate beyond the sleep granularity
+MIN_SLEEP = 0.001
+
+
+class LoadGenerator:
+    """
+    Drives a mock server with traffic from virtual users
+
+    Users are created in the server's user registry, so the bot can look
+    them and their private chats up with getChat and getChatMember. Users
+    0..private_chats-1 talk to the bot privately, and every user is a
+    member of one of the groups (round-robin). Each event picks one of the
+    user's chats at random.
+    """
+
+    def __init__(self, server: TelegramMockServer, users: int = 100, private_chats: Optional[int] = None,
+                 groups: int = 0, mix: Optional[Dict[str, float]] = None, seed: Optional[int] = None):
+        """
+        Args:
+            server: Server to inject updates into
+            users: Number of distinct users
+            private_chats: Number of users with a private chat (default: all)
+            groups: Number of groups shared among the users
+            mix: Relative weights of 'message', 'command' and 'callback' events
+            seed: Seed for reproducible user, chat and event choices
+        """
+        if users <= 0:
+            raise ValueError("users must be positive")
+        private_chats = users if private_chats is None else private_chats
+        if not 0 <= private_chats <= users:
+            raise ValueError("private_chats must be between 0 and users")
+        if private_chats < users and groups <= 0:
+            raise ValueError("Users without a private chat need at least one group")
+
+        mix = dict(DEFAULT_MIX if mix is None else mix)
+        unknown = set(mix) - set(DEFAULT_MIX)
+        if unknown:
+            raise ValueError(f"Unknown event kinds: {', '.join(sorted(unknown))}")
+
+        self.server = server
+        self.rng = random.Random(seed)
+        self.kinds = list(mix)
+        self.weights = [mix[kind] for kind in self.kinds]
+
+        self.handles = server.create_users(users)
+        self.users = [handle.user for handle in self.handles]
+
+        group_sim = GroupChatSimulator(server)
+        self.groups: List[Dict[str, Any]] = []
+        for g in range(groups):
+            group_id = group_sim.create_group(f"Load Group {g + 1}", member_count=0)
+            group_sim.add_members(group_id, self.users[g::groups])
+            self.groups.append(group_sim.groups[group_id])
+
+        # Chats each user can write in
+        self.user_chats: List[List[Dict[str, Any]]] = []
+        for i, handle in enumerate(self.handles):
+            chats = []
+            if i < private_chats:
+                chats.append(handle.chat)
+            if groups:
+                chats.append(self.groups[i % groups])
+            self.user_chats.append(chats)
+
+        self.lock = threading.Lock()
+        self.reply_event = threading.Event()
+        # Unanswered events by reply key; entries are [sent_at, user, event number, answered]
+        # and are shared between the keys of one event
+        self.pending: Dict[Hashable, Deque[List[Any]]] = {}
+        self.outstanding = 0
+        # (user, event number, replied_at) for the closed loop
+        self.replies: Deque[Tuple[int, int, float]] = deque()
+        self.last_bot_message: Dict[int, int] = {}
+        self.latencies_ms: List[float] = []
+        self.sent = 0
+
+    def run(self, rate: Optional[float] = None, duration: Optional[float] = None, events: Optional[int] = None,
+            mode: str = 'open', think_time: float = 1.0, reply_timeout: float = 5.0,
+            settle: float = 1.0) -> Dict[str, Any]:
+        """
+        Generate load and report the achieved rate and bot response latencies
+
+        Args:
+            rate: Open loop: target events per second (None sends as fast as possible)
+            duration: Stop after this many seconds
+            events: Stop after this many events
+            mode: 'open' sends on a fixed schedule regardless of replies;
+                'closed' has each user wait for a reply (or reply_timeout),
+                then an exponential think time with mean think_time
+            think_time: Closed loop: mean seconds between a reply and the user's next event
+            reply_timeout: Closed loop: seconds a user waits for a reply
+            settle: Seconds to keep collecting replies after the last event
+
+        Returns:
+            Summary with target and achieved rates, response counts and
+            latency percentiles in milliseconds
+        """
+        if mode not in ('open', 'closed'):
+            raise ValueError("mode must be 'open' or 'closed'")
+        if duration is None and events is None:
+            raise ValueError("Pass duration, events or both")
+        if rate is not None and rate <= 0:
+            raise ValueError("rate must be positive")
+
+        with self.lock:
+            self.pending.clear()
+            self.outstanding = 0
+            self.replies.clear()
+            self.latencies_ms = []
+            self.sent = 0
+
+        self.server.add_recorder(self)
+        try:
+            started = time.perf_counter()
+            deadline = started + duration if duration is not None else float('inf')
+            limit = events if events is not None else float('inf')
+            if mode == 'open':
+                self._run_open(rate, started, deadline, limit)
+            else:
+                self._run_closed(think_time, reply_timeout, started, deadline, limit)
+            elapsed = time.perf_counter() - started
+            self._settle(settle)
+        finally:
+            self.server.remove_recorder(self)
+
+        with self.lock:
+            latencies = sorted(self.latencies_ms)
+        return {
+            "mode": mode,
+            "users": len(self.users),
+            "groups": len(self.groups),
+            "target_rate": rate,
+            "events": self.sent,
+            "duration_s": round(elapsed, 3),
+            "achieved_rate": round(self.sent / elapsed, 1) if elapsed > 0 else 0.0,
+            "responses": len(latencies),
+            "unanswered": self.sent - len(latencies),
+            "latency_ms": {
+                "mean": round(sum(latencies) / len(latencies), 3) if latencies else 0.0,
+                "p50": round(percentile(latencies, 0.50), 3),
+                "p90": round(percentile(latencies, 0.90), 3),
+                "p99": round(percentile(latencies, 0.99), 3),
+                "max": round(latencies[-1], 3) if latencies else 0.0
+            }
+        }
+
+    def _run_open(self, rate: Optional[float], started: float, deadline: float, limit: float):
+        """Send events on a fixed schedule"""
+        interval = 1.0 / rate if rate else 0.0
+        next_at = started
+        users = len(self.users)
+        while self.sent < limit:
+            now = time.perf_counter()
+            if now >= deadline:
+                break
+            if next_at - now >= MIN_SLEEP:
+                time.sleep(next_at - now)
+                continue
+            # Send everything that is due, catching up after oversleeping
+            while next_at <= now and self.sent < limit:
+                self._send(self.rng.randrange(users))
+                next_at += interval
+
+    def _run_closed(self, think_time: float, reply_timeout: float, started: float, deadline: float, limit: float):
+        """Have each user act, wait for the reply, think, and act again"""
+        rng = self.rng
+        # (ready_at, user) heap; users start staggered over one think time
+        ready = [(started + rng.uniform(0, think_time), i) for i in range(len(self.users))]
+        heapq.heapify(ready)
+        # (deadline, user, event number) heap of replies being waited for
+        timeouts: List[Tuple[float, int, int]] = []
+        waiting: Dict[int, int] = {}
+
+        while self.sent < limit:
+            now = time.perf_counter()
+            if now >= deadline:
+                break
+
+            with self.lock:
+                replies = list(self.replies)
+                self.replies.clear()
+                self.reply_event.clear()
+            for user, number, replied_at in replies:
+                if waiting.get(user) == number:
+                    del waiting[user]
+                    think = rng.expovariate(1.0 / think_time) if think_time > 0 else 0.0
+                    heapq.heappush(ready, (replied_at + think, user))
+
+            while timeouts and timeouts[0][0] <= now:
+                _, user, number = heapq.heappop(timeouts)
+                if waiting.get(user) == number:
+                    del waiting[user]
+                    heapq.heappush(ready, (now, user))
+
+            while ready and ready[0][0] <= now and self.sent < limit:
+                _, user = heapq.heappop(ready)
+                waiting[user] = self.sent
+                heapq.heappush(timeouts, (now + reply_timeout, user, self.sent))
+                self._send(user)
+
+            wake_at = deadline
+            if ready:
+                wake_at = min(wake_at, ready[0][0])
+            if timeouts:
+                wake_at = min(wake_at, timeouts[0][0])
+            delay = wake_at - time.perf_counter()
+            if delay >= MIN_SLEEP:
+                self.reply_event.wait(delay)
+
+    def _send(self, user_index: int):
+        """Inject one event from a user and start waiting for its reply"""
+        server = self.server
+        user = self.users[user_index]
+        chat = self.rng.choice(self.user_chats[user_index])
+        kind = self.rng.choices(self.kinds, self.weights)[0]
+
+        if kind == 'callback':
+            spec = {
+                "callback_data": f"button_{self.rng.randrange(4)}",
+                "message_id": self.last_bot_message.get(chat['id'], 1),
+                "chat": chat,
+                "from": user
+            }
+        else:
+            if kind == 'command':
+                text = self.rng.choice(COMMANDS)
+                if chat['type'] != 'private':
+                    text += f"@{server.settings.bot.username}"
+            else:
+                text = f"message {self.sent + 1}"
+            spec = {"text": text, "chat": chat, "from": user}
+            if kind == 'command':
+                spec["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text)}]
+
+        # Replies are matched under the lock, so one that arrives before the
+        # event is registered waits for it instead of being missed
+        with self.lock:
+            sent_at = time.perf_counter()
+            update = server.inject_batch([spec])[0]
+            keys: List[Hashable] = [('chat', chat['id'])]
+            if kind == 'callback':
+                keys.insert(0, ('callback', update['callback_query']['id']))
+            entry = [sent_at, user_index, self.sent, False]
+            for key in keys:
+                self.pending.setdefault(key, deque()).append(entry)
+            self.outstanding += 1
+            self.sent += 1
+
+    def on_update(self, update: Dict[str, Any]):
+        """Recorder hook; injected updates are tracked by _send"""
+
+    def on_call(self, call: Dict[str, Any]):
+        """Recorder hook: match a bot reply to the oldest unanswered event in its chat"""
+        if call['method'] not in RESPONSE_METHODS:
+            return
+        now = time.perf_counter()
+        params = call.get('params') or {}
+        keys: List[Hashable] = []
+        if 'callback_query_id' in params:
+            keys.append(('callback', str(params['callback_query_id'])))
+        if 'chat_id' in params:
+            keys.append(('chat', normalize_chat_id(params['chat_id'])))
+
+        result = call.get('result')
+        with self.lock:
+            if isinstance(result, dict) and 'message_id' in result and 'chat_id' in params:
+                self.last_bot_message[normalize_chat_id(params['chat_id'])] = result['message_id']
+            for key in keys:
+                queue = self.pending.get(key)
+                while queue and queue[0][3]:
+                    queue.popleft()
+                if queue:
+                    entry = queue.popleft()
+                    entry[3] = True
+                    self.outstanding -= 1
+                    self.latencies_ms.append((now - entry[0]) * 1000)
+                    self.replies.append((entry[1], entry[2], now))
+                    self.reply_event.set()
+                    return
+
+    def _settle(self, settle: float):
+        """Wait for outstanding replies for up to settle seconds"""
+        deadline = time.perf_counter() + settle
+        while True:
+            with self.lock:
+                if not self.outstanding:
+                    return
+                self.reply_event.clear()
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                return
+            self.reply_event.wait(remaining)
@@ -5,33 +5,124 @@ This module implements a mock server that mimics the Telegram Bot API.
 It allows developers to test their bots locally without connecting to the real Telegram API.
 """
 
-from flask import Flask, request, jsonify
-from datetime import datetime
+from flask import Flask, Response, g, request, jsonify
+import asyncio
 import json
+import socketserver
 import threading
-import queue
-from typing import Dict, List, Any, Optional
+import time
+from typing import Callable, Dict, Iterable, List, Any, Optional, Tuple, Union
+
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+from .call_log import Call
+from .capture import TrafficCapture
+from .control_plane import ControlPlane
+from .ids import normalize_chat_id
+from .inline_cache import DEFAULT_CACHE_TIME
+from .responses import BOT_MESSAGE_METHODS
+from .state import ServerState
+from .update_log import UpdateLog
+from ..utils.clock import Clock
+from ..utils.config import DEFAULT_SETTINGS, HOT_RELOAD_SECTIONS, Config, ConfigWatcher, Settings
+from ..utils.latency import LatencyInjector
+from ..utils.logger import Logger
+from ..utils.profiler import RequestProfiler
+from ..utils.rate_limit import RateLimiter, RATE_LIMITED_METHODS
+from ..utils.users import SimulatedUser, UserRef
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    """Werkzeug handler without per-request log lines; the server's Logger writes access records instead"""
+    
+    def log_request(self, code='-', size='-'):
+        pass
 
 
 class TelegramMockServer:
     """Mock implementation of Telegram Bot API Server"""
     
-    def __init__(self, host: str = "localhost", port: int = 8081):
-        self.host = host
-        self.port = port
+    def __init__(self, host: Optional[str] = None, port: Optional[int] = None,
+                 settings: Optional[Settings] = None, logger: Optional[Logger] = None):
+        """
+        Args:
+            host: Host to bind (default: settings.server.host)
+            port: Port to bind (default: settings.server.port)
+            settings: Compiled configuration, e.g. Config(path).settings()
+                (default: the built-in defaults)
+            logger: Logger for startup messages and access records, e.g.
+                Logger.from_settings(settings) (default: print startup
+                messages, no access records)
+        """
+        self.settings = settings or DEFAULT_SETTINGS
+        self.host = host if host is not None else self.settings.server.host
+        self.port = port if port is not None else self.settings.server.port
         self.app = Flask(__name__)
-        self.message_id_counter = 1
-        self.update_id_counter = 1
-        self.chat_id = 12345  # Default chat ID for testing
-        self.updates_queue: queue.Queue = queue.Queue()
-        self.messages_history: List[Dict[str, Any]] = []
+        self.chat_id = self.settings.user.id  # Default chat ID for testing
+        self.clock = Clock()
+        self.state = ServerState(clock=self.clock, settings=self.settings)
         self.bot_token: Optional[str] = None
-        self.id_lock = threading.Lock()
+        self.profiler = RequestProfiler()
+        self.capture = TrafficCapture()
+        self.rate_limiter = RateLimiter()
+        self.latency = LatencyInjector()
+        self.config_watcher: Optional[ConfigWatcher] = None
+        self.logger = logger
+        self._apply_runtime_settings()
+        # Scenario recorders notified of injected updates and Bot API calls;
+        # replaced rather than mutated, see add_recorder()
+        self.recorders: List[Any] = []
+        self.recorders_lock = threading.Lock()
+        self.ready = threading.Event()
+        self.stopping = threading.Event()
+        self._http_server = None
+        self._serve_thread: Optional[threading.Thread] = None
+        self._inflight = 0
+        self._inflight_condition = threading.Condition()
         
+        self._setup_hooks()
         self._setup_routes()
+        self._setup_admin_routes()
+        self.control_plane = ControlPlane(self)
+        self.control_plane.register()
+    
+    @property
+    def updates_queue(self) -> UpdateLog:
+        """Pending updates of the current state generation"""
+        return self.state.updates
+    
+    @property
+    def messages_history(self) -> List[Dict[str, Any]]:
+        """Message history of the current state generation"""
+        return self.state.messages_history
+    
+    @property
+    def message_id_counter(self) -> int:
+        """Next message ID to allocate in the default chat"""
+        return self.state.ids.peek_message_id(self.chat_id)
+    
+    @message_id_counter.setter
+    def message_id_counter(self, value: int):
+        self.state.ids.set_next_message_id(self.chat_id, value)
+    
+    @property
+    def update_id_counter(self) -> int:
+        """Next update ID to allocate"""
+        return self.state.ids.peek_update_id()
+    
+    @update_id_counter.setter
+    def update_id_counter(self, value: int):
+        self.state.ids.set_next_update_id(value)
     
     def _get_request_data(self) -> Dict[str, Any]:
-        """Extract request data from various formats"""
+        """Extract request data from various formats (parsed once per request)"""
+        data = g.get('request_data')
+        if data is None:
+            data = g.request_data = self._parse_request_data()
+        return data
+    
+    def _parse_request_data(self) -> Dict[str, Any]:
+        """Parse request data from JSON, form or raw body"""
         if request.is_json:
             return request.get_json() or {}
         elif request.form:
@@ -51,6 +142,116 @@ class TelegramMockServer:
                 return {}
         return {}
     
+    def _setup_hooks(self):
+        """Setup per-request hooks around the Bot API handlers"""
+        
+        @self.app.before_request
+        def track_inflight():
+            with self._inflight_condition:
+                self._inflight += 1
+            g.inflight = True
+            g.started = time.perf_counter()
+        
+        @self.app.before_request
+        def before_request():
+            if request.path.startswith('/admin/'):
+                return None
+            method = request.path.rsplit('/', 1)[-1]
+            token = (request.view_args or {}).get('token')
+            
+            # Werkzeug serves each request on its own thread, so the delay
+            # only holds back this request
+            delay = self.latency.delay_for(method, token)
+            if delay:
+                self.stopping.wait(delay)
+            
+            g.profile = self.profiler.begin_request()
+            
+            if self.rate_limiter.enabled and method in RATE_LIMITED_METHODS:
+                chat_id = normalize_chat_id(self._get_request_data().get('chat_id'))
+                retry_after = self.rate_limiter.check(token, chat_id, now=self.clock.monotonic())
+                if retry_after:
+                    return jsonify({
+                        "ok": False,
+                        "error_code": 429,
+                        "description": f"Too Many Requests: retry after {retry_after}",
+                        "parameters": {"retry_after": retry_after}
+                    }), 429
+            return None
+        
+        @self.app.after_request
+        def after_request(response):
+            if request.path.startswith('/admin/'):
+                return response
+            
+            body = response.get_json(silent=True) or {}
+            state = self.state
+            call = state.calls.record({
+                "method": request.path.rsplit('/', 1)[-1],
+                "token": (request.view_args or {}).get('token'),
+                "params": self._get_request_data(),
+                "ok": body.get('ok', False),
+                "result": body.get('result'),
+                "time": self.clock.time()
+            })
+            state.responses.on_call(call)
+            for recorder in self.recorders:
+                recorder.on_call(call)
+            
+            logger = self.logger
+            if logger is not None and logger.access_log:
+                logger.access(call['method'], response.status_code,
+                              (time.perf_counter() - g.started) * 1000,
+                              chat_id=call['params'].get('chat_id'))
+            
+            capture = self.capture
+            if capture.active:
+                chat_id = normalize_chat_id(call['params'].get('chat_id'))
+                if capture.wants(call['method'], chat_id):
+                    capture.record(self._capture_record(call, chat_id, response, body))
+            return response
+        
+        @self.app.teardown_request
+        def teardown_request(exc):
+            profile = g.pop('profile', None)
+            if profile is not None:
+                self.profiler.end_request(profile)
+            
+            if g.pop('inflight', False):
+                with self._inflight_condition:
+                    self._inflight -= 1
+                    self._inflight_condition.notify_all()
+    
+    def _capture_record(self, call: Call, chat_id: Any, response, body: Dict[str, Any]) -> Dict[str, Any]:
+        """Capture record of the current request; uploaded files are listed by name and size"""
+        params = call['params']
+        uploads = []
+        for field, upload in request.files.items(multi=True):
+            stream = upload.stream
+            position = stream.tell()
+            stream.seek(0, 2)
+            size = stream.tell()
+            stream.seek(position)
+            uploads.append({
+                "field": field,
+                "filename": upload.filename,
+                "content_type": upload.mimetype,
+                "size": size
+            })
+        return {
+            "time": call['time'],
+            "method": call['method'],
+            "token": call['token'],
+            "chat_id": chat_id,
+            "params": params,
+            "uploads": uploads,
+            "request_bytes": request.content_length or 0,
+            "status": response.status_code,
+            "ok": call['ok'],
+            "response": body,
+            "duration_ms": round((time.perf_counter() - g.started) * 1000, 3)
+        }
+    
     def _setup_routes(self):
         """Setup Flask routes for Telegram Bot API endpoints"""
         
@@ -60,10 +261,7 @@ class TelegramMockServer:
             return jsonify({
                 "ok": True,
                 "result": {
-                    "id": 123456789,
-                    "is_bot": True,
-                    "first_name": "MockBot",
-                    "username": "mock_bot",
+                    **self.settings.bot_user,
                     "can_join_groups": True,
                     "can_read_all_group_messages": False,
                     "supports_inline_queries": False
@@ -80,21 +278,10 @@ class TelegramMockServer:
             except (ValueError, TypeError):
                 offset, limit, timeout = 0, 100, 0
             
-            updates = []
-            try:
-                # Try to get updates from queue with timeout
-                if timeout > 0:
-                    update = self.updates_queue.get(timeout=min(timeout, 30))
-                    if update['update_id'] >= offset:
-                        updates.append(update)
-                else:
-                    # Get all available updates
-                    while not self.updates_queue.empty() and len(updates) < limit:
-                        update = self.updates_queue.get_nowait()
-                        if update['update_id'] >= offset:
-                            updates.append(update)
-            except queue.Empty:
-                pass
+            limit = max(1, min(limit, 100))
+            state = self.state
+            updates = state.updates.fetch(offset, limit, min(timeout, 30))
+            state.responses.on_deliver(updates)
             
             return jsonify({
                 "ok": True,
@@ -109,18 +296,13 @@ class TelegramMockServer:
             reply_markup = data.get('reply_markup')
             
             message = {
-                "message_id": self._next_message_id(),
-                "from": {
-                    "id": 123456789,
-                    "is_bot": True,
-                    "first_name": "MockBot",
-                    "username": "mock_bot"
-                },
+                "message_id": self._next_message_id(chat_id),
+                "from": self.settings.bot_user,
                 "chat": {
                     "id": chat_id,
                     "type": "private"
                 },
-                "date": int(datetime.now().timestamp()),
+                "date": self.clock.timestamp(),
                 "text": text
             }
             
@@ -174,18 +356,13 @@ class TelegramMockServer:
             caption = data.get('caption', '')
             
             message = {
-                "message_id": self._next_message_id(),
-                "from": {
-                    "id": 123456789,
-                    "is_bot": True,
-                    "first_name": "MockBot",
-                    "username": "mock_bot"
-                },
+                "message_id": self._next_message_id(chat_id),
+                "from": self.settings.bot_user,
                 "chat": {
                     "id": chat_id,
                     "type": "private"
                 },
-                "date": int(datetime.now().timestamp()),
+                "date": self.clock.timestamp(),
                 "photo": [{"file_id": "mock_photo_id", "width": 100, "height": 100}],
                 "caption": caption
             }
@@ -202,18 +379,13 @@ class TelegramMockServer:
             caption = data.get('caption', '')
             
             message = {
-                "message_id": self._next_message_id(),
-                "from": {
-                    "id": 123456789,
-                    "is_bot": True,
-                    "first_name": "MockBot",
-                    "username": "mock_bot"
-                },
+                "message_id": self._next_message_id(chat_id),
+                "from": self.settings.bot_user,
                 "chat": {
                     "id": chat_id,
                     "type": "private"
                 },
-                "date": int(datetime.now().timestamp()),
+                "date": self.clock.timestamp(),
                 "document": {"file_id": "mock_doc_id", "file_name": "document.txt"},
                 "caption": caption
             }
@@ -229,19 +401,14 @@ class TelegramMockServer:
             
             message = {
                 "message_id": data.get('message_id', 1),
-                "from": {
-                    "id": 123456789,
-                    "is_bot": True,
-                    "first_name": "MockBot",
-                    "username": "mock_bot"
-                },
+                "from": self.settings.bot_user,
                 "chat": {
                     "id": data.get('chat_id'),
                     "type": "private"
                 },
-                "date": int(datetime.now().timestamp()),
+                "date": self.clock.timestamp(),
                 "text": data.get('text', ''),
-                "edit_date": int(datetime.now().timestamp())
+                "edit_date": self.clock.timestamp()
             }
             
             return jsonify({
@@ -263,18 +430,13 @@ class TelegramMockServer:
             caption = data.get('caption', '')
             
             message = {
-                "message_id": self._next_message_id(),
-                "from": {
-                    "id": 123456789,
-                    "is_bot": True,
-                    "first_name": "MockBot",
-                    "username": "mock_bot"
-                },
+                "message_id": self._next_message_id(chat_id),
+                "from": self.settings.bot_user,
                 "chat": {
                     "id": chat_id,
                     "type": "private"
                 },
-                "date": int(datetime.now().timestamp()),
+                "date": self.clock.timestamp(),
                 "video": {
                     "file_id": "mock_video_id",
                     "width": 1920,
@@ -296,18 +458,13 @@ class TelegramMockServer:
             caption = data.get('caption', '')
             
             message = {
-                "message_id": self._next_message_id(),
-                "from": {
-                    "id": 123456789,
-                    "is_bot": True,
-                    "first_name": "MockBot",
-                    "username": "mock_bot"
-                },
+                "message_id": self._next_message_id(chat_id),
+                "from": self.settings.bot_user,
                 "chat": {
                     "id": chat_id,
                     "type": "private"
                 },
-                "date": int(datetime.now().timestamp()),
+                "date": self.clock.timestamp(),
                 "audio": {
                     "file_id": "mock_audio_id",
                     "duration": 180,
@@ -327,18 +484,13 @@ class TelegramMockServer:
             chat_id = data.get('chat_id')
             
             message = {
-                "message_id": self._next_message_id(),
-                "from": {
-                    "id": 123456789,
-                    "is_bot": True,
-                    "first_name": "MockBot",
-                    "username": "mock_bot"
-                },
+                "message_id": self._next_message_id(chat_id),
+                "from": self.settings.bot_user,
                 "chat": {
                     "id": chat_id,
                     "type": "private"
                 },
-                "date": int(datetime.now().timestamp()),
+                "date": self.clock.timestamp(),
                 "voice": {
                     "file_id": "mock_voice_id",
                     "duration": 5
@@ -356,18 +508,13 @@ class TelegramMockServer:
             chat_id = data.get('chat_id')
             
             message = {
-                "message_id": self._next_message_id(),
-                "from": {
-                    "id": 123456789,
-                    "is_bot": True,
-                    "first_name": "MockBot",
-                    "username": "mock_bot"
-                },
+                "message_id": self._next_message_id(chat_id),
+                "from": self.settings.bot_user,
                 "chat": {
                     "id": chat_id,
                     "type": "private"
                 },
-                "date": int(datetime.now().timestamp()),
+                "date": self.clock.timestamp(),
                 "sticker": {
                     "file_id": "mock_sticker_id",
                     "width": 512,
@@ -389,18 +536,13 @@ class TelegramMockServer:
             longitude = data.get('longitude', 0.0)
             
             message = {
-                "message_id": self._next_message_id(),
-                "from": {
-                    "id": 123456789,
-                    "is_bot": True,
-                    "first_name": "MockBot",
-                    "username": "mock_bot"
-                },
+                "message_id": self._next_message_id(chat_id),
+                "from": self.settings.bot_user,
                 "chat": {
                     "id": chat_id,
                     "type": "private"
                 },
-                "date": int(datetime.now().timestamp()),
+                "date": self.clock.timestamp(),
                 "location": {
                     "latitude": latitude,
                     "longitude": longitude
@@ -419,21 +561,17 @@ class TelegramMockServer:
             question = data.get('question', 'Poll question?')
             options = data.get('options', ['Option 1', 'Option 2'])
             
+            message_id = self._next_message_id(chat_id)
             message = {
-                "message_id": self._next_message_id(),
-                "from": {
-                    "id": 123456789,
-                    "is_bot": True,
-                    "first_name": "MockBot",
-                    "username": "mock_bot"
-                },
+                "message_id": message_id,
+                "from": self.settings.bot_user,
                 "chat": {
                     "id": chat_id,
                     "type": "private"
                 },
-                "date": int(datetime.now().timestamp()),
+                "date": self.clock.timestamp(),
                 "poll": {
-                    "id": f"poll_{self.message_id_counter}",
+                    "id": f"poll_{message_id}",
                     "question": question,
                     "options": [{"text": opt, "voter_count": 0} for opt in options],
                     "is_closed": False,
@@ -461,19 +599,14 @@ class TelegramMockServer:
             
             message = {
                 "message_id": data.get('message_id', 1),
-                "from": {
-                    "id": 123456789,
-                    "is_bot": True,
-                    "first_name": "MockBot",
-                    "username": "mock_bot"
-                },
+                "from": self.settings.bot_user,
                 "chat": {
                     "id": data.get('chat_id'),
                     "type": "private"
                 },
-                "date": int(datetime.now().timestamp()),
+                "date": self.clock.timestamp(),
                 "text": "Message with updated markup",
-                "edit_date": int(datetime.now().timestamp())
+                "edit_date": self.clock.timestamp()
             }
             
             return jsonify({
@@ -491,31 +624,52 @@ class TelegramMockServer:
         @self.app.route('/bot<token>/getChatMember', methods=['POST', 'GET'])
         def get_chat_member(token):
             data = self._get_request_data()
-            user_id = data.get('user_id', self.chat_id)
+            chat_id = normalize_chat_id(data.get('chat_id', self.chat_id))
+            user_id = normalize_chat_id(data.get('user_id', self.chat_id))
+            
+            state = self.state
+            if chat_id not in state.groups and chat_id not in state.users:
+                return jsonify({
+                    "ok": False,
+                    "error_code": 400,
+                    "description": "Bad Request: chat not found"
+                }), 400
+            user = state.users.get(user_id)
+            if user is None:
+                return jsonify({
+                    "ok": False,
+                    "error_code": 400,
+                    "description": "Bad Request: user not found"
+                }), 400
+            
+            members = state.group_members.get(chat_id)
+            if members is not None:
+                status = "member" if user_id in members else "left"
+            else:
+                status = "member" if user_id == chat_id else "left"
             
             return jsonify({
                 "ok": True,
                 "result": {
-                    "user": {
-                        "id": user_id,
-                        "is_bot": False,
-                        "first_name": "TestUser",
-                        "username": "test_user"
-                    },
-                    "status": "member"
+                    "user": user,
+                    "status": status
                 }
             })
         
         @self.app.route('/bot<token>/getChat', methods=['POST', 'GET'])
         def get_chat(token):
+            data = self._get_request_data()
+            chat = self.get_chat(data.get('chat_id', self.chat_id))
+            if chat is None:
+                return jsonify({
+                    "ok": False,
+                    "error_code": 400,
+                    "description": "Bad Request: chat not found"
+                }), 400
+            
             return jsonify({
                 "ok": True,
-                "result": {
-                    "id": self.chat_id,
-                    "type": "private",
-                    "first_name": "TestUser",
-                    "username": "test_user"
-                }
+                "result": chat
             })
         
         @self.app.route('/bot<token>/answerInlineQuery', methods=['POST'])
@@ -523,10 +677,23 @@ class TelegramMockServer:
             data = self._get_request_data()
             inline_query_id = data.get('inline_query_id')
             results = data.get('results', [])
+            try:
+                cache_time = int(data.get('cache_time', DEFAULT_CACHE_TIME))
+            except (ValueError, TypeError):
+                return jsonify({
+                    "ok": False,
+                    "error_code": 400,
+                    "description": "Bad Request: cache_time must be an integer"
+                }), 400
             
-            # Store results for testing purposes
-            if hasattr(self, 'inline_results_cache'):
-                self.inline_results_cache[inline_query_id] = results
+            # Cache the answer the way Telegram does, so repeated queries skip the bot
+            self.state.inline_cache.store(
+                str(inline_query_id),
+                results,
+                cache_time=cache_time,
+                is_personal=bool(data.get('is_personal', False)),
+                next_offset=str(data.get('next_offset', ''))
+            )
             
             return jsonify({
                 "ok": True,
@@ -549,49 +716,330 @@ class TelegramMockServer:
                 "result": True
             })
     
-    def _next_message_id(self) -> int:
-        """Generate next message ID"""
-        with self.id_lock:
-            msg_id = self.message_id_counter
-            self.message_id_counter += 1
-            return msg_id
-
+    def _setup_admin_routes(self):
+        """Setup Flask routes for the admin control plane"""
+        
+        @self.app.route('/admin/profile/start', methods=['POST'])
+        def admin_profile_start():
+            data = self._get_request_data()
+            try:
+                sample_every = int(data.get('sample_every', 1))
+            except (ValueError, TypeError):
+                sample_every = 1
+            
+            self.profiler.start(sample_every=sample_every)
+            return jsonify({
+                "ok": True,
+                "result": self.profiler.status()
+            })
+        
+        @self.app.route('/admin/profile/stop', methods=['POST'])
+        def admin_profile_stop():
+            return jsonify({
+                "ok": True,
+                "result": self.profiler.stop()
+            })
+        
+        @self.app.route('/admin/profile/status', methods=['GET'])
+        def admin_profile_status():
+            return jsonify({
+                "ok": True,
+                "result": self.profiler.status()
+            })
+        
+        @self.app.route('/admin/profile/report', methods=['GET'])
+        def admin_profile_report():
+            report_format = request.args.get('format', 'pstats')
+            sort = request.args.get('sort', 'cumulative')
+            limit = request.args.get('limit', 50, type=int)
+            
+            try:
+                report = self.profiler.report(format=report_format, sort=sort, limit=limit)
+            except (ValueError, KeyError) as e:
+                return jsonify({
+                    "ok": False,
+                    "error_code": 400,
+                    "description": f"Bad Request: {e}"
+                }), 400
+            
+            return Response(report, mimetype='text/plain')
+        
+        @self.app.route('/admin/capture/start', methods=['POST'])
+        def admin_capture_start():
+            data = self._get_request_data()
+            if 'path' in data:
+                # The server would open the path for writing, so only the Python API may name one
+                return jsonify({
+                    "ok": False,
+                    "error_code": 400,
+                    "description": "Bad Request: capture files can only be written from the Python API; "
+                                   "read records from /admin/capture/entries"
+                }), 400
+            try:
+                status = self.capture.start(
+                    format=data.get('format', 'jsonl'),
+                    methods=data.get('methods'),
+                    chats=data.get('chats'),
+                    capacity=data.get('capacity'),
+                    flush_interval=float(data.get('flush_interval', 1.0))
+                )
+            except (ValueError, TypeError) as e:
+                return jsonify({
+                    "ok": False,
+                    "error_code": 400,
+                    "description": f"Bad Request: {e}"
+                }), 400
+            
+            return jsonify({
+                "ok": True,
+                "result": status
+            })
+        
+        @self.app.route('/admin/capture/stop', methods=['POST'])
+        def admin_capture_stop():
+            return jsonify({
+                "ok": True,
+                "result": self.capture.stop()
+            })
+        
+        @self.app.route('/admin/capture/status', methods=['GET'])
+        def admin_capture_status():
+            return jsonify({
+                "ok": True,
+                "result": self.capture.status()
+            })
+        
+        @self.app.route('/admin/capture/entries', methods=['GET'])
+        def admin_capture_entries():
+            return jsonify({
+                "ok": True,
+                "result": self.capture.entries(
+                    method=request.args.get('method'),
+                    chat_id=request.args.get('chat_id'),
+                    since=request.args.get('since', 0, type=int),
+                    limit=request.args.get('limit', type=int)
+                )
+            })
+        
+        @self.app.route('/admin/rate-limits', methods=['GET', 'POST'])
+        def admin_rate_limits():
+            if request.method == 'POST':
+                data = self._get_request_data()
+                try:
+                    self.rate_limiter.configure(**data)
+                except (ValueError, TypeError) as e:
+                    return jsonify({
+                        "ok": False,
+                        "error_code": 400,
+                        "description": f"Bad Request: {e}"
+                    }), 400
+            
+            return jsonify({
+                "ok": True,
+                "result": self.rate_limiter.stats()
+            })
+        
+        @self.app.route('/admin/rate-limits/reset', methods=['POST'])
+        def admin_rate_limits_reset():
+            self.rate_limiter.reset()
+            return jsonify({
+                "ok": True,
+                "result": True
+            })
+        
+        @self.app.route('/admin/latency', methods=['GET', 'POST'])
+        def admin_latency():
+            if request.method == 'POST':
+                data = dict(self._get_request_data())
+                method = data.pop('method', '*')
+                token = data.pop('token', None)
+                if 'file' in data:
+                    # Sample files are read on the server, so only the CLI and Python API may name one
+                    return jsonify({
+                        "ok": False,
+                        "error_code": 400,
+                        "description": "Bad Request: replayed latencies must be given inline as samples"
+                    }), 400
+                try:
+                    self.latency.set_latency(method, token=token, **data)
+                except (ValueError, TypeError) as e:
+                    return jsonify({
+                        "ok": False,
+                        "error_code": 400,
+                        "description": f"Bad Request: {e}"
+                    }), 400
+            
+            return jsonify({
+                "ok": True,
+                "result": self.latency.describe()
+            })
+        
+        @self.app.route('/admin/latency/clear', methods=['POST'])
+        def admin_latency_clear():
+            data = self._get_request_data()
+            self.latency.clear(data.get('method'), token=data.get('token'))
+            return jsonify({
+                "ok": True,
+                "result": self.latency.describe()
+            })
+        
+        @self.app.route('/admin/clock', methods=['GET', 'POST'])
+        def admin_clock():
+            if request.method == 'POST':
+                data = self._get_request_data()
+                try:
+                    if 'mode' in data:
+                        self.clock.set_mode(data['mode'], data.get('time'))
+                    if 'advance' in data:
+                        self.clock.advance(float(data['advance']))
+                except (ValueError, TypeError, RuntimeError) as e:
+                    return jsonify({
+                        "ok": False,
+                        "error_code": 400,
+                        "description": f"Bad Request: {e}"
+                    }), 400
+            
+            return jsonify({
+                "ok": True,
+                "result": {
+                    "mode": self.clock.mode,
+                    "time": self.clock.time()
+                }
+            })
+        
+        @self.app.route('/admin/responses', methods=['GET'])
+        def admin_responses():
+            return jsonify({
+                "ok": True,
+                "result": self.response_stats()
+            })
+        
+        @self.app.route('/admin/updates/batch', methods=['POST'])
+        def admin_updates_batch():
+            try:
+                if request.is_json:
+                    data = request.get_json()
+                    specs = data.get('updates', []) if isinstance(data, dict) else data
+                else:
+                    # JSON Lines, one spec per line
+                    specs = [json.loads(line) for line in request.get_data().splitlines() if line.strip()]
+                updates = self.inject_batch(specs)
+            except (ValueError, TypeError, AttributeError, KeyError) as e:
+                return jsonify({
+                    "ok": False,
+                    "error_code": 400,
+                    "description": f"Bad Request: {e}"
+                }), 400
+            
+            return jsonify({
+                "ok": True,
+                "result": {
+                    "count": len(updates),
+                    "first_update_id": updates[0]['update_id'] if updates else None,
+                    "last_update_id": updates[-1]['update_id'] if updates else None
+                }
+            })
+        
+        @self.app.route('/admin/memory/snapshot', methods=['GET'])
+        def admin_memory_snapshot():
+            limit = request.args.get('limit', 10, type=int)
+            return jsonify({
+                "ok": True,
+                "result": self.profiler.memory_snapshot(limit=limit)
+            })
+        
+        @self.app.route('/admin/memory/stop', methods=['POST'])
+        def admin_memory_stop():
+            self.profiler.stop_memory_tracing()
+            return jsonify({
+                "ok": True,
+                "result": True
+            })
+    
+    def _next_message_id(self, chat_id: Any = None) -> int:
+        """Generate the next message ID in a chat (default: the default chat)"""
+        if chat_id is None:
+            chat_id = self.chat_id
+        return self.state.ids.next_message_id(normalize_chat_id(chat_id))
+    
     def _next_update_id(self) -> int:
         """Generate next update ID"""
-        with self.id_lock:
-            update_id = self.update_id_counter
-            self.update_id_counter += 1
-            return update_id
+        return self.state.ids.next_update_id()
     
-    def send_user_message(self, text: str, from_user: Optional[Dict] = None) -> Dict[str, Any]:
+    def _next_callback_query_id(self) -> str:
+        """Generate next callback query ID"""
+        return self.state.ids.next_callback_query_id()
+    
+    def create_users(self, count: int) -> List[SimulatedUser]:
+        """
+        Create simulated users, each with a private chat with the bot
+        
+        Users are stored compactly in the state's registry, so populations
+        of 100k users and more are cheap; getChat and getChatMember answer
+        for them in O(1).
+        
+        Args:
+            count: Number of users
+            
+        Returns:
+            Handles to pass to send_user_message(), send_callback_query()
+            and inject_batch(), or to drive the users directly
+        """
+        return [SimulatedUser(self, user_id) for user_id in self.state.users.create_ids(count)]
+    
+    def get_user(self, user_id: int) -> Optional[SimulatedUser]:
+        """Handle of a registered user, or None"""
+        return SimulatedUser(self, user_id) if user_id in self.state.users else None
+    
+    def get_chat(self, chat_id: Any) -> Optional[Dict[str, Any]]:
+        """A group or a user's private chat by ID, or None if there is no such chat"""
+        chat_id = normalize_chat_id(chat_id)
+        state = self.state
+        return state.groups.get(chat_id) or state.users.private_chat(chat_id)
+    
+    def _resolve_user(self, user: UserRef) -> Dict[str, Any]:
+        """User object of a handle, user ID or user object (registered on first use)"""
+        if isinstance(user, dict):
+            return self.state.users.register(user)
+        user_id = user.id if isinstance(user, SimulatedUser) else user
+        resolved = self.state.users.get(user_id)
+        if resolved is None:
+            raise ValueError(f"Unknown user {user_id}")
+        return resolved
+    
+    def send_user_message(self, text: str, from_user: Optional[Dict] = None,
+                          user: Optional[UserRef] = None) -> Dict[str, Any]:
         """
         Simulate a user sending a message to the bot
         
         Args:
             text: Message text
-            from_user: User information (optional)
+            from_user: User information (optional; the message still goes
+                to the default chat)
+            user: Send from this user's private chat instead: a handle from
+                create_users(), a user ID or a user object
             
         Returns:
             The created update object
         """
-        if from_user is None:
-            from_user = {
+        if user is not None:
+            from_user = self._resolve_user(user)
+            chat = self.state.users.private_chat(from_user['id'])
+        else:
+            if from_user is None:
+                from_user = self.settings.default_user
+            chat = {
                 "id": self.chat_id,
-                "is_bot": False,
-                "first_name": "TestUser",
-                "username": "test_user"
+                "type": "private",
+                "first_name": from_user.get("first_name", self.settings.user.first_name),
+                "username": from_user.get("username", self.settings.user.username)
             }
         
         message = {
-            "message_id": self._next_message_id(),
+            "message_id": self._next_message_id(chat['id']),
             "from": from_user,
-            "chat": {
-                "id": self.chat_id,
-                "type": "private",
-                "first_name": from_user.get("first_name", "TestUser"),
-                "username": from_user.get("username", "test_user")
-            },
-            "date": int(datetime.now().timestamp()),
+            "chat": chat,
+            "date": self.clock.timestamp(),
             "text": text
         }
         
@@ -600,7 +1048,7 @@ class TelegramMockServer:
             "message": message
         }
         
-        self.updates_queue.put(update)
+        self.enqueue_update(update)
         self.messages_history.append({
             "type": "user",
             "message": message
@@ -608,38 +1056,33 @@ class TelegramMockServer:
         
         return update
     
-    def send_callback_query(self, data: str, message_id: Optional[int] = None) -> Dict[str, Any]:
+    def send_callback_query(self, data: str, message_id: Optional[int] = None,
+                            user: Optional[UserRef] = None) -> Dict[str, Any]:
         """
         Simulate a user clicking an inline button
         
         Args:
             data: Callback data
-            message_id: Message ID (optional)
+            message_id: Message ID (default: the chat's latest message)
+            user: Press the button in this user's private chat (default:
+                the default chat): a handle, a user ID or a user object
             
         Returns:
             The created update object
         """
+        from_user = self._resolve_user(user) if user is not None else self.settings.default_user
+        chat_id = from_user['id'] if user is not None else self.chat_id
         callback_query = {
-            "id": str(self._next_update_id()),
-            "from": {
-                "id": self.chat_id,
-                "is_bot": False,
-                "first_name": "TestUser",
-                "username": "test_user"
-            },
+            "id": self._next_callback_query_id(),
+            "from": from_user,
             "message": {
-                "message_id": message_id or self.message_id_counter - 1,
-                "from": {
-                    "id": 123456789,
-                    "is_bot": True,
-                    "first_name": "MockBot",
-                    "username": "mock_bot"
-                },
+                "message_id": message_id or self.state.ids.last_message_id(chat_id),
+                "from": self.settings.bot_user,
                 "chat": {
-                    "id": self.chat_id,
+                    "id": chat_id,
                     "type": "private"
                 },
-                "date": int(datetime.now().timestamp()),
+                "date": self.clock.timestamp(),
                 "text": "Button message"
             },
             "chat_instance": "123456789",
@@ -651,10 +1094,315 @@ class TelegramMockServer:
             "callback_query": callback_query
         }
         
-        self.updates_queue.put(update)
+        self.enqueue_update(update)
         
         return update
     
+    def add_recorder(self, recorder: Any):
+        """
+        Notify a recorder of injected updates and Bot API calls
+        
+        The recorder needs on_update(update) and on_call(call) methods. The
+        list is replaced rather than mutated, so request threads iterating
+        the old one are unaffected. Adding a recorder twice has no effect.
+        """
+        with self.recorders_lock:
+            if recorder not in self.recorders:
+                self.recorders = self.recorders + [recorder]
+    
+    def remove_recorder(self, recorder: Any):
+        """Stop notifying a recorder added with add_recorder()"""
+        with self.recorders_lock:
+            self.recorders = [r for r in self.recorders if r is not recorder]
+    
+    def enqueue_update(self, update: Dict[str, Any]):
+        """
+        Queue an update for getUpdates
+        
+        All simulated user activity goes through here. Waits started after
+        this call only match bot calls made after it.
+        """
+        state = self.state
+        state.calls.mark_injection()
+        state.responses.on_enqueue(update)
+        state.updates.put(update)
+        for recorder in self.recorders:
+            recorder.on_update(update)
+    
+    def inject_batch(self, specs: Iterable[Union[str, Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """
+        Queue many updates at once
+        
+        Update IDs for the whole batch are taken in one step, the updates are
+        appended to the update log and history in bulk, and long-polling
+        requests are woken once.
+        
+        Args:
+            specs: One spec per update, each either a message text or a dict:
+                {"text", "chat_id"?, "from"?, "chat"?, "entities"?} for a message,
+                {"callback_data", "message_id"?, "chat_id"?, "from"?} for a
+                button press, or {"update": {...}} for any other update
+                payload (its update_id is assigned here). Instead of
+                "chat_id" and "from", messages and button presses may give
+                a "user" (handle, user ID or user object) to use that
+                user's private chat
+            
+        Returns:
+            The created updates, in order
+        """
+        specs = [spec if isinstance(spec, dict) else {"text": spec} for spec in specs]
+        if not specs:
+            return []
+        
+        state = self.state
+        update_ids = state.ids.take_update_ids(len(specs))
+        
+        date = self.clock.timestamp()
+        groups = state.groups
+        chats: Dict[Any, Dict[str, Any]] = {}
+        users: Dict[Any, Dict[str, Any]] = {}
+        updates = []
+        history = []
+        
+        self._build_batch(specs, updates, history, update_ids, state.ids, date, groups, chats, users)
+        state.calls.mark_injection()
+        state.responses.on_enqueue_many(updates)
+        state.updates.put_many(updates)
+        state.messages_history.extend(history)
+        
+        for recorder in self.recorders:
+            for update in updates:
+                recorder.on_update(update)
+        
+        return updates
+    
+    def _build_batch(self, specs, updates, history, update_ids, ids, date, groups, chats, users):
+        """Build the updates of inject_batch() in a tight loop"""
+        next_message_id = ids.next_message_id
+        for spec, update_id in zip(specs, update_ids):
+            if 'update' in spec:
+                update = dict(spec['update'])
+                update['update_id'] = update_id
+            else:
+                user = spec.get('user')
+                if user is not None:
+                    from_user = self._resolve_user(user)
+                    chat_id = from_user['id']
+                else:
+                    chat_id = normalize_chat_id(spec.get('chat_id', self.chat_id))
+                    from_user = spec.get('from')
+                if from_user is None:
+                    from_user = users.get(chat_id)
+                    if from_user is None:
+                        from_user = users[chat_id] = {
+                            "id": chat_id if chat_id not in groups else self.chat_id,
+                            "is_bot": False,
+                            "first_name": self.settings.user.first_name,
+                            "username": self.settings.user.username
+                        }
+                chat = spec.get('chat')
+                if chat is None:
+                    chat = chats.get(chat_id)
+                    if chat is None:
+                        chat = chats[chat_id] = groups.get(chat_id) or {
+                            "id": chat_id,
+                            "type": "private",
+                            "first_name": from_user.get("first_name", self.settings.user.first_name),
+                            "username": from_user.get("username", self.settings.user.username)
+                        }
+                
+                if 'text' in spec:
+                    message = {
+                        "message_id": next_message_id(chat['id']),
+                        "from": from_user,
+                        "chat": chat,
+                        "date": date,
+                        "text": spec['text']
+                    }
+                    if 'entities' in spec:
+                        message["entities"] = spec['entities']
+                    history.append({"type": "user", "message": message})
+                    update = {"update_id": update_id, "message": message}
+                else:
+                    update = {
+                        "update_id": update_id,
+                        "callback_query": {
+                            "id": ids.next_callback_query_id(),
+                            "from": from_user,
+                            "message": {
+                                "message_id": spec.get('message_id') or ids.last_message_id(chat['id']),
+                                "chat": chat,
+                                "date": date
+                            },
+                            "chat_instance": str(chat['id']),
+                            "data": spec.get('callback_data', '')
+                        }
+                    }
+            updates.append(update)
+    
+    def wait_for_call(self, method: str, predicate: Optional[Callable[[Call], bool]] = None,
+                      timeout: float = 5.0, since: Optional[int] = None) -> Call:
+        """
+        Block until the bot makes a matching Bot API call
+        
+        Calls made since the last injected update count, so a reply that
+        arrives before the wait starts is not missed. Consecutive waits for
+        the same method return consecutive calls.
+        
+        Args:
+            method: Bot API method name, e.g. "answerCallbackQuery"
+            predicate: Extra condition on the call record (optional)
+            timeout: Seconds to wait
+            since: Only match calls with a greater seq (optional)
+            
+        Returns:
+            The call record (method, token, params, ok, result, time, seq)
+            
+        Raises:
+            TimeoutError: If no matching call arrives in time
+        """
+        def match(call):
+            return call['method'] == method and (predicate is None or predicate(call))
+        
+        return self._wait(match, ('call', method), timeout, since, f"{method} call")
+    
+    def wait_for_bot_message(self, chat_id: Optional[int] = None,
+                             predicate: Optional[Callable[[Dict[str, Any]], bool]] = None,
+                             timeout: float = 5.0, since: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Block until the bot sends or edits a matching message
+        
+        Args:
+            chat_id: Only match messages in this chat (optional)
+            predicate: Extra condition on the message (optional)
+            timeout: Seconds to wait
+            since: Only match calls with a greater seq (optional)
+            
+        Returns:
+            The message as returned to the bot
+            
+        Raises:
+            TimeoutError: If no matching message arrives in time
+        """
+        match = self._bot_message_matcher(chat_id, predicate)
+        return self._wait(match, ('message', chat_id), timeout, since, "bot message")['result']
+    
+    async def wait_for_call_async(self, method: str, predicate: Optional[Callable[[Call], bool]] = None,
+                                  timeout: float = 5.0, since: Optional[int] = None) -> Call:
+        """Async variant of wait_for_call()"""
+        def match(call):
+            return call['method'] == method and (predicate is None or predicate(call))
+        
+        return await self._wait_async(match, ('call', method), timeout, since, f"{method} call")
+    
+    async def wait_for_bot_message_async(self, chat_id: Optional[int] = None,
+                                         predicate: Optional[Callable[[Dict[str, Any]], bool]] = None,
+                                         timeout: float = 5.0, since: Optional[int] = None) -> Dict[str, Any]:
+        """Async variant of wait_for_bot_message()"""
+        match = self._bot_message_matcher(chat_id, predicate)
+        call = await self._wait_async(match, ('message', chat_id), timeout, since, "bot message")
+        return call['result']
+    
+    @staticmethod
+    def _bot_message_matcher(chat_id: Optional[int], predicate: Optional[Callable[[Dict[str, Any]], bool]]):
+        """Build a call matcher for messages sent or edited by the bot"""
+        def match(call):
+            if call['method'] not in BOT_MESSAGE_METHODS or not call['ok']:
+                return False
+            message = call['result']
+            if not isinstance(message, dict):
+                return False
+            if chat_id is not None and message.get('chat', {}).get('id') != chat_id:
+                return False
+            return predicate is None or predicate(message)
+        
+        return match
+    
+    def _wait(self, match, key, timeout: float, since: Optional[int], what: str) -> Call:
+        """Wait on the current call log using an event"""
+        calls = self.state.calls
+        done = threading.Event()
+        received: List[Call] = []
+        errors: List[Exception] = []
+        
+        def callback(call):
+            received.append(call)
+            done.set()
+        
+        def on_error(error):
+            errors.append(error)
+            done.set()
+        
+        call, waiter = calls.find_or_wait(match, key, since, callback, on_error)
+        if call is None:
+            if not done.wait(timeout):
+                calls.cancel(waiter)
+                if not received and not errors:
+                    raise TimeoutError(f"No matching {what} within {timeout}s")
+            if errors:
+                raise errors[0]
+            call = received[0]
+        
+        calls.advance(key, call['seq'])
+        return call
+    
+    async def _wait_async(self, match, key, timeout: float, since: Optional[int], what: str) -> Call:
+        """Wait on the current call log using a future on the running loop"""
+        calls = self.state.calls
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        
+        def resolve(call):
+            if not future.done():
+                future.set_result(call)
+        
+        def reject(error):
+            if not future.done():
+                future.set_exception(error)
+        
+        def callback(call):
+            loop.call_soon_threadsafe(resolve, call)
+        
+        def on_error(error):
+            loop.call_soon_threadsafe(reject, error)
+        
+        call, waiter = calls.find_or_wait(match, key, since, callback, on_error)
+        if call is None:
+            try:
+                call = await asyncio.wait_for(future, timeout)
+            except asyncio.TimeoutError:
+                calls.cancel(waiter)
+                raise TimeoutError(f"No matching {what} within {timeout}s") from None
+        
+        calls.advance(key, call['seq'])
+        return call
+    
+    def response_stats(self) -> Dict[str, Any]:
+        """
+        Bot response latencies since the last reset
+        
+        Each injected update is timed from enqueue to getUpdates delivery,
+        from delivery to the bot's first reply, and from delivery to the last
+        edit of that reply. Replies are matched by reply_to_message_id,
+        callback or inline query ID, or else as the first response in the
+        update's chat after delivery.
+        
+        Returns:
+            Latency percentiles in milliseconds, overall and per update type
+            and command
+        """
+        return self.state.responses.report()
+    
+    def inline_cache_stats(self) -> Dict[str, Any]:
+        """
+        Inline results cache counters since the last reset
+        
+        Returns:
+            Hits, misses, answers, expired and evicted entries, the hit ratio
+            and the number of cached answers
+        """
+        return self.state.inline_cache.report()
+    
     def get_messages_history(self) -> List[Dict[str, Any]]:
         """Get all messages history"""
         return self.messages_history
@@ -663,9 +1411,207 @@ class TelegramMockServer:
         """Clear messages history"""
         self.messages_history.clear()
     
+    def reset(self):
+        """
+        Reset all test-visible state in O(1)
+        
+        Swaps in a fresh generation of updates, history and ID counters and
+        restores the configured rate-limit and latency settings and the
+        real-time clock. Long-polls
+        waiting on the old generation return immediately.
+        """
+        if self.clock.mode != Clock.REAL:
+            self.clock.use_real()
+        old_state = self.state
+        self.state = ServerState(generation=old_state.generation + 1, clock=self.clock, settings=self.settings)
+        old_state.updates.close()
+        
+        self.bot_token = None
+        self.rate_limiter = RateLimiter()
+        self.latency = LatencyInjector()
+        self._apply_runtime_settings()
+    
+    def apply_settings(self, settings: Settings, sections: Iterable[str] = HOT_RELOAD_SECTIONS):
+        """
+        Apply new settings to the running server
+        
+        Only the given sections are taken from settings. Latency rules and
+        rate limits are swapped in at once and retention bounds resize the
+        live state; open connections and pending updates are untouched.
+        
+        Args:
+            settings: Newly compiled settings
+            sections: Sections to take over (default: latency, rate_limit, retention)
+        """
+        self.settings = self.settings.replace_sections(settings, sections)
+        self._apply_runtime_settings()
+        retention = self.settings.retention
+        state = self.state
+        state.calls.resize(retention.calls)
+        state.responses.resize(retention.tracked_responses)
+        state.inline_cache.resize(retention.inline_cache)
+    
+    def _apply_runtime_settings(self):
+        """Configure rate limiting and latency from the current settings"""
+        settings = self.settings
+        if (self.rate_limiter.enabled != settings.rate_limit_enabled
+                or self.rate_limiter.limits != settings.rate_limits):
+            self.rate_limiter.configure(enabled=settings.rate_limit_enabled, **settings.rate_limits)
+        self.latency.replace_rules(settings.latency_rules)
+    
+    def watch_config(self, config_file: str, interval: float = 1.0,
+                     customize: Optional[Callable[[Config], None]] = None) -> ConfigWatcher:
+        """
+        Hot-reload latency, rate-limit and retention settings when a config file changes
+        
+        Args:
+            config_file: YAML or JSON config file
+            interval: Seconds between checks
+            customize: Called with each reloaded Config before it is applied,
+                e.g. to reapply command-line options
+            
+        Returns:
+            The running watcher (stopped by stop() or unwatch_config())
+        """
+        self.unwatch_config()
+        self.config_watcher = ConfigWatcher(config_file, self.apply_settings, interval, customize).start()
+        return self.config_watcher
+    
+    def unwatch_config(self):
+        """Stop watching the config file"""
+        if self.config_watcher is not None:
+            self.config_watcher.stop()
+            self.config_watcher = None
+    
+    def snapshot(self) -> ServerState:
+        """
+        Capture the current state for a later restore()
+        
+        Covers pending updates, history, ID counters, groups and inline
+        results. Only containers are copied; messages, updates and users are
+        shared with the live state, so snapshots of large setups stay cheap.
+        
+        Injections are not paused. An injection still in flight may be
+        missing from the snapshot, but the snapshot's ID counters are always
+        past every update and message it holds, so restoring it never hands
+        out a duplicate ID.
+        
+        Returns:
+            An opaque snapshot to pass to restore()
+        """
+        return self.state.copy()
+    
+    def restore(self, snapshot: ServerState):
+        """
+        Return to a snapshot taken with snapshot()
+        
+        The snapshot itself is left untouched, so it can be restored any
+        number of times. Long-polls waiting on the replaced state return
+        immediately, and injections in flight during the swap land in the
+        replaced state.
+        """
+        old_state = self.state
+        self.state = snapshot.copy(generation=old_state.generation + 1)
+        old_state.updates.close()
+    
+    def start(self, host: Optional[str] = None, port: int = 0) -> Tuple[str, int]:
+        """
+        Start serving in a background thread
+        
+        The socket is listening by the time this returns, so no sleep is
+        needed before the first request.
+        
+        Args:
+            host: Host to bind (default: the server's host)
+            port: Port to bind (default: 0, an ephemeral port)
+            
+        Returns:
+            The bound (host, port) address
+        """
+        if self._http_server is not None:
+            raise RuntimeError("Server is already running")
+        
+        self._bind(host, port)
+        self._serve_thread = threading.Thread(
+            target=self._http_server.serve_forever,
+            name=f"supermock-{self.port}",
+            daemon=True
+        )
+        self._serve_thread.start()
+        return self.host, self.port
+    
+    def stop(self, timeout: float = 5.0):
+        """
+        Stop serving and close the socket
+        
+        Long-polling getUpdates calls return immediately and in-flight
+        requests are given up to timeout seconds to finish.
+        """
+        self.unwatch_config()
+        http_server = self._http_server
+        if http_server is None:
+            return
+        
+        self.stopping.set()
+        self.updates_queue.close()
+        http_server.shutdown()
+        
+        deadline = time.monotonic() + timeout
+        with self._inflight_condition:
+            while self._inflight:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._inflight_condition.wait(remaining)
+        
+        http_server.server_close()
+        if self._serve_thread is not None and self._serve_thread is not threading.current_thread():
+            self._serve_thread.join(timeout)
+        
+        self._http_server = None
+        self._serve_thread = None
+        self.ready.clear()
+        self.capture.stop()
+    
+    def _bind(self, host: Optional[str], port: int):
+        """Create the listening HTTP server"""
+        if host is not None:
+            self.host = host
+        self._http_server = make_server(self.host, port, self.app, threaded=True,
+                                        request_handler=QuietRequestHandler)
+        self.port = self._http_server.server_port
+        self.stopping.clear()
+        self.updates_queue.open()
+        self.ready.set()
+    
+    def __enter__(self) -> 'TelegramMockServer':
+        if self._http_server is None:
+            self.start()
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+    
+    def _announce(self, message: str):
+        """Startup message, through the logger if there is one"""
+        if self.logger is not None:
+            self.logger.info(message)
+        else:
+            print(message)
+    
     def run(self, debug: bool = False):
-        """Start the mock server"""
-        print(f"SuperMock Telegram Bot API Server started at http://{self.host}:{self.port}")
-        print(f"Use this as your bot API base URL: http://{self.host}:{self.port}/bot<YOUR_TOKEN>")
-        print(f"Example: http://{self.host}:{self.port}/bot123456:ABC-DEF/getMe")
-        self.app.run(host=self.host, port=self.port, debug=debug, use_reloader=False)
\ No newline at end of file
+        """Start the mock server and block until it is stopped"""
+        if debug:
+            self._announce(f"SuperMock Telegram Bot API Server started at http://{self.host}:{self.port}")
+            self.app.run(host=self.host, port=self.port, debug=debug, use_reloader=False)
+            return
+        
+        self._bind(self.host, self.port)
+        self._announce(f"SuperMock Telegram Bot API Server started at http://{self.host}:{self.port}")
+        self._announce(f"Use this as your bot API base URL: http://{self.host}:{self.port}/bot<YOUR_TOKEN>")
+        self._announce(f"Example: http://{self.host}:{self.port}/bot123456:ABC-DEF/getMe")
+        try:
+            # Werkzeug's serve_forever swallows KeyboardInterrupt; let it reach the caller
+            socketserver.BaseServer.serve_forever(self._http_server)
+        finally:
+            self.stop()
@@ -0,0 +1,301 @@
+"""
+Bot response tracking for SuperMock
+
+Links every injected update to the Bot API calls it caused and measures three
+times per update: enqueue to getUpdates delivery, delivery to the bot's first
+reply, and delivery to the last edit of that reply. Times are kept in
+histograms per update type and command.
+"""
+
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Dict, Hashable, List, Any, Optional, Tuple
+
+from .ids import normalize_chat_id
+from ..utils.histogram import LatencyHistogram
+
+
+# Bot API methods whose result is a message sent or edited by the bot
+BOT_MESSAGE_METHODS = frozenset((
+    'sendMessage', 'sendPhoto', 'sendDocument', 'sendVideo', 'sendAudio', 'sendVoice',
+    'sendSticker', 'sendLocation', 'sendPoll', 'editMessageText', 'editMessageReplyMarkup'
+))
+
+# Calls that count as the bot answering an update
+RESPONSE_METHODS = BOT_MESSAGE_METHODS | {'answerCallbackQuery', 'answerInlineQuery'}
+
+# Calls that edit an earlier message
+EDIT_METHODS = frozenset(('editMessageText', 'editMessageReplyMarkup', 'editMessageCaption', 'editMessageMedia'))
+
+# Measured stages, in the order they happen
+STAGES = ('delivery', 'first_reply', 'last_edit')
+
+# Oldest tracked updates are dropped beyond this many
+MAX_TRACKED = 100000
+
+
+class TrackedUpdate:
+    """Timing of one injected update"""
+
+    __slots__ = ('update_id', 'group', 'keys', 'enqueued_at', 'delivered_at', 'replied', 'last_edit_at', 'done')
+
+    def __init__(self, update_id: int, group: Tuple[str, Optional[str]], keys: List[Hashable], enqueued_at: float):
+        self.update_id = update_id
+        self.group = group
+        self.keys = keys
+        self.enqueued_at = enqueued_at
+        self.delivered_at: Optional[float] = None
+        self.replied = False
+        self.last_edit_at: Optional[float] = None
+        self.done = False
+
+
+class ResponseTracker:
+    """Correlates updates with bot replies and keeps latency histograms"""
+
+    def __init__(self, max_tracked: int = MAX_TRACKED):
+        self.lock = threading.Lock()
+        self.max_tracked = max_tracked
+        # Enqueued but not yet delivered: update_id -> (update, enqueued_at);
+        # updates are only classified once delivered
+        self.undelivered: 'OrderedDict[int, Tuple[Dict[str, Any], float]]' = OrderedDict()
+        # Delivered and waiting for a first reply, by update_id and by reply key
+        self.awaiting: 'OrderedDict[int, TrackedUpdate]' = OrderedDict()
+        self.awaiting_by_key: Dict[Hashable, Deque[TrackedUpdate]] = {}
+        # (chat_id, message_id) -> update whose reply edits of that message belong to
+        self.edit_owners: 'OrderedDict[Tuple[Any, Any], TrackedUpdate]' = OrderedDict()
+        self.histograms: Dict[Tuple[str, Optional[str]], Dict[str, LatencyHistogram]] = {}
+
+    def on_enqueue(self, update: Dict[str, Any]):
+        """Start timing an injected update"""
+        now = time.perf_counter()
+        with self.lock:
+            self.undelivered[update['update_id']] = (update, now)
+            if len(self.undelivered) > self.max_tracked:
+                self.undelivered.popitem(last=False)
+
+    def on_enqueue_many(self, updates: List[Dict[str, Any]]):
+        """Start timing a batch of injected updates"""
+        now = time.perf_counter()
+        # Only the newest max_tracked would survive eviction anyway
+        updates = updates[-self.max_tracked:]
+        with self.lock:
+            undelivered = self.undelivered
+            undelivered.update((update['update_id'], (update, now)) for update in updates)
+            while len(undelivered) > self.max_tracked:
+                undelivered.popitem(last=False)
+
+    def on_deliver(self, updates: List[Dict[str, Any]]):
+        """Mark updates returned by getUpdates as delivered (redeliveries are ignored)"""
+        if not updates:
+            return
+        now = time.perf_counter()
+        with self.lock:
+            for update in updates:
+                pending = self.undelivered.pop(update['update_id'], None)
+                if pending is None:
+                    continue
+                group, keys = _classify(pending[0])
+                entry = TrackedUpdate(update['update_id'], group, keys, pending[1])
+                entry.delivered_at = now
+                self._histogram(entry.group, 'delivery').record(now - entry.enqueued_at)
+
+                self.awaiting[entry.update_id] = entry
+                for key in entry.keys:
+                    if key[0] == 'owns':
+                        self._set_edit_owner(key[1], entry)
+                    else:
+                        self.awaiting_by_key.setdefault(key, deque()).append(entry)
+                if len(self.awaiting) > self.max_tracked:
+                    _, evicted = self.awaiting.popitem(last=False)
+                    self._finish(evicted)
+
+    def on_call(self, call: Dict[str, Any]):
+        """Attribute a Bot API call to the update it answers"""
+        method = call.get('method')
+        if method not in RESPONSE_METHODS and method not in EDIT_METHODS:
+            return
+        now = time.perf_counter()
+        params = call.get('params') or {}
+        chat_id = normalize_chat_id(params.get('chat_id'))
+
+        with self.lock:
+            entry = None
+            if method in EDIT_METHODS and 'message_id' in params:
+                entry = self.edit_owners.get((chat_id, normalize_chat_id(params['message_id'])))
+                if entry is not None:
+                    entry.last_edit_at = now
+                    if entry.replied:
+                        return
+                    self._take(entry)
+
+            if entry is None:
+                entry = self._match(params, chat_id)
+                if entry is None:
+                    return
+
+            entry.replied = True
+            self._histogram(entry.group, 'first_reply').record(now - entry.delivered_at)
+            result = call.get('result')
+            if isinstance(result, dict) and 'message_id' in result:
+                self._set_edit_owner((chat_id, result['message_id']), entry)
+            elif entry.last_edit_at is None:
+                entry.done = True
+
+    def _match(self, params: Dict[str, Any], chat_id: Any) -> Optional[TrackedUpdate]:
+        """Find and claim the update a reply answers"""
+        keys: List[Hashable] = []
+        reply_to = params.get('reply_to_message_id')
+        if reply_to is None and isinstance(params.get('reply_parameters'), dict):
+            reply_to = params['reply_parameters'].get('message_id')
+        if reply_to is not None:
+            keys.append(('message', chat_id, normalize_chat_id(reply_to)))
+        if 'callback_query_id' in params:
+            keys.append(('callback', str(params['callback_query_id'])))
+        if 'inline_query_id' in params:
+            keys.append(('inline', str(params['inline_query_id'])))
+        if chat_id is not None:
+            keys.append(('chat', chat_id))
+
+        for key in keys:
+            queue = self.awaiting_by_key.get(key)
+            while queue and (queue[0].replied or queue[0].done):
+                queue.popleft()
+            if queue:
+                entry = queue[0]
+                self._take(entry)
+                return entry
+        return None
+
+    def _take(self, entry: TrackedUpdate):
+        """Stop waiting for a first reply to an update"""
+        self.awaiting.pop(entry.update_id, None)
+        for key in entry.keys:
+            queue = self.awaiting_by_key.get(key)
+            if queue is None:
+                continue
+            if queue and queue[0] is entry:
+                queue.popleft()
+            elif entry in queue:
+                queue.remove(entry)
+            if not queue:
+                del self.awaiting_by_key[key]
+
+    def _set_edit_owner(self, message_key: Tuple[Any, Any], entry: TrackedUpdate):
+        """Attribute later edits of a message to an update"""
+        previous = self.edit_owners.pop(message_key, None)
+        if previous is not None and previous is not entry:
+            self._finish(previous)
+        self.edit_owners[message_key] = entry
+        if len(self.edit_owners) > self.max_tracked:
+            _, evicted = self.edit_owners.popitem(last=False)
+            self._finish(evicted)
+
+    def _finish(self, entry: TrackedUpdate):
+        """Record the final edit time of an update that no longer owns a message"""
+        if entry.done:
+            return
+        entry.done = True
+        self._take(entry)
+        if entry.last_edit_at is not None and entry.delivered_at is not None:
+            self._histogram(entry.group, 'last_edit').record(entry.last_edit_at - entry.delivered_at)
+
+    def _histogram(self, group: Tuple[str, Optional[str]], stage: str) -> LatencyHistogram:
+        stages = self.histograms.get(group)
+        if stages is None:
+            stages = self.histograms[group] = {name: LatencyHistogram() for name in STAGES}
+        return stages[stage]
+
+    def report(self) -> Dict[str, Any]:
+        """
+        Latency percentiles per update type and command
+
+        Edits of replies still being tracked are included, so last_edit
+        reflects the most recent edit seen so far.
+
+        Returns:
+            {"total": stages, "groups": [{"update_type", "command", stages...}],
+            "pending": counts of undelivered and unanswered updates}; each
+            stage is a histogram summary in milliseconds
+        """
+        with self.lock:
+            histograms = {group: {stage: h.copy() for stage, h in stages.items()}
+                          for group, stages in self.histograms.items()}
+            open_edits = {id(e): e for e in self.edit_owners.values()
+                          if not e.done and e.last_edit_at is not None}
+            for entry in open_edits.values():
+                stages = histograms.setdefault(entry.group, {name: LatencyHistogram() for name in STAGES})
+                stages['last_edit'].record(entry.last_edit_at - entry.delivered_at)
+            pending = {"undelivered": len(self.undelivered), "unanswered": len(self.awaiting)}
+
+        total = {name: LatencyHistogram() for name in STAGES}
+        groups = []
+        for (update_type, command), stages in sorted(histograms.items(), key=lambda item: (item[0][0], item[0][1] or '')):
+            group = {"update_type": update_type, "command": command}
+            for stage in STAGES:
+                total[stage].merge(stages[stage])
+                group[stage] = stages[stage].summary()
+            groups.append(group)
+
+        return {
+            "total": {stage: total[stage].summary() for stage in STAGES},
+            "groups": groups,
+            "pending": pending
+        }
+
+    def resize(self, max_tracked: int):
+        """Change how many updates are tracked, dropping the oldest beyond it"""
+        with self.lock:
+            self.max_tracked = max_tracked
+            while len(self.undelivered) > max_tracked:
+                self.undelivered.popitem(last=False)
+            while len(self.awaiting) > max_tracked:
+                _, evicted = self.awaiting.popitem(last=False)
+                self._finish(evicted)
+            while len(self.edit_owners) > max_tracked:
+                _, evicted = self.edit_owners.popitem(last=False)
+                self._finish(evicted)
+
+    def copy(self) -> 'ResponseTracker':
+        """Copy the histograms; in-flight correlations are not carried over"""
+        tracker = ResponseTracker(self.max_tracked)
+        with self.lock:
+            tracker.histograms = {group: {stage: h.copy() for stage, h in stages.items()}
+                                  for group, stages in self.histograms.items()}
+        return tracker
+
+
+def _classify(update: Dict[str, Any]) -> Tuple[Tuple[str, Optional[str]], List[Hashable]]:
+    """
+    Histogram group and reply keys of an update
+
+    The group is (update type, command or None). Keys are matched against
+    reply parameters; an ('owns', message key) entry makes edits of that
+    message count for this update.
+    """
+    update_type = next((field for field in update if field != 'update_id'), 'unknown')
+    payload = update.get(update_type)
+    command = None
+    keys: List[Hashable] = []
+    if not isinstance(payload, dict):
+        return (update_type, None), keys
+
+    if update_type == 'callback_query':
+        keys.append(('callback', str(payload.get('id'))))
+        message = payload.get('message')
+        if message:
+            chat_id = message.get('chat', {}).get('id')
+            keys.append(('chat', chat_id))
+            keys.append(('owns', (chat_id, message.get('message_id'))))
+    elif update_type == 'inline_query':
+        keys.append(('inline', str(payload.get('id'))))
+    elif 'chat' in payload:
+        chat_id = payload['chat'].get('id')
+        text = payload.get('text') or ''
+        if text.startswith('/'):
+            command = text.split(None, 1)[0].split('@', 1)[0]
+        keys.append(('message', chat_id, payload.get('message_id')))
+        keys.append(('chat', chat_id))
+
+    return (update_type, command), keys
@@ -0,0 +1,355 @@
+"""
+Scenario recording and replay for SuperMock
+
+Records every update injected into a server and every Bot API call the bot
+makes, then replays the updates against a bot at the original pace, N times
+faster or as fast as possible. Replays run on the server's virtual clock, so
+`date` fields match the recording however fast the replay runs.
+"""
+
+import copy
+import json
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Deque, Dict, Hashable, List, Any, Optional, Sequence, Tuple, Union
+
+from .ids import normalize_chat_id
+from .mock_server import TelegramMockServer
+from .responses import RESPONSE_METHODS
+from ..utils.histogram import percentile
+
+
+# Update fields that carry a message
+MESSAGE_FIELDS = ('message', 'edited_message', 'channel_post', 'edited_channel_post')
+
+
+class Scenario:
+    """Recorded updates and Bot API calls, ordered by time"""
+
+    def __init__(self, events: Optional[List[Dict[str, Any]]] = None, start_time: float = 0.0):
+        # Each event is {"kind": "update"|"call", "time": clock time,
+        # "elapsed": real seconds since recording started, "update"|"call": payload}
+        self.events: List[Dict[str, Any]] = events if events is not None else []
+        self.start_time = start_time
+
+    @property
+    def updates(self) -> List[Dict[str, Any]]:
+        """Update events"""
+        return [event for event in self.events if event['kind'] == 'update']
+
+    @property
+    def calls(self) -> List[Dict[str, Any]]:
+        """Bot API call events"""
+        return [event for event in self.events if event['kind'] == 'call']
+
+    @property
+    def duration(self) -> float:
+        """Clock seconds from the start of the recording to its last event"""
+        if not self.events:
+            return 0.0
+        return self.events[-1]['time'] - self.start_time
+
+    def save(self, path: Union[str, Path]):
+        """
+        Write the scenario as JSON Lines
+
+        Args:
+            path: Output file; the first line is a header, then one event per line
+        """
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps({"kind": "scenario", "start_time": self.start_time}) + '\n')
+            for event in self.events:
+                f.write(json.dumps(event, ensure_ascii=False, default=str) + '\n')
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> 'Scenario':
+        """
+        Read a scenario written by save()
+
+        Args:
+            path: JSON Lines file
+
+        Returns:
+            The loaded scenario
+        """
+        scenario = cls()
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                event = json.loads(line)
+                if event.get('kind') == 'scenario':
+                    scenario.start_time = event.get('start_time', 0.0)
+                else:
+                    scenario.events.append(event)
+        return scenario
+
+
+class ScenarioRecorder:
+    """
+    Records a server's injected updates and Bot API calls
+
+    Usable as a context manager:
+
+        with ScenarioRecorder(server) as recorder:
+            server.send_user_message("/start")
+            ...
+        recorder.scenario.save("day.jsonl")
+    """
+
+    def __init__(self, server: TelegramMockServer):
+        self.server = server
+        self.condition = threading.Condition()
+        self.scenario = Scenario()
+        # Pairs updates with their replies as events arrive
+        self.matcher = _ResponseMatcher()
+        self.started_at = 0.0
+        self.recording = False
+
+    def start(self) -> 'ScenarioRecorder':
+        """Start recording, discarding any previous recording"""
+        with self.condition:
+            self.scenario = Scenario(start_time=self.server.clock.time())
+            self.matcher = _ResponseMatcher()
+            self.started_at = time.monotonic()
+            self.recording = True
+        self.server.add_recorder(self)
+        return self
+
+    def stop(self) -> Scenario:
+        """Stop recording and return the scenario"""
+        self.server.remove_recorder(self)
+        with self.condition:
+            self.recording = False
+        return self.scenario
+
+    def on_update(self, update: Dict[str, Any]):
+        """Record an injected update"""
+        self._add('update', update)
+
+    def on_call(self, call: Dict[str, Any]):
+        """Record a Bot API call"""
+        self._add('call', call)
+
+    def _add(self, kind: str, payload: Dict[str, Any]):
+        event = {
+            "kind": kind,
+            "time": self.server.clock.time(),
+            "elapsed": time.monotonic() - self.started_at,
+            kind: payload
+        }
+        with self.condition:
+            if self.recording:
+                self.scenario.events.append(event)
+                self.matcher.add(event)
+                self.condition.notify_all()
+
+    def __enter__(self) -> 'ScenarioRecorder':
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+
+class ScenarioReplayer:
+    """Replays a scenario's updates against a bot and measures its responses"""
+
+    def __init__(self, server: TelegramMockServer, scenario: Scenario):
+        self.server = server
+        self.scenario = scenario
+
+    def replay(self, speed: Optional[float] = 1.0, settle: float = 1.0) -> Dict[str, Any]:
+        """
+        Inject the scenario's updates on their recorded schedule
+
+        The server clock runs in manual mode during the replay and is moved to
+        each update's recorded time before it is injected; afterwards the
+        clock returns to its previous mode. Update and message IDs are
+        renumbered to follow the server's counters.
+
+        Args:
+            speed: Speed-up factor (1.0 is the recorded pace), or None to
+                inject as fast as possible
+            settle: Real seconds to keep waiting for replies after the last update
+
+        Returns:
+            Report with response times and throughput of the bot
+        """
+        if speed is not None and speed <= 0:
+            raise ValueError("Replay speed must be positive")
+
+        clock = self.server.clock
+        previous_mode = clock.mode
+        start_time = self.scenario.start_time
+        clock.use_manual(start=start_time)
+        try:
+            with ScenarioRecorder(self.server) as recorder:
+                started = time.monotonic()
+                for event in self.scenario.updates:
+                    offset = event['time'] - start_time
+                    if speed is not None:
+                        delay = started + offset / speed - time.monotonic()
+                        if delay > 0:
+                            time.sleep(delay)
+                    if event['time'] > clock.time():
+                        clock.advance(event['time'] - clock.time())
+                    self._inject(event['update'])
+                self._settle(recorder, settle)
+        finally:
+            clock.set_mode(previous_mode)
+
+        return replay_report(recorder.scenario, speed)
+
+    def compare(self, speeds: Sequence[Optional[float]] = (1.0, 10.0, None),
+                settle: float = 1.0) -> List[Dict[str, Any]]:
+        """
+        Replay at each speed, one run after another
+
+        The server is not reset between runs: update IDs keep increasing, so
+        a polling bot's offset stays valid throughout.
+
+        Args:
+            speeds: Speed-up factors; None means as fast as possible
+            settle: Real seconds to wait for replies after each run
+
+        Returns:
+            One report per speed
+        """
+        reports = []
+        for speed in speeds:
+            reports.append(self.replay(speed, settle))
+        return reports
+
+    def _inject(self, recorded: Dict[str, Any]):
+        """Renumber a recorded update and queue it"""
+        server = self.server
+        update = copy.deepcopy(recorded)
+        update['update_id'] = server._next_update_id()
+        date = server.clock.timestamp()
+
+        for field in MESSAGE_FIELDS:
+            message = update.get(field)
+            if message is not None:
+                message['message_id'] = server._next_message_id(message['chat']['id'])
+                message['date'] = date
+                server.enqueue_update(update)
+                server.messages_history.append({"type": "user", "message": message})
+                return
+
+        server.enqueue_update(update)
+
+    def _settle(self, recorder: ScenarioRecorder, settle: float):
+        """Wait until every injected update is answered or settle seconds pass"""
+        deadline = time.monotonic() + settle
+        with recorder.condition:
+            while True:
+                matcher = recorder.matcher
+                if matcher.answered >= len(matcher.pairs):
+                    return
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return
+                recorder.condition.wait(remaining)
+
+
+def _update_keys(update: Dict[str, Any]) -> List[Hashable]:
+    """Keys a reply to this update can be matched on"""
+    keys: List[Hashable] = []
+    for field in MESSAGE_FIELDS:
+        message = update.get(field)
+        if message is not None:
+            keys.append(('chat', message['chat']['id']))
+    callback_query = update.get('callback_query')
+    if callback_query is not None:
+        keys.append(('callback', str(callback_query['id'])))
+        if callback_query.get('message'):
+            keys.append(('chat', callback_query['message']['chat']['id']))
+    inline_query = update.get('inline_query')
+    if inline_query is not None:
+        keys.append(('inline', str(inline_query['id'])))
+    return keys
+
+
+def _call_keys(call: Dict[str, Any]) -> List[Hashable]:
+    """Keys identifying which update a Bot API call answers"""
+    params = call.get('params') or {}
+    keys: List[Hashable] = []
+    if 'callback_query_id' in params:
+        keys.append(('callback', str(params['callback_query_id'])))
+    if 'inline_query_id' in params:
+        keys.append(('inline', str(params['inline_query_id'])))
+    if 'chat_id' in params:
+        keys.append(('chat', normalize_chat_id(params['chat_id'])))
+    return keys
+
+
+class _ResponseMatcher:
+    """Pairs update events with the first response call that answers them, one event at a time"""
+
+    def __init__(self):
+        # [update event, call event or None], in update order
+        self.pairs: List[List[Any]] = []
+        self.pending: Dict[Hashable, Deque[List[Any]]] = {}
+        self.answered = 0
+
+    def add(self, event: Dict[str, Any]):
+        if event['kind'] == 'update':
+            pair = [event, None]
+            self.pairs.append(pair)
+            for key in _update_keys(event['update']):
+                self.pending.setdefault(key, deque()).append(pair)
+        elif event['call'].get('method') in RESPONSE_METHODS:
+            for key in _call_keys(event['call']):
+                queue = self.pending.get(key)
+                while queue and queue[0][1] is not None:
+                    queue.popleft()
+                if queue:
+                    queue.popleft()[1] = event
+                    self.answered += 1
+                    break
+
+
+def _match_responses(scenario: Scenario) -> List[Tuple[Dict[str, Any], Optional[Dict[str, Any]]]]:
+    """Pair each update event with the first response call that answers it"""
+    matcher = _ResponseMatcher()
+    for event in scenario.events:
+        matcher.add(event)
+    return [(update, call) for update, call in matcher.pairs]
+
+
+def replay_report(scenario: Scenario, speed: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Summarize how quickly a bot answered the updates of a recording
+
+    Args:
+        scenario: Recording of a replay (or of a live session)
+        speed: Speed-up factor the updates were injected at, for the report
+
+    Returns:
+        Update and response counts, real-time duration, throughput in calls
+        per second and response-time percentiles in milliseconds
+    """
+    pairs = _match_responses(scenario)
+    response_ms = sorted((call['elapsed'] - update['elapsed']) * 1000 for update, call in pairs if call is not None)
+    calls = scenario.calls
+    duration = scenario.events[-1]['elapsed'] - scenario.events[0]['elapsed'] if scenario.events else 0.0
+
+    return {
+        "speed": speed if speed is not None else 'max',
+        "updates": len(pairs),
+        "responses": len(response_ms),
+        "unanswered": len(pairs) - len(response_ms),
+        "calls": len(calls),
+        "duration_s": round(duration, 6),
+        "updates_per_s": round(len(pairs) / duration, 2) if duration > 0 else 0.0,
+        "calls_per_s": round(len(calls) / duration, 2) if duration > 0 else 0.0,
+        "response_ms": {
+            "mean": round(sum(response_ms) / len(response_ms), 3) if response_ms else 0.0,
+            "p50": round(percentile(response_ms, 0.50), 3),
+            "p95": round(percentile(response_ms, 0.95), 3),
+            "p99": round(percentile(response_ms, 0.99), 3),
+            "max": round(response_ms[-1], 3) if response_ms else 0.0
+        }
+    }
@@ -0,0 +1,425 @@
+"""
+Session diff for SuperMock
+
+Compares two recorded bot runs (traffic captures, scenarios or message
+histories) to show whether a change altered what the bot does. Volatile
+fields such as dates, message IDs and file IDs are normalized away, the
+bot's calls are aligned per chat, and the report lists behavioural
+differences next to per-method call counts and latency deltas.
+
+Both runs are read as streams in lockstep and only the not-yet-aligned
+tail of each chat is buffered, so captures of many gigabytes are compared
+in bounded memory.
+"""
+
+import gzip
+import json
+from collections import Counter, deque
+from pathlib import Path
+from typing import Deque, Dict, Iterable, Iterator, List, Any, Optional, Tuple, Union
+
+from .ids import normalize_chat_id
+from ..utils.histogram import LatencyHistogram
+
+
+# Fields whose values differ between runs of the same behaviour
+VOLATILE_FIELDS = frozenset({
+    'date', 'edit_date', 'forward_date',
+    'message_id', 'reply_to_message_id', 'update_id', 'message_thread_id',
+    'callback_query_id', 'inline_query_id', 'inline_message_id', 'query_id',
+    'file_id', 'file_unique_id'
+})
+
+# Methods that poll or introspect rather than act; counted but not compared
+IGNORED_METHODS = frozenset({'getUpdates', 'getMe', 'getWebhookInfo'})
+
+Source = Union[str, Path, Iterable[Dict[str, Any]]]
+
+# (chat ID, method, normalized event or None if not compared, duration in ms or None)
+SessionEvent = Tuple[Any, str, Optional[Dict[str, Any]], Optional[float]]
+
+
+def normalize(value: Any, volatile: frozenset = VOLATILE_FIELDS) -> Any:
+    """Copy of a JSON value with volatile fields replaced by placeholders"""
+    if isinstance(value, dict):
+        return {key: f"<{key}>" if key in volatile else normalize(item, volatile)
+                for key, item in value.items()}
+    if isinstance(value, list):
+        return [normalize(item, volatile) for item in value]
+    return value
+
+
+def read_session(path: Union[str, Path]) -> Iterator[Dict[str, Any]]:
+    """
+    Stream the records of a recorded session file
+
+    Traffic captures (JSON Lines or the line-per-entry HAR files written by
+    TrafficCapture, optionally gzipped) and scenarios are read one line at a
+    time. Other JSON documents (history files, foreign HAR files) are loaded
+    whole.
+
+    Args:
+        path: Session file
+
+    Returns:
+        Iterator over capture records, scenario events, HAR entries or
+        history entries
+    """
+    path = str(path)
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8') as f:
+        first = f.readline()
+        try:
+            header = json.loads(first) if first.strip() else None
+        except ValueError:
+            header = None
+        if not isinstance(header, dict):
+            header = None
+        if header is None and first.startswith('{"log":') and first.rstrip().endswith('['):
+            # Line-per-entry HAR: header line, entries separated by ",\n", footer
+            for line in f:
+                line = line.strip().rstrip(',')
+                if line.startswith('{'):
+                    yield json.loads(line)
+            return
+        if header is None:
+            f.seek(0)
+            document = json.load(f)
+            if isinstance(document, dict) and 'log' in document:
+                yield from document['log'].get('entries', [])
+            elif isinstance(document, dict):
+                yield from document.get('messages', [])
+            else:
+                yield from document
+            return
+        if 'messages' in header:
+            yield from header['messages']
+            return
+        if header.get('kind') != 'scenario':
+            yield header
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def session_events(records: Iterable[Dict[str, Any]], volatile: frozenset = VOLATILE_FIELDS,
+                   ignored_methods: frozenset = IGNORED_METHODS) -> Iterator[SessionEvent]:
+    """
+    Classify records of any supported session format as comparable events
+
+    Bot API calls compare by method and normalized parameters; history
+    entries by sender type and normalized message. Scenario updates are the
+    input of a run and are skipped.
+    """
+    for record in records:
+        if 'request' in record and 'response' in record and 'startedDateTime' in record:
+            record = _from_har_entry(record)
+        elif record.get('kind') == 'update':
+            continue
+        elif record.get('kind') == 'call':
+            record = record['call']
+
+        if 'method' in record:
+            params = record.get('params') or {}
+            chat_id = normalize_chat_id(record.get('chat_id', params.get('chat_id')))
+            method = record['method']
+            event = None
+            if method not in ignored_methods:
+                event = {"method": method, "params": normalize(params, volatile)}
+            yield chat_id, method, event, record.get('duration_ms')
+        elif 'message' in record:
+            message = record['message']
+            kind = f"{record.get('type', 'unknown')} message"
+            yield (message.get('chat') or {}).get('id'), kind, \
+                {"type": record.get('type'), "message": normalize(message, volatile)}, None
+
+
+def diff_sessions(baseline: Source, current: Source, volatile: Iterable[str] = VOLATILE_FIELDS,
+                  ignored_methods: Iterable[str] = IGNORED_METHODS, lookahead: int = 20,
+                  max_pending: int = 10000, max_diffs: int = 100) -> Dict[str, Any]:
+    """
+    Compare the behaviour of two recorded runs
+
+    Each chat's events are aligned in order. When the heads differ, the next
+    lookahead events of the other run are searched for a match so that an
+    inserted or dropped call shows up as "extra" or "missing" instead of
+    shifting the rest of the chat.
+
+    Args:
+        baseline: Session file, or records such as capture.entries(),
+            scenario.events or get_messages_history()
+        current: The run to compare against the baseline
+        volatile: Field names replaced by placeholders before comparing
+        ignored_methods: Methods counted but not compared
+        lookahead: Events searched to re-align after an insertion or deletion
+        max_pending: Events buffered per chat and run before the oldest is
+            reported unmatched (bounds memory when runs drift apart)
+        max_diffs: Differences listed in the report (all are counted), and
+            differing chat IDs sampled
+
+    Returns:
+        identical flag, difference counts by kind, the first max_diffs
+        differences with each event's position among its run's compared
+        events, the number and a sample of chats that differ, and
+        per-method call counts and latency summaries with deltas
+    """
+    volatile = frozenset(volatile)
+    ignored_methods = frozenset(ignored_methods)
+    aligner = _Aligner(lookahead, max_pending, max_diffs)
+    counts = (Counter(), Counter())
+    latencies: Tuple[Dict[str, LatencyHistogram], Dict[str, LatencyHistogram]] = ({}, {})
+
+    streams = [_events(source, volatile, ignored_methods) for source in (baseline, current)]
+    live = [True, True]
+    while any(live):
+        for side in (0, 1):
+            # One comparable event per run and turn; ignored calls such as polls
+            # differ in number between runs, so they are counted without pacing
+            while live[side]:
+                item = next(streams[side], None)
+                if item is None:
+                    live[side] = False
+                    break
+                chat_id, method, event, duration_ms = item
+                counts[side][method] += 1
+                if duration_ms is not None:
+                    histogram = latencies[side].get(method)
+                    if histogram is None:
+                        histogram = latencies[side][method] = LatencyHistogram()
+                    histogram.record(duration_ms / 1000)
+                if event is not None:
+                    aligner.add(side, chat_id, event)
+                    break
+    aligner.finish()
+
+    methods = []
+    for method in sorted(set(counts[0]) | set(counts[1])):
+        row: Dict[str, Any] = {
+            "method": method,
+            "baseline": counts[0][method],
+            "current": counts[1][method],
+            "delta": counts[1][method] - counts[0][method]
+        }
+        if method in latencies[0] or method in latencies[1]:
+            before = latencies[0][method].summary() if method in latencies[0] else None
+            after = latencies[1][method].summary() if method in latencies[1] else None
+            row["latency_ms"] = {"baseline": before, "current": after}
+            if before and after:
+                row["latency_ms"]["delta"] = {key: round(after[key] - before[key], 3)
+                                              for key in ('mean', 'p50', 'p90', 'p99', 'max')}
+        methods.append(row)
+
+    return {
+        "identical": not aligner.total,
+        "compared": aligner.compared,
+        "differences": aligner.total,
+        "by_kind": dict(aligner.by_kind),
+        "chats": {"differing": aligner.differing, "sample": list(aligner.differing_sample)},
+        "diffs": aligner.diffs,
+        "methods": methods
+    }
+
+
+def format_diff(report: Dict[str, Any]) -> str:
+    """Render a diff_sessions() report as plain text"""
+    lines = []
+    for diff in report['diffs']:
+        where = f"chat {diff['chat_id']} #{diff['baseline_index']}/{diff['current_index']}"
+        if diff['kind'] == 'changed':
+            lines.append(f"~ {where} {_label(diff['baseline'])}: {', '.join(diff['fields'])}")
+            lines.append(f"    - {json.dumps(diff['baseline'], sort_keys=True, default=str)}")
+            lines.append(f"    + {json.dumps(diff['current'], sort_keys=True, default=str)}")
+        elif diff['kind'] == 'missing':
+            lines.append(f"- {where} {json.dumps(diff['baseline'], sort_keys=True, default=str)}")
+        else:
+            lines.append(f"+ {where} {json.dumps(diff['current'], sort_keys=True, default=str)}")
+    if report['differences'] > len(report['diffs']):
+        lines.append(f"... {report['differences'] - len(report['diffs'])} more")
+    if lines:
+        lines.append('')
+
+    lines.append(f"{'method':<28} {'baseline':>9} {'current':>9} {'delta':>7} {'p50 ms':>15} {'p99 ms':>15}")
+    for row in report['methods']:
+        latency = row.get('latency_ms', {}).get('delta')
+        p50 = f"{latency['p50']:+.3f}" if latency else ''
+        p99 = f"{latency['p99']:+.3f}" if latency else ''
+        lines.append(f"{row['method']:<28} {row['baseline']:>9} {row['current']:>9} {row['delta']:>+7} "
+                     f"{p50:>15} {p99:>15}")
+    return '\n'.join(lines)
+
+
+def _label(event: Dict[str, Any]) -> str:
+    return event.get('method') or f"{event.get('type')} message"
+
+
+def _events(source: Source, volatile: frozenset, ignored_methods: frozenset) -> Iterator[SessionEvent]:
+    records = read_session(source) if isinstance(source, (str, Path)) else iter(source)
+    return session_events(records, volatile, ignored_methods)
+
+
+def _from_har_entry(entry: Dict[str, Any]) -> Dict[str, Any]:
+    """Capture-like record from a HAR entry"""
+    request = entry['request']
+    text = (request.get('postData') or {}).get('text')
+    try:
+        params = json.loads(text) if text else {}
+    except ValueError:
+        params = {}
+    record = {
+        "method": request['url'].rstrip('/').rsplit('/', 1)[-1].split('?', 1)[0],
+        "params": params if isinstance(params, dict) else {},
+        "duration_ms": entry.get('time')
+    }
+    extra = entry.get('_supermock') or {}
+    if extra.get('chat_id') is not None:
+        record['chat_id'] = extra['chat_id']
+    return record
+
+
+def _changed_fields(before: Any, after: Any, path: str = '') -> List[str]:
+    """Paths of the leaves that differ between two JSON values"""
+    if isinstance(before, dict) and isinstance(after, dict):
+        fields = []
+        for key in sorted(set(before) | set(after), key=str):
+            fields.extend(_changed_fields(before.get(key), after.get(key), f"{path}.{key}" if path else str(key)))
+        return fields
+    if isinstance(before, list) and isinstance(after, list) and len(before) == len(after):
+        fields = []
+        for i, (x, y) in enumerate(zip(before, after)):
+            fields.extend(_changed_fields(x, y, f"{path}[{i}]"))
+        return fields
+    return [] if before == after else [path or '.']
+
+
+# Pending event: (key, event, position among its run's compared events)
+_Pending = Tuple[str, Dict[str, Any], int]
+
+
+class _ChatQueues:
+    """Unaligned events of one chat from both runs"""
+
+    __slots__ = ('pending', 'differs')
+
+    def __init__(self):
+        # Per run: deque of pending events
+        self.pending: Tuple[Deque[_Pending], Deque[_Pending]] = (deque(), deque())
+        # Whether the chat has differed since its queues were last empty
+        self.differs = False
+
+
+class _Aligner:
+    """
+    Per-chat alignment of two event streams with bounded buffering
+
+    Only chats with unaligned events keep queues, and differing chats are
+    counted with a capped sample of their IDs, so memory does not grow with
+    the number of chats in the runs. A chat that differs again after it
+    caught up is counted again.
+    """
+
+    def __init__(self, lookahead: int, max_pending: int, max_diffs: int):
+        self.lookahead = max(0, lookahead)
+        self.max_pending = max(max_pending, self.lookahead + 1)
+        self.max_diffs = max_diffs
+        self.chats: Dict[Any, _ChatQueues] = {}
+        # Per run: events added so far
+        self.added = [0, 0]
+        self.differing = 0
+        self.differing_sample: Dict[Any, None] = {}
+        self.diffs: List[Dict[str, Any]] = []
+        self.by_kind: Counter = Counter()
+        self.total = 0
+        self.compared = 0
+
+    def add(self, side: int, chat_id: Any, event: Dict[str, Any]):
+        chat = self.chats.get(chat_id)
+        if chat is None:
+            chat = self.chats[chat_id] = _ChatQueues()
+        chat.pending[side].append((json.dumps(event, sort_keys=True, default=str), event, self.added[side]))
+        self.added[side] += 1
+        self._align(chat_id, chat, final=False)
+        if not chat.pending[0] and not chat.pending[1]:
+            del self.chats[chat_id]
+
+    def finish(self):
+        for chat_id, chat in self.chats.items():
+            self._align(chat_id, chat, final=True)
+        self.chats.clear()
+
+    def _align(self, chat_id: Any, chat: _ChatQueues, final: bool):
+        before, after = chat.pending
+        window = self.lookahead
+        while before or after:
+            if not before or not after:
+                if not final:
+                    # Runs drifting apart: give up on the oldest event of the longer side
+                    side = 0 if before else 1
+                    if len(chat.pending[side]) <= self.max_pending:
+                        return
+                    self._unmatched(chat_id, chat, side)
+                    continue
+                self._unmatched(chat_id, chat, 0 if before else 1)
+                continue
+            if before[0][0] == after[0][0]:
+                before.popleft()
+                after.popleft()
+                self.compared += 1
+                continue
+            if not final and min(len(before), len(after)) <= window and \
+                    max(len(before), len(after)) <= self.max_pending:
+                # Wait until there is enough context to re-align
+                return
+            skip = self._find(before[0][0], after)
+            if skip:
+                for _ in range(skip):
+                    self._unmatched(chat_id, chat, 1)
+                continue
+            skip = self._find(after[0][0], before)
+            if skip:
+                for _ in range(skip):
+                    self._unmatched(chat_id, chat, 0)
+                continue
+            _, old, old_position = before.popleft()
+            _, new, new_position = after.popleft()
+            self._report(chat_id, chat, "changed", old, new, (old_position, new_position),
+                         _changed_fields(old, new))
+            self.compared += 1
+
+    def _find(self, key: str, pending: Deque[_Pending]) -> int:
+        """Offset of key within the lookahead window of pending (0 if absent)"""
+        for offset in range(1, min(self.lookahead, len(pending) - 1) + 1):
+            if pending[offset][0] == key:
+                return offset
+        return 0
+
+    def _unmatched(self, chat_id: Any, chat: _ChatQueues, side: int):
+        _, event, position = chat.pending[side].popleft()
+        # The other run's position is where its next event in the chat is
+        other = chat.pending[1 - side]
+        other_position = other[0][2] if other else self.added[1 - side]
+        if side == 0:
+            self._report(chat_id, chat, "missing", event, None, (position, other_position))
+        else:
+            self._report(chat_id, chat, "extra", None, event, (other_position, position))
+
+    def _report(self, chat_id: Any, chat: _ChatQueues, kind: str, before: Optional[Dict[str, Any]],
+                after: Optional[Dict[str, Any]], positions: Tuple[int, int], fields: Optional[List[str]] = None):
+        self.total += 1
+        self.by_kind[kind] += 1
+        if not chat.differs:
+            chat.differs = True
+            self.differing += 1
+            if len(self.differing_sample) < self.max_diffs:
+                self.differing_sample[chat_id] = None
+        if len(self.diffs) < self.max_diffs:
+            diff = {
+                "kind": kind,
+                "chat_id": chat_id,
+                "baseline_index": positions[0],
+                "current_index": positions[1],
+                "baseline": before,
+                "current": after
+            }
+            if fields is not None:
+                diff["fields"] = fields
+            self.diffs.append(diff)
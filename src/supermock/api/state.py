@@ -0,0 +1,63 @@
+"""
+Mutable state of a SuperMock server
+
+Everything a test can change lives on one ServerState object, so a server is
+reset by swapping in a fresh state instead of clearing each structure, and
+snapshotted by copying it.
+"""
+
+from typing import Dict, List, Any, Optional
+
+from .call_log import CallLog
+from .ids import IdAllocator
+from .inline_cache import InlineResultsCache
+from .responses import ResponseTracker
+from .update_log import UpdateLog
+from ..utils.clock import Clock
+from ..utils.config import DEFAULT_SETTINGS, Settings
+from ..utils.group_chat import GroupMembers
+from ..utils.users import FIRST_USER_ID, UserRegistry
+
+
+class ServerState:
+    """Updates, history, API calls, response timings, inline answers, ID counters and simulator data of one server generation"""
+
+    def __init__(self, generation: int = 0, clock: Optional[Clock] = None, settings: Optional[Settings] = None):
+        settings = settings or DEFAULT_SETTINGS
+        retention = settings.retention
+        self.generation = generation
+        self.updates = UpdateLog(clock)
+        self.messages_history: List[Dict[str, Any]] = []
+        self.ids = IdAllocator()
+        self.groups: Dict[int, Dict[str, Any]] = {}
+        self.group_members: Dict[int, GroupMembers] = {}
+        # Simulated users are numbered after the default user, who is registered too
+        default_user = settings.default_user
+        self.users = UserRegistry(max(FIRST_USER_ID, default_user['id'] + 1))
+        self.users.register(dict(default_user))
+        self.inline_cache = InlineResultsCache(clock, retention.inline_cache)
+        self.calls = CallLog(retention.calls)
+        self.responses = ResponseTracker(retention.tracked_responses)
+
+    def copy(self, generation: Optional[int] = None) -> 'ServerState':
+        """
+        Copy the state, sharing all messages, updates and users
+
+        Only the containers are copied; the objects they hold are never
+        mutated after creation, so both copies can share them safely.
+
+        IDs are allocated before an update or message is stored, so copying
+        the updates and history before the ID counters leaves the copy's
+        counters past every ID it holds, without stopping other threads.
+        """
+        state = ServerState(self.generation if generation is None else generation, self.updates.clock)
+        state.updates = self.updates.copy()
+        state.messages_history = list(self.messages_history)
+        state.ids = self.ids.copy()
+        state.groups = dict(self.groups)
+        state.group_members = {group_id: members.copy() for group_id, members in self.group_members.items()}
+        state.users = self.users.copy()
+        state.inline_cache = self.inline_cache.copy()
+        state.calls = self.calls.copy()
+        state.responses = self.responses.copy()
+        return state
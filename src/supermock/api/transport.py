@@ -0,0 +1,108 @@
+"""
+In-process transport for SuperMock
+
+Routes HTTP calls straight into the mock server's WSGI app, so bots and tests
+can talk to it without sockets, free ports or startup sleeps.
+"""
+
+from typing import Any, Dict, List, Optional, Tuple, Union
+from urllib.parse import urlsplit
+
+from requests import Response, Session
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+from werkzeug.http import HTTP_STATUS_CODES
+from werkzeug.test import Client
+
+
+# Base URL served in-process; any host works once the adapter is mounted
+IN_PROCESS_BASE_URL = "http://supermock"
+
+
+class InProcessClient:
+    """Dispatch raw HTTP requests into a mock server's WSGI app"""
+
+    def __init__(self, server):
+        self.app = getattr(server, 'app', server)
+        self.client = Client(self.app, use_cookies=False)
+
+    def request(self, method: str, url: str, headers: Optional[Union[Dict[str, str], List[Tuple[str, str]]]] = None,
+                body: bytes = b"") -> Tuple[int, List[Tuple[str, str]], bytes]:
+        """
+        Run one request through the app
+
+        Args:
+            method: HTTP method
+            url: Absolute or path-only URL
+            headers: Request headers
+            body: Raw request body
+
+        Returns:
+            Status code, response headers and response body
+        """
+        parts = urlsplit(url)
+        base_url = f"{parts.scheme or 'http'}://{parts.netloc or 'supermock'}"
+
+        response = self.client.open(
+            parts.path or '/',
+            base_url=base_url,
+            method=method,
+            query_string=parts.query,
+            headers=headers or {},
+            data=body
+        )
+        try:
+            return response.status_code, list(response.headers.items()), response.get_data()
+        finally:
+            response.close()
+
+
+class InProcessAdapter(BaseAdapter):
+    """requests transport adapter that serves calls in-process"""
+
+    def __init__(self, server):
+        super().__init__()
+        self.client = InProcessClient(server)
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None) -> Response:
+        """Send a prepared request to the mock server app"""
+        body = request.body
+        if body is None:
+            body = b""
+        elif isinstance(body, str):
+            body = body.encode('utf-8')
+        elif not isinstance(body, (bytes, bytearray)):
+            body = b"".join(chunk.encode('utf-8') if isinstance(chunk, str) else chunk for chunk in body)
+
+        status, headers, content = self.client.request(request.method, request.url, dict(request.headers), body)
+
+        response = Response()
+        response.status_code = status
+        response.reason = HTTP_STATUS_CODES.get(status, '')
+        response.headers = CaseInsensitiveDict(headers)
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        response._content = content
+        return response
+
+    def close(self):
+        """Nothing to release; present for the adapter interface"""
+
+
+def create_session(server, base_url: str = IN_PROCESS_BASE_URL, **session_kwargs: Any) -> Session:
+    """
+    Create a requests session that talks to the server in-process
+
+    Args:
+        server: TelegramMockServer (or any WSGI app)
+        base_url: URL prefix routed to the server
+
+    Returns:
+        A session whose requests under base_url never touch a socket
+    """
+    session = Session(**session_kwargs)
+    session.mount(base_url, InProcessAdapter(server))
+    return session
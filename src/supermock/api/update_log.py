@@ -0,0 +1,130 @@
+"""
+Pending update storage for SuperMock
+
+Keeps updates until the bot confirms them with a getUpdates offset, the way
+the Telegram Bot API does, and wakes long-polling requests as updates arrive.
+"""
+
+import threading
+from collections import deque
+from itertools import islice
+from typing import Deque, Dict, List, Any, Optional, Tuple
+
+from ..utils.clock import Clock
+
+
+# Telegram keeps unconfirmed updates for 24 hours
+UPDATE_TTL = 24 * 60 * 60
+
+
+class UpdateLog:
+    """Unconfirmed updates with Telegram getUpdates semantics"""
+
+    def __init__(self, clock: Optional[Clock] = None):
+        self.clock = clock or Clock()
+        self.condition = threading.Condition()
+        # (update, enqueued_at) pairs ordered by update_id
+        self.entries: Deque[Tuple[Dict[str, Any], float]] = deque()
+        self.closed = False
+
+    def put(self, update: Dict[str, Any]):
+        """Add an update and wake long-polling requests"""
+        entry = (update, self.clock.time())
+        with self.condition:
+            entries = self.entries
+            if entries and entries[-1][0]['update_id'] > update['update_id']:
+                # Concurrent producers can enqueue slightly out of order
+                index = len(entries)
+                while index and entries[index - 1][0]['update_id'] > update['update_id']:
+                    index -= 1
+                entries.insert(index, entry)
+            else:
+                entries.append(entry)
+            self.condition.notify_all()
+
+    def put_many(self, updates: List[Dict[str, Any]]):
+        """Add updates with ascending IDs and wake long-polling requests once"""
+        if not updates:
+            return
+        now = self.clock.time()
+        with self.condition:
+            entries = self.entries
+            if not entries or entries[-1][0]['update_id'] < updates[0]['update_id']:
+                entries.extend((update, now) for update in updates)
+            else:
+                for update in updates:
+                    index = len(entries)
+                    while index and entries[index - 1][0]['update_id'] > update['update_id']:
+                        index -= 1
+                    entries.insert(index, (update, now))
+            self.condition.notify_all()
+
+    def fetch(self, offset: int = 0, limit: int = 100, timeout: float = 0) -> List[Dict[str, Any]]:
+        """
+        Confirm updates below offset and return the pending ones
+
+        Args:
+            offset: First update ID to return; earlier updates are dropped.
+                Negative values return the last -offset updates.
+            limit: Maximum number of updates to return
+            timeout: Clock seconds to wait for an update if none are pending
+
+        Returns:
+            Pending updates, oldest first
+        """
+        clock = self.clock
+        mode = clock.mode
+        deadline = clock.monotonic() + timeout
+        with self.condition:
+            if timeout > 0 and mode == clock.MANUAL:
+                clock.watch(self.condition)
+            entries = self.entries
+            if offset < 0:
+                while len(entries) > -offset:
+                    entries.popleft()
+            else:
+                while entries and entries[0][0]['update_id'] < offset:
+                    entries.popleft()
+
+            expired_before = clock.time() - UPDATE_TTL
+            while entries and entries[0][1] < expired_before:
+                entries.popleft()
+
+            while not entries and not self.closed and clock.mode == mode:
+                remaining = deadline - clock.monotonic()
+                if remaining <= 0:
+                    break
+                clock.wait(self.condition, remaining)
+
+            return [update for update, _ in islice(entries, limit)]
+
+    def copy(self) -> 'UpdateLog':
+        """Copy the pending updates into a new, open log"""
+        log = UpdateLog(self.clock)
+        with self.condition:
+            log.entries = deque(self.entries)
+        return log
+
+    def close(self):
+        """Wake all long-polling requests and stop waiting until reopened"""
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    def open(self):
+        """Allow long-polling again"""
+        with self.condition:
+            self.closed = False
+
+    def clear(self):
+        """Drop all pending updates"""
+        with self.condition:
+            self.entries.clear()
+
+    def qsize(self) -> int:
+        """Number of pending updates"""
+        return len(self.entries)
+
+    def empty(self) -> bool:
+        """Check whether no updates are pending"""
+        return not self.entries
@@ -3,25 +3,30 @@ Command-line interface for SuperMock
 """
 
 import argparse
+import json
 import sys
-import threading
-from supermock.api import TelegramMockServer
+from typing import Optional
+from supermock.api import TelegramMockServer, LoadGenerator, diff_sessions, format_diff
 from supermock.terminal import TerminalChat
+from supermock.utils import Config, Logger
+
+
+def create_server(args, config: Optional[Config] = None, logger: Optional[Logger] = None) -> TelegramMockServer:
+    """Create the mock server from --config, with --host/--port taking precedence"""
+    if config is None and args.config:
+        config = Config(args.config)
+    settings = config.settings() if config is not None else None
+    return TelegramMockServer(host=args.host, port=args.port, settings=settings, logger=logger)
 
 
 def start_web(args):
     """Start the mock server with web UI"""
     from supermock.web import WebUIServer
     
-    server = TelegramMockServer(host=args.host, port=args.port)
+    server = create_server(args)
     
     # Start API server in background thread
-    server_thread = threading.Thread(target=lambda: server.run(debug=False), daemon=True)
-    server_thread.start()
-    
-    # Wait a bit for server to start
-    import time
-    time.sleep(1)
+    server.start(port=server.port)
     
     # Start web UI
     web_server = WebUIServer(server, host=args.webhost, port=args.webport)
@@ -30,32 +35,141 @@ def start_web(args):
         web_server.run(debug=args.debug)
     except KeyboardInterrupt:
         print("\n\n👋 Stopping...")
+    finally:
+        server.stop()
     
     sys.exit(0)
 
 
+def apply_server_options(config: Config, args):
+    """Write server command-line options into the config, so resets and reloads keep them"""
+    if args.access_log:
+        config.set('logging.access_log', True)
+    if args.log_format:
+        config.set('logging.format', args.log_format)
+    if args.rate_limit:
+        config.set('rate_limit.enabled', True)
+    if args.latency:
+        if args.latency_jitter:
+            rule = {"method": "*", "kind": "uniform",
+                    "min_ms": max(0.0, args.latency - args.latency_jitter),
+                    "max_ms": args.latency + args.latency_jitter}
+        else:
+            rule = {"method": "*", "kind": "fixed", "ms": args.latency}
+        # Later rules win, so this replaces a '*' rule from the file
+        config.set('latency.rules', list(config.get('latency.rules') or []) + [rule])
+
+
 def start_server(args):
     """Start the mock server only"""
-    server = TelegramMockServer(host=args.host, port=args.port)
+    config = Config(args.config) if args.config else Config()
+    apply_server_options(config, args)
+    logger = Logger.from_settings(config.settings())
+    server = create_server(args, config, logger)
+    
+    if args.watch_config:
+        if not args.config:
+            print("❌ --watch-config needs --config")
+            sys.exit(1)
+        server.watch_config(args.config, customize=lambda reloaded: apply_server_options(reloaded, args))
+    
+    if args.profile:
+        server.profiler.start(sample_every=args.profile_sample)
     
     try:
         server.run(debug=args.debug)
     except KeyboardInterrupt:
         print("\n\n👋 Server stopped.")
         sys.exit(0)
+    finally:
+        # The debug reloader exits without raising KeyboardInterrupt here
+        if args.profile_output:
+            write_profile(server, args.profile_output)
+        logger.close()
+
+
+def write_profile(server: TelegramMockServer, output_file: str):
+    """Stop the profiler and write what it collected, if anything"""
+    server.profiler.stop()
+    # The reloader's watcher process serves no requests; leave the file to
+    # the process that did
+    if server.profiler.stats is None:
+        return
+    server.profiler.dump(output_file)
+    print(f"📊 Profile written to {output_file}")
+
+
+def start_loadgen(args):
+    """Start the mock server and drive the connected bot with virtual users"""
+    server = create_server(args)
+    server.start(port=server.port)
+    
+    try:
+        print(f"🤖 Waiting up to {args.wait_for_bot:g}s for a bot to poll http://{server.host}:{server.port} ...")
+        try:
+            server.wait_for_call('getUpdates', timeout=args.wait_for_bot)
+        except TimeoutError:
+            print("❌ No bot called getUpdates")
+            sys.exit(1)
+        
+        generator = LoadGenerator(server, users=args.users, private_chats=args.private_chats,
+                                  groups=args.groups, seed=args.seed)
+        print(f"🚀 Sending {args.mode}-loop load from {args.users} users...")
+        summary = generator.run(rate=args.rate, duration=args.duration, events=args.events,
+                                mode=args.mode, think_time=args.think_time,
+                                reply_timeout=args.reply_timeout, settle=args.settle)
+    except KeyboardInterrupt:
+        print("\n\n👋 Stopping...")
+        sys.exit(0)
+    finally:
+        server.stop()
+    
+    latency = summary['latency_ms']
+    print(f"\n📊 {summary['events']} events in {summary['duration_s']}s "
+          f"({summary['achieved_rate']}/s, target {summary['target_rate'] or 'max'})")
+    print(f"   Responses: {summary['responses']}, unanswered: {summary['unanswered']}")
+    print(f"   Latency ms: p50 {latency['p50']}  p90 {latency['p90']}  "
+          f"p99 {latency['p99']}  max {latency['max']}")
+    
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(summary, f, indent=2)
+        print(f"📝 Summary written to {args.output}")
+
+
+def run_diff(args):
+    """Compare two recorded sessions; exit with status 1 on behavioural differences"""
+    options = {}
+    if args.ignore_method is not None:
+        options['ignored_methods'] = args.ignore_method
+    if args.volatile is not None:
+        options['volatile'] = args.volatile
+    try:
+        report = diff_sessions(args.baseline, args.current, lookahead=args.lookahead,
+                               max_diffs=args.max_diffs, **options)
+    except (OSError, ValueError) as e:
+        print(f"❌ {e}")
+        sys.exit(2)
+    
+    print(format_diff(report))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, default=str)
+        print(f"\n📝 Report written to {args.output}")
+    
+    if not report['identical']:
+        kinds = ', '.join(f"{count} {kind}" for kind, count in sorted(report['by_kind'].items()))
+        print(f"\n❌ {report['differences']} difference(s) in {report['chats']['differing']} chat(s): {kinds}")
+        sys.exit(1)
+    print(f"\n✅ Same behaviour across {report['compared']} calls")
 
 
 def start_interactive(args):
     """Start the mock server with interactive terminal chat"""
-    server = TelegramMockServer(host=args.host, port=args.port)
+    server = create_server(args)
     
     # Start server in background thread
-    server_thread = threading.Thread(target=lambda: server.run(debug=False), daemon=True)
-    server_thread.start()
-    
-    # Wait a bit for server to start
-    import time
-    time.sleep(1)
+    server.start(port=server.port)
     
     # Start interactive chat
     chat = TerminalChat(server)
@@ -65,6 +179,8 @@ def start_interactive(args):
     except KeyboardInterrupt:
         print("\n\n👋 Stopping...")
         chat.stop()
+    finally:
+        server.stop()
     
     sys.exit(0)
 
@@ -82,6 +198,21 @@ Examples:
   # Start server on custom host/port
   supermock server --host 0.0.0.0 --port 8080
   
+  # Load settings from a file and hot-reload latency/rate limits while running
+  supermock server --config supermock.yaml --watch-config
+  
+  # Emulate 300 ms Telegram latency with 50 ms of jitter
+  supermock server --latency 300 --latency-jitter 50
+  
+  # Profile every 10th request and write flame graph stacks on exit
+  supermock server --profile --profile-sample 10 --profile-output out.collapsed
+  
+  # Send 1000 events/s from 500 users in 200 private chats and 10 groups
+  supermock loadgen --users 500 --private-chats 200 --groups 10 --rate 1000 --duration 30
+  
+  # Check that an optimized bot still behaves the same
+  supermock diff before.jsonl.gz after.jsonl.gz
+  
   # Start interactive terminal chat
   supermock chat
   
@@ -104,26 +235,102 @@ For more information, visit: https://github.com/infernasel/SuperMock-1
     
     # Server command
     server_parser = subparsers.add_parser('server', help='Start mock API server only')
-    server_parser.add_argument('--host', type=str, default='localhost',
+    server_parser.add_argument('--host', type=str, default=None,
                               help='Host to bind the server to (default: localhost)')
-    server_parser.add_argument('--port', type=int, default=8081,
+    server_parser.add_argument('--port', type=int, default=None,
                               help='Port to bind the server to (default: 8081)')
+    server_parser.add_argument('--config', type=str, default=None,
+                              help='YAML or JSON config file (see Config.DEFAULT_CONFIG)')
+    server_parser.add_argument('--watch-config', action='store_true',
+                              help='Reload latency, rate-limit and retention settings when --config changes')
+    server_parser.add_argument('--access-log', action='store_true',
+                              help='Log every Bot API request (asynchronously, see logging.sample in the config)')
+    server_parser.add_argument('--log-format', choices=['text', 'json'], default=None,
+                              help='Log line format (default: text, or logging.format in the config)')
     server_parser.add_argument('--debug', action='store_true',
                               help='Enable debug mode')
+    server_parser.add_argument('--profile', action='store_true',
+                              help='Profile request handlers from startup')
+    server_parser.add_argument('--profile-sample', type=int, default=1,
+                              help='Profile one request out of every N (default: 1)')
+    server_parser.add_argument('--rate-limit', action='store_true',
+                              help='Emulate Telegram flood limits with 429 retry_after responses')
+    server_parser.add_argument('--latency', type=float, default=0.0,
+                              help='Artificial latency added to every Bot API call, in ms')
+    server_parser.add_argument('--latency-jitter', type=float, default=0.0,
+                              help='Uniform jitter around --latency, in ms')
+    server_parser.add_argument('--profile-output', type=str, default=None,
+                              help='Write the profile on exit (.prof for pstats, .collapsed for flame graphs)')
+    
+    # Load generator command
+    loadgen_parser = subparsers.add_parser('loadgen', help='Drive a bot with traffic from virtual users')
+    loadgen_parser.add_argument('--host', type=str, default=None,
+                               help='Host to bind the server to (default: localhost)')
+    loadgen_parser.add_argument('--port', type=int, default=None,
+                               help='Port to bind the server to (default: 8081)')
+    loadgen_parser.add_argument('--config', type=str, default=None,
+                               help='YAML or JSON config file (see Config.DEFAULT_CONFIG)')
+    loadgen_parser.add_argument('--users', type=int, default=100,
+                               help='Number of distinct users (default: 100)')
+    loadgen_parser.add_argument('--private-chats', type=int, default=None,
+                               help='Number of users with a private chat (default: all)')
+    loadgen_parser.add_argument('--groups', type=int, default=0,
+                               help='Number of groups shared among the users (default: 0)')
+    loadgen_parser.add_argument('--mode', choices=['open', 'closed'], default='open',
+                               help='open: fixed rate; closed: users wait for replies (default: open)')
+    loadgen_parser.add_argument('--rate', type=float, default=None,
+                               help='Open loop: target events per second (default: as fast as possible)')
+    loadgen_parser.add_argument('--think-time', type=float, default=1.0,
+                               help='Closed loop: mean seconds between a reply and the next event (default: 1)')
+    loadgen_parser.add_argument('--reply-timeout', type=float, default=5.0,
+                               help='Closed loop: seconds a user waits for a reply (default: 5)')
+    loadgen_parser.add_argument('--duration', type=float, default=10.0,
+                               help='Seconds to generate load for (default: 10)')
+    loadgen_parser.add_argument('--events', type=int, default=None,
+                               help='Stop after this many events')
+    loadgen_parser.add_argument('--settle', type=float, default=1.0,
+                               help='Seconds to wait for replies after the last event (default: 1)')
+    loadgen_parser.add_argument('--seed', type=int, default=None,
+                               help='Seed for reproducible traffic')
+    loadgen_parser.add_argument('--wait-for-bot', type=float, default=30.0,
+                               help='Seconds to wait for the bot to start polling (default: 30)')
+    loadgen_parser.add_argument('--output', type=str, default=None,
+                               help='Write the summary as JSON')
+    
+    # Diff command
+    diff_parser = subparsers.add_parser('diff', help='Compare the behaviour of two recorded sessions')
+    diff_parser.add_argument('baseline', type=str,
+                            help='Traffic capture (.jsonl, .har, optionally .gz), scenario or history file')
+    diff_parser.add_argument('current', type=str,
+                            help='Session to compare against the baseline')
+    diff_parser.add_argument('--ignore-method', type=str, nargs='+', default=None,
+                            help='Methods to count but not compare (default: getUpdates getMe getWebhookInfo)')
+    diff_parser.add_argument('--volatile', type=str, nargs='+', default=None,
+                            help='Fields to normalize away (default: dates, message/update/query IDs, file IDs)')
+    diff_parser.add_argument('--lookahead', type=int, default=20,
+                            help='Calls searched to re-align a chat after an inserted or missing call (default: 20)')
+    diff_parser.add_argument('--max-diffs', type=int, default=100,
+                            help='Differences to list (default: 100)')
+    diff_parser.add_argument('--output', type=str, default=None,
+                            help='Write the full report as JSON')
     
     # Chat command
     chat_parser = subparsers.add_parser('chat', help='Start interactive terminal chat')
-    chat_parser.add_argument('--host', type=str, default='localhost',
+    chat_parser.add_argument('--host', type=str, default=None,
                             help='Host to bind the server to (default: localhost)')
-    chat_parser.add_argument('--port', type=int, default=8081,
+    chat_parser.add_argument('--port', type=int, default=None,
                             help='Port to bind the server to (default: 8081)')
+    chat_parser.add_argument('--config', type=str, default=None,
+                            help='YAML or JSON config file (see Config.DEFAULT_CONFIG)')
     
     # Web command
     web_parser = subparsers.add_parser('web', help='Start web-based UI')
-    web_parser.add_argument('--host', type=str, default='localhost',
+    web_parser.add_argument('--host', type=str, default=None,
                            help='API server host (default: localhost)')
-    web_parser.add_argument('--port', type=int, default=8081,
+    web_parser.add_argument('--port', type=int, default=None,
                            help='API server port (default: 8081)')
+    web_parser.add_argument('--config', type=str, default=None,
+                           help='YAML or JSON config file (see Config.DEFAULT_CONFIG)')
     web_parser.add_argument('--webhost', type=str, default='localhost',
                            help='Web UI host (default: localhost)')
     web_parser.add_argument('--webport', type=int, default=8082,
@@ -139,6 +346,10 @@ For more information, visit: https://github.com/infernasel/SuperMock-1
     
     if args.command == 'server':
         start_server(args)
+    elif args.command == 'loadgen':
+        start_loadgen(args)
+    elif args.command == 'diff':
+        run_diff(args)
     elif args.command == 'chat':
         start_interactive(args)
     elif args.command == 'web':
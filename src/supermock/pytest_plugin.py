@@ -0,0 +1,68 @@
+"""
+pytest plugin for SuperMock
+
+Provides mock server fixtures. One server is started per test session (per
+worker under pytest-xdist, each on its own ephemeral port) and reset between
+tests by swapping its state, so tests neither share state nor pay for a new
+server. The plugin is registered automatically when SuperMock is installed;
+otherwise import the fixtures from a conftest.py.
+"""
+
+import pytest
+
+from supermock.api import TelegramMockServer, create_session, IN_PROCESS_BASE_URL
+from supermock.utils import GroupChatSimulator, InlineModeSimulator
+
+
+@pytest.fixture(scope='session')
+def supermock_worker_server():
+    """
+    Mock server shared by all tests of this session or xdist worker
+
+    Session fixtures are instantiated once per xdist worker process, and the
+    server listens on an ephemeral localhost port, so workers never race for ports.
+    Prefer supermock_server, which resets the state before each test.
+    """
+    server = TelegramMockServer(host='127.0.0.1')
+    server.start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def supermock_server(supermock_worker_server):
+    """Worker server with fresh state for this test"""
+    supermock_worker_server.reset()
+    return supermock_worker_server
+
+
+@pytest.fixture
+def supermock_base_url():
+    """Base URL routed to the server in-process"""
+    return IN_PROCESS_BASE_URL
+
+
+@pytest.fixture
+def supermock_live_url(supermock_server):
+    """Base URL of the server's listening socket, for bots in other threads or processes"""
+    return f"http://{supermock_server.host}:{supermock_server.port}"
+
+
+@pytest.fixture
+def supermock_session(supermock_server):
+    """requests session whose calls go straight into supermock_server"""
+    session = create_session(supermock_server)
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def supermock_groups(supermock_server):
+    """GroupChatSimulator bound to supermock_server"""
+    return GroupChatSimulator(supermock_server)
+
+
+@pytest.fixture
+def supermock_inline(supermock_server):
+    """InlineModeSimulator bound to supermock_server"""
+    return InlineModeSimulator(supermock_server)
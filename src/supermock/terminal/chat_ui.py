@@ -23,7 +23,7 @@ class TerminalChat:
     def _display_message(self, msg_type: str, sender: str, text: str, timestamp: Optional[str] = None):
         """Display a message in the terminal"""
         if timestamp is None:
-            timestamp = datetime.now().strftime("%H:%M")
+            timestamp = self.mock_server.clock.now().strftime("%H:%M")
         
         if msg_type == "user":
             # User messages aligned to the right
@@ -1,9 +1,20 @@
 """Utils module for SuperMock"""
 
-from .config import Config
+from .chatter import GroupChatter, ZipfSampler
+from .clock import Clock
+from .config import Config, ConfigWatcher, Settings
 from .logger import Logger
 from .history import HistoryManager
-from .group_chat import GroupChatSimulator
+from .group_chat import GroupChatSimulator, GroupMembers
 from .inline_mode import InlineModeSimulator
+from .histogram import LatencyHistogram
+from .latency import LatencyInjector, LatencyModel
+from .profiler import RequestProfiler
+from .rate_limit import RateLimiter
+from .users import SimulatedUser, UserRegistry
 
-__all__ = ['Config', 'Logger', 'HistoryManager', 'GroupChatSimulator', 'InlineModeSimulator']
+__all__ = [
+    'Config', 'Logger', 'HistoryManager', 'GroupChatSimulator', 'InlineModeSimulator',
+    'RequestProfiler', 'RateLimiter', 'LatencyInjector', 'LatencyModel', 'Clock', 'LatencyHistogram',
+    'GroupMembers', 'UserRegistry', 'SimulatedUser', 'GroupChatter', 'ZipfSampler', 'Settings', 'ConfigWatcher'
+]
@@ -0,0 +1,353 @@
+"""
+Group chatter generation for SuperMock
+
+Produces bulk group traffic at a target rate. Senders follow a Zipf
+distribution, so a few members write most of the messages, and the mix covers
+plain messages, replies, mentions, commands and members joining or leaving.
+Any number of background chatters share one scheduler thread.
+"""
+
+import asyncio
+import heapq
+import itertools
+import math
+import random
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, List, Any, Optional, Tuple
+
+
+# Default share of each event kind
+DEFAULT_MIX = {
+    'message': 0.60,
+    'reply': 0.15,
+    'mention': 0.10,
+    'command': 0.05,
+    'join': 0.05,
+    'leave': 0.05
+}
+
+COMMANDS = ('/start', '/help', '/stats', '/rules', '/settings')
+
+WORDS = (
+    'hi', 'hello', 'thanks', 'anyone', 'here', 'know', 'how', 'to', 'the', 'bot',
+    'works', 'great', 'idea', 'agree', 'not', 'sure', 'check', 'this', 'out', 'lol',
+    'today', 'tomorrow', 'meeting', 'link', 'please', 'help', 'question', 'yes', 'no', 'maybe'
+)
+
+# Messages a reply can quote
+RECENT_MESSAGES = 50
+
+# Seconds an idle scheduler thread lingers before exiting
+IDLE_TIMEOUT = 1.0
+
+
+class ZipfSampler:
+    """
+    Zipf-distributed ranks 1..n in O(1) time and memory
+
+    Uses rejection-inversion sampling (Hörmann and Derflinger), so no table
+    of probabilities is built and n may change between samples.
+    """
+
+    def __init__(self, exponent: float = 1.1):
+        if exponent <= 0:
+            raise ValueError("Zipf exponent must be positive")
+        self.exponent = exponent
+        self._h_integral_x1 = self._h_integral(1.5) - 1.0
+        self._s = 2.0 - self._h_integral_inverse(self._h_integral(2.5) - self._h(2.0))
+
+    def sample(self, n: int, rng: random.Random) -> int:
+        """Draw a rank between 1 and n (rank 1 is the most likely)"""
+        if n <= 1:
+            return 1
+        h_integral_n = self._h_integral(n + 0.5)
+        while True:
+            u = h_integral_n + rng.random() * (self._h_integral_x1 - h_integral_n)
+            x = self._h_integral_inverse(u)
+            k = int(x + 0.5)
+            if k < 1:
+                k = 1
+            elif k > n:
+                k = n
+            if k - x <= self._s or u >= self._h_integral(k + 0.5) - self._h(k):
+                return k
+
+    def _h(self, x: float) -> float:
+        return math.exp(-self.exponent * math.log(x))
+
+    def _h_integral(self, x: float) -> float:
+        log_x = math.log(x)
+        return _expm1_over_x((1.0 - self.exponent) * log_x) * log_x
+
+    def _h_integral_inverse(self, x: float) -> float:
+        t = x * (1.0 - self.exponent)
+        if t < -1.0:
+            t = -1.0
+        return math.exp(_log1p_over_x(t) * x)
+
+
+def _expm1_over_x(x: float) -> float:
+    return math.expm1(x) / x if abs(x) > 1e-8 else 1.0 + x / 2.0
+
+
+def _log1p_over_x(x: float) -> float:
+    return math.log1p(x) / x if abs(x) > 1e-8 else 1.0 - x / 2.0
+
+
+class GroupChatter:
+    """
+    Traffic source for one group
+
+    Created by GroupChatSimulator.simulate_chatter(); runs either on the
+    shared scheduler thread, in the calling thread, or as a coroutine.
+    Events are paced on the monotonic clock; message dates follow the
+    server clock.
+    """
+
+    def __init__(self, simulator, group_id: int, rate: float, duration: Optional[float] = None,
+                 count: Optional[int] = None, mix: Optional[Dict[str, float]] = None,
+                 zipf_exponent: float = 1.1, seed: Optional[int] = None, poisson: bool = True):
+        """
+        Args:
+            simulator: GroupChatSimulator of the group
+            group_id: Group chat ID
+            rate: Target events per second
+            duration: Stop after this many seconds (default: until stopped)
+            count: Stop after this many events (default: until stopped)
+            mix: Relative weights of 'message', 'reply', 'mention', 'command',
+                'join' and 'leave' events
+            zipf_exponent: Skew of sender activity; higher means fewer,
+                more active senders
+            seed: Seed for reproducible senders, texts and event kinds
+            poisson: Exponential gaps between events (True) or a fixed interval
+        """
+        if group_id not in simulator.groups:
+            raise ValueError(f"Group {group_id} does not exist")
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        mix = dict(DEFAULT_MIX if mix is None else mix)
+        unknown = set(mix) - set(DEFAULT_MIX)
+        if unknown:
+            raise ValueError(f"Unknown event kinds: {', '.join(sorted(unknown))}")
+
+        self.simulator = simulator
+        self.group_id = group_id
+        self.rate = rate
+        self.duration = duration
+        self.count = count
+        self.poisson = poisson
+        self.rng = random.Random(seed)
+        self.zipf = ZipfSampler(zipf_exponent)
+        self.kinds = list(mix)
+        self.cum_weights = list(itertools.accumulate(mix[kind] for kind in self.kinds))
+
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.done = threading.Event()
+        self.error: Optional[BaseException] = None
+        self.recent: Deque[Dict[str, Any]] = deque(maxlen=RECENT_MESSAGES)
+        self.counts: Dict[str, int] = {kind: 0 for kind in DEFAULT_MIX}
+        self.sent = 0
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.next_at = 0.0
+        self.ends_at = float('inf')
+
+    def start(self, now: float):
+        """Anchor the schedule at now (monotonic seconds)"""
+        self.started_at = now
+        self.ends_at = now + self.duration if self.duration is not None else float('inf')
+        self.next_at = now + self._gap()
+
+    def step(self, now: float) -> Optional[float]:
+        """
+        Send every event due by now
+
+        Returns:
+            When the next event is due, or None once the chatter is finished
+        """
+        with self.lock:
+            try:
+                while self.next_at <= now and not self._finished():
+                    self._emit()
+                    self.next_at += self._gap()
+            except Exception as e:
+                self.error = e
+                self._finish()
+                return None
+            if self._finished():
+                self._finish()
+                return None
+            return self.next_at
+
+    def stop(self):
+        """Stop sending; no event is sent after this returns"""
+        with self.lock:
+            self.stopped.set()
+            self._finish()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until the chatter finishes; returns False on timeout"""
+        return self.done.wait(timeout)
+
+    @property
+    def running(self) -> bool:
+        """Whether the chatter is still sending"""
+        return self.started_at is not None and not self.done.is_set()
+
+    def stats(self) -> Dict[str, Any]:
+        """Events sent per kind and the achieved rate"""
+        end = self.finished_at if self.finished_at is not None else time.monotonic()
+        elapsed = end - self.started_at if self.started_at is not None else 0.0
+        return {
+            "group_id": self.group_id,
+            "target_rate": self.rate,
+            "sent": self.sent,
+            "counts": dict(self.counts),
+            "elapsed_s": round(elapsed, 3),
+            "achieved_rate": round(self.sent / elapsed, 1) if elapsed > 0 else 0.0,
+            "error": repr(self.error) if self.error is not None else None
+        }
+
+    def run(self):
+        """Send events in the calling thread until finished"""
+        if self.duration is None and self.count is None:
+            raise ValueError("Pass duration or count to run in the foreground")
+        self.start(time.monotonic())
+        while True:
+            next_at = self.step(time.monotonic())
+            if next_at is None:
+                return
+            self.stopped.wait(max(0.0, next_at - time.monotonic()))
+
+    async def run_async(self):
+        """Send events from the running event loop until finished"""
+        if self.duration is None and self.count is None:
+            raise ValueError("Pass duration or count to run in the foreground")
+        self.start(time.monotonic())
+        while True:
+            next_at = self.step(time.monotonic())
+            if next_at is None:
+                return
+            await asyncio.sleep(max(0.0, next_at - time.monotonic()))
+
+    def _gap(self) -> float:
+        return self.rng.expovariate(self.rate) if self.poisson else 1.0 / self.rate
+
+    def _finished(self) -> bool:
+        return (self.stopped.is_set()
+                or (self.count is not None and self.sent >= self.count)
+                or self.next_at >= self.ends_at)
+
+    def _finish(self):
+        if not self.done.is_set():
+            self.finished_at = time.monotonic()
+            self.done.set()
+
+    def _sender(self) -> Dict[str, Any]:
+        """Pick a sender by Zipf rank"""
+        members = self.simulator.members[self.group_id]
+        return members[self.zipf.sample(len(members), self.rng) - 1]
+
+    def _text(self, low: int = 2, high: int = 8) -> str:
+        rng = self.rng
+        return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(low, high)))
+
+    def _emit(self):
+        """Send one event of a randomly chosen kind"""
+        simulator = self.simulator
+        group_id = self.group_id
+        rng = self.rng
+        kind = rng.choices(self.kinds, cum_weights=self.cum_weights)[0]
+        members = simulator.members[group_id]
+
+        if kind == 'join' or not len(members):
+            simulator.simulate_user_joined(group_id, simulator.users.create())
+            kind = 'join'
+        elif kind == 'leave' and len(members) > 1:
+            simulator.simulate_user_left(group_id, members.sample(rng))
+        else:
+            if kind == 'leave' or (kind == 'reply' and not self.recent):
+                kind = 'message'
+            sender = self._sender()
+            fields: Dict[str, Any] = {}
+            if kind == 'reply':
+                text = self._text()
+                fields['reply_to_message'] = rng.choice(self.recent)
+            elif kind == 'mention':
+                bot_username = simulator.mock_server.settings.bot.username
+                username = bot_username if rng.random() < 0.5 else self._sender().get('username', 'user')
+                text = f"@{username} {self._text()}"
+                fields['entities'] = [{"type": "mention", "offset": 0, "length": len(username) + 1}]
+            elif kind == 'command':
+                text = f"{rng.choice(COMMANDS)}@{simulator.mock_server.settings.bot.username}"
+                fields['entities'] = [{"type": "bot_command", "offset": 0, "length": len(text)}]
+            else:
+                text = self._text()
+            update = simulator.send_group_message(group_id, text, sender, **fields)
+            self.recent.append(update['message'])
+
+        self.counts[kind] += 1
+        self.sent += 1
+
+
+class ChatterScheduler:
+    """Runs any number of background chatters on one thread"""
+
+    _shared: Optional['ChatterScheduler'] = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        # (due, sequence, chatter) heap
+        self.heap: List[Tuple[float, int, GroupChatter]] = []
+        self.sequence = itertools.count()
+        self.thread: Optional[threading.Thread] = None
+
+    @classmethod
+    def shared(cls) -> 'ChatterScheduler':
+        """Process-wide scheduler"""
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls()
+            return cls._shared
+
+    def add(self, chatter: GroupChatter):
+        """Start a chatter on the scheduler thread"""
+        with self.condition:
+            chatter.start(time.monotonic())
+            heapq.heappush(self.heap, (chatter.next_at, next(self.sequence), chatter))
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="supermock-chatter", daemon=True)
+                self.thread.start()
+            self.condition.notify()
+
+    def _run(self):
+        with self.condition:
+            while True:
+                if not self.heap:
+                    self.condition.wait(IDLE_TIMEOUT)
+                    if not self.heap:
+                        self.thread = None
+                        return
+                    continue
+
+                due, _, chatter = self.heap[0]
+                if chatter.done.is_set():
+                    heapq.heappop(self.heap)
+                    continue
+                now = time.monotonic()
+                if due > now:
+                    self.condition.wait(due - now)
+                    continue
+
+                heapq.heappop(self.heap)
+                self.condition.release()
+                try:
+                    next_at = chatter.step(now)
+                finally:
+                    self.condition.acquire()
+                if next_at is not None:
+                    heapq.heappush(self.heap, (next_at, next(self.sequence), chatter))
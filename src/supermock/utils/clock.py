@@ -0,0 +1,141 @@
+"""
+Virtual clock for SuperMock
+
+All timestamps and timeouts of a mock server go through its Clock, so
+scenarios spanning hours of simulated time can run in milliseconds.
+"""
+
+import threading
+import time
+import weakref
+from datetime import datetime
+from typing import List, Optional
+
+
+class Clock:
+    """
+    Switchable clock with real, frozen and manual modes
+
+    - real: wall-clock time
+    - frozen: timestamps stand still, waits and timeouts use real time
+    - manual: time only moves with advance(); waits and timeouts complete
+      when the clock is advanced past their deadline
+    """
+
+    REAL = 'real'
+    FROZEN = 'frozen'
+    MANUAL = 'manual'
+    MODES = (REAL, FROZEN, MANUAL)
+
+    def __init__(self, mode: str = REAL, start: Optional[float] = None):
+        self.lock = threading.Lock()
+        self.mode = self.REAL
+        self._now = 0.0
+        self._waiting: 'weakref.WeakSet[threading.Condition]' = weakref.WeakSet()
+        self.set_mode(mode, start)
+
+    def set_mode(self, mode: str, start: Optional[float] = None):
+        """
+        Switch modes
+
+        Args:
+            mode: 'real', 'frozen' or 'manual'
+            start: Epoch seconds to start from (default: the current clock time)
+        """
+        if mode not in self.MODES:
+            raise ValueError(f"Unsupported clock mode: {mode}")
+        with self.lock:
+            now = self.time()
+            self.mode = mode
+            self._now = float(now if start is None else start)
+            waiting = list(self._waiting)
+        self._wake(waiting)
+
+    def freeze(self, at: Optional[float] = None):
+        """Stop timestamps at the given time (default: now)"""
+        self.set_mode(self.FROZEN, at)
+
+    def use_manual(self, start: Optional[float] = None):
+        """Move time only with advance(), starting at the given time (default: now)"""
+        self.set_mode(self.MANUAL, start)
+
+    def use_real(self):
+        """Go back to wall-clock time"""
+        self.set_mode(self.REAL)
+
+    def time(self) -> float:
+        """Current time in epoch seconds"""
+        if self.mode == self.REAL:
+            return time.time()
+        return self._now
+
+    def timestamp(self) -> int:
+        """Current time as a Bot API date (whole epoch seconds)"""
+        return int(self.time())
+
+    def now(self) -> datetime:
+        """Current local time as a datetime"""
+        return datetime.fromtimestamp(self.time())
+
+    def monotonic(self) -> float:
+        """Clock used for deadlines (virtual in manual mode)"""
+        if self.mode == self.MANUAL:
+            return self._now
+        return time.monotonic()
+
+    def advance(self, seconds: float):
+        """Move frozen or manual time forward and wake waits whose deadline passed"""
+        if seconds < 0:
+            raise ValueError("Cannot move the clock backwards")
+        if self.mode == self.REAL:
+            raise RuntimeError("Cannot advance a real-time clock")
+        with self.lock:
+            self._now += seconds
+            waiting = list(self._waiting)
+        self._wake(waiting)
+
+    def watch(self, condition: threading.Condition):
+        """
+        Have advance() notify a condition when manual time moves
+
+        Call it while holding the condition and before checking a deadline:
+        an advance() after that sees the condition and can only notify once
+        this thread waits, while an earlier one has already moved the time
+        the check reads.
+        """
+        with self.lock:
+            self._waiting.add(condition)
+
+    def wait(self, condition: threading.Condition, timeout: float) -> bool:
+        """
+        Wait on a held condition for up to timeout clock seconds
+
+        In manual mode the condition must have been passed to watch() before
+        the caller checked its deadline.
+
+        Returns:
+            False if the wait certainly timed out, True otherwise
+        """
+        if self.mode != self.MANUAL:
+            return condition.wait(timeout)
+        self.watch(condition)
+        condition.wait()
+        return True
+
+    def sleep(self, seconds: float):
+        """Sleep for clock seconds"""
+        if self.mode != self.MANUAL:
+            time.sleep(seconds)
+            return
+        condition = threading.Condition()
+        deadline = self._now + seconds
+        with condition:
+            self.watch(condition)
+            while self.mode == self.MANUAL and self._now < deadline:
+                self.wait(condition, deadline - self._now)
+
+    def _wake(self, waiting: List[threading.Condition]):
+        """Wake manual-mode waits so they can recheck their deadlines"""
+        for condition in waiting:
+            with condition:
+                condition.notify_all()
@@ -1,13 +1,28 @@
 """
 Configuration management for SuperMock
+
+Config is the editable, file-backed configuration. Components never read it
+directly: Config.settings() compiles it once into an immutable Settings
+object whose values are plain attributes, and ConfigWatcher recompiles it
+when the file changes so a running server can pick up new settings.
 """
 
+import copy
 import os
 import json
+import threading
 import yaml
-from typing import Dict, Any, Optional
+from typing import Callable, Dict, Iterable, List, Any, Optional, Tuple
 from pathlib import Path
 
+from .latency import LatencyModel
+from .logger import level_number
+from .rate_limit import RateLimiter
+
+
+# Sections a running server applies on reload; the rest need a restart
+HOT_RELOAD_SECTIONS = ('latency', 'rate_limit', 'retention')
+
 
 class Config:
     """Configuration manager for SuperMock"""
@@ -31,16 +46,37 @@ class Config:
         "logging": {
             "enabled": True,
             "level": "INFO",
-            "file": None
+            "file": None,
+            "format": "text",  # or "json" for one JSON object per line
+            "asynchronous": True,
+            "queue_size": 10000,
+            "access_log": False,
+            # Keep 1 in N records per Bot API method, e.g. {"getUpdates": 100}
+            "sample": {},
+            # Minimum level per Bot API method, e.g. {"getUpdates": "WARNING"}
+            "method_levels": {}
         },
         "features": {
             "save_history": True,
             "history_file": ".supermock_history.json"
+        },
+        "rate_limit": dict(RateLimiter.DEFAULTS, enabled=False),
+        "latency": {
+            # {"method": "*", "token": None, "kind": "fixed", "ms": 300, ...}
+            "rules": []
+        },
+        "retention": {
+            "calls": 10000,
+            "tracked_responses": 100000,
+            "inline_cache": 10000
         }
     }
     
     def __init__(self, config_file: Optional[str] = None):
-        self.config = self.DEFAULT_CONFIG.copy()
+        self.config = copy.deepcopy(self.DEFAULT_CONFIG)
+        self.config_file = config_file
+        self._index: Optional[Dict[str, Any]] = None
+        self._settings: Optional['Settings'] = None
         
         if config_file:
             self.load_from_file(config_file)
@@ -61,28 +97,23 @@ class Config:
                 raise ValueError("Unsupported configuration file format. Use .yaml, .yml, or .json")
         
         # Merge with default config
-        self._merge_dict(self.config, loaded_config)
+        self._merge_dict(self.config, loaded_config or {})
+        self._invalidate()
     
-    def _merge_dict(self, base: Dict, update: Dict):
+    @staticmethod
+    def _merge_dict(base: Dict, update: Dict):
         """Recursively merge update dict into base dict"""
         for key, value in update.items():
             if key in base and isinstance(base[key], dict) and isinstance(value, dict):
-                self._merge_dict(base[key], value)
+                Config._merge_dict(base[key], value)
             else:
                 base[key] = value
     
     def get(self, key: str, default: Any = None) -> Any:
         """Get configuration value by dot-separated key path"""
-        keys = key.split('.')
-        value = self.config
-        
-        for k in keys:
-            if isinstance(value, dict) and k in value:
-                value = value[k]
-            else:
-                return default
-        
-        return value
+        if self._index is None:
+            self._index = _flatten(self.config)
+        return self._index.get(key, default)
     
     def set(self, key: str, value: Any):
         """Set configuration value by dot-separated key path"""
@@ -95,6 +126,18 @@ class Config:
             target = target[k]
         
         target[keys[-1]] = value
+        self._invalidate()
+    
+    def settings(self) -> 'Settings':
+        """Compile the configuration into immutable Settings (cached until changed)"""
+        if self._settings is None:
+            self._settings = Settings(self.config)
+        return self._settings
+    
+    def _invalidate(self):
+        """Drop the key index and compiled settings after a change"""
+        self._index = None
+        self._settings = None
     
     def save_to_file(self, config_file: str):
         """Save configuration to file"""
@@ -107,3 +150,203 @@ class Config:
                 json.dump(self.config, f, indent=2)
             else:
                 raise ValueError("Unsupported configuration file format. Use .yaml, .yml, or .json")
+
+
+def _flatten(values: Dict[str, Any], prefix: str = '') -> Dict[str, Any]:
+    """Index every nested value by its dot-separated key path"""
+    index = {}
+    for key, value in values.items():
+        path = f"{prefix}{key}"
+        index[path] = value
+        if isinstance(value, dict):
+            index.update(_flatten(value, f"{path}."))
+    return index
+
+
+class SettingsSection:
+    """Read-only config section whose values are attributes"""
+    
+    def __init__(self, values: Dict[str, Any]):
+        self.__dict__.update(values)
+    
+    def __getattr__(self, name: str) -> Any:
+        # Only called for keys the section does not have
+        raise AttributeError(f"No setting named {name!r}")
+    
+    def __setattr__(self, name: str, value: Any):
+        raise AttributeError("Settings are read-only; change the Config and recompile")
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return copy.deepcopy(self.__dict__)
+
+
+class Settings:
+    """
+    Immutable configuration compiled from a Config
+    
+    Sections are attributes (settings.server.port, settings.bot.username),
+    so hot paths never parse key strings. Values derived from several keys,
+    such as the bot's User object and the latency models, are built here
+    once instead of on every request.
+    """
+    
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        """
+        Args:
+            config: Configuration dict (default: Config.DEFAULT_CONFIG);
+                missing sections and keys take their default values
+        """
+        data = copy.deepcopy(Config.DEFAULT_CONFIG)
+        if config:
+            Config._merge_dict(data, copy.deepcopy(config))
+        
+        # Unknown level names fail here rather than on the first log record
+        level_number(data['logging']['level'])
+        for level in data['logging']['method_levels'].values():
+            level_number(level)
+        
+        bot = data['bot']
+        user = data['user']
+        rate_limit = dict(data['rate_limit'])
+        enabled = rate_limit.pop('enabled', False)
+        
+        self.data = data
+        self.index = _flatten(data)
+        self.server = SettingsSection(data['server'])
+        self.bot = SettingsSection(bot)
+        self.user = SettingsSection(user)
+        self.logging = SettingsSection(data['logging'])
+        self.features = SettingsSection(data['features'])
+        self.rate_limit = SettingsSection(data['rate_limit'])
+        self.latency = SettingsSection(data['latency'])
+        self.retention = SettingsSection(data['retention'])
+        # Shared by every message; messages are never mutated after creation
+        self.bot_user = {
+            "id": bot['id'],
+            "is_bot": True,
+            "first_name": bot['first_name'],
+            "username": bot['username']
+        }
+        self.default_user = {
+            "id": user['id'],
+            "is_bot": False,
+            "first_name": user['first_name'],
+            "username": user['username']
+        }
+        self.rate_limit_enabled = bool(enabled)
+        self.rate_limits = rate_limit
+        self.latency_rules = tuple(_compile_latency_rules(data['latency'].get('rules') or []))
+        # Sections added by the config file
+        for name, values in data.items():
+            if name not in self.__dict__:
+                setattr(self, name, SettingsSection(values) if isinstance(values, dict) else values)
+        self._frozen = True
+    
+    def __setattr__(self, name: str, value: Any):
+        if self.__dict__.get('_frozen'):
+            raise AttributeError("Settings are read-only; change the Config and recompile")
+        super().__setattr__(name, value)
+    
+    def get(self, key: str, default: Any = None) -> Any:
+        """Value by dot-separated key path, from a precomputed index"""
+        return self.index.get(key, default)
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """The configuration the settings were compiled from"""
+        return copy.deepcopy(self.data)
+    
+    def replace_sections(self, other: 'Settings', names: Iterable[str] = HOT_RELOAD_SECTIONS) -> 'Settings':
+        """Settings with the named sections taken from other"""
+        data = self.to_dict()
+        for name in names:
+            if name in other.data:
+                data[name] = copy.deepcopy(other.data[name])
+        return Settings(data)
+
+
+def _compile_latency_rules(rules: List[Dict[str, Any]]) -> Iterable[Tuple[str, Optional[str], LatencyModel]]:
+    """Build (method, token, model) triples from latency rule specs"""
+    for rule in rules:
+        spec = dict(rule)
+        method = spec.pop('method', '*')
+        token = spec.pop('token', None)
+        yield method, token, LatencyModel.from_spec(spec)
+
+
+# Settings compiled from Config.DEFAULT_CONFIG
+DEFAULT_SETTINGS = Settings()
+
+
+class ConfigWatcher:
+    """
+    Reload a config file when it changes
+    
+    Polls the file's modification time on a daemon thread. A file that fails
+    to load or compile is reported through last_error and the previous
+    settings stay in effect.
+    """
+    
+    def __init__(self, config_file: str, on_reload: Callable[[Settings], None], interval: float = 1.0,
+                 customize: Optional[Callable[['Config'], None]] = None):
+        """
+        Args:
+            config_file: YAML or JSON config file
+            on_reload: Called with the recompiled settings after each change
+            interval: Seconds between checks
+            customize: Called with each reloaded Config before it is compiled,
+                e.g. to reapply command-line options
+        """
+        self.config_file = config_file
+        self.on_reload = on_reload
+        self.interval = interval
+        self.customize = customize
+        self.reloads = 0
+        self.last_error: Optional[Exception] = None
+        self._mtime = self._stat()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+    
+    def _stat(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(self.config_file)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+    
+    def check(self) -> bool:
+        """Reload now if the file changed; returns whether settings were reloaded"""
+        mtime = self._stat()
+        if mtime is None or mtime == self._mtime:
+            return False
+        self._mtime = mtime
+        try:
+            config = Config(self.config_file)
+            if self.customize is not None:
+                self.customize(config)
+            settings = config.settings()
+        except Exception as e:
+            self.last_error = e
+            return False
+        self.last_error = None
+        self.on_reload(settings)
+        self.reloads += 1
+        return True
+    
+    def start(self) -> 'ConfigWatcher':
+        """Start watching in the background"""
+        if self._thread is None:
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name="supermock-config", daemon=True)
+            self._thread.start()
+        return self
+    
+    def stop(self):
+        """Stop watching"""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(self.interval + 1)
+            self._thread = None
+    
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self.check()
@@ -4,57 +4,154 @@ Group Chat Simulation for SuperMock
 Allows testing bots in group chat scenarios with multiple users.
 """
 
-from typing import Dict, List, Any, Optional
-from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Any, Optional
 import random
 
+from .chatter import ChatterScheduler, GroupChatter
+
+
+class GroupMembers:
+    """
+    Members of one group with O(1) add, remove, lookup and random sampling
+    
+    Members live in a list with a user ID -> position index; removal swaps
+    the last member into the freed slot. Copies share storage until either
+    side changes, so snapshots of huge groups are O(1).
+    """
+    
+    __slots__ = ('_users', '_index', '_shared')
+    
+    def __init__(self, users: Iterable[Dict[str, Any]] = ()):
+        self._users: List[Dict[str, Any]] = []
+        self._index: Dict[int, int] = {}
+        self._shared = False
+        for user in users:
+            self.add(user)
+    
+    def add(self, user: Dict[str, Any]) -> bool:
+        """Add a member; returns False if they already are one"""
+        if user['id'] in self._index:
+            return False
+        self._own()
+        self._index[user['id']] = len(self._users)
+        self._users.append(user)
+        return True
+    
+    def remove(self, user_id: int) -> Optional[Dict[str, Any]]:
+        """Remove a member; returns the removed user, or None if absent"""
+        if user_id not in self._index:
+            return None
+        self._own()
+        position = self._index.pop(user_id)
+        user = self._users[position]
+        last = self._users.pop()
+        if last is not user:
+            self._users[position] = last
+            self._index[last['id']] = position
+        return user
+    
+    def get(self, user_id: int) -> Optional[Dict[str, Any]]:
+        """Look a member up by user ID"""
+        position = self._index.get(user_id)
+        return self._users[position] if position is not None else None
+    
+    def sample(self, rng: Optional[random.Random] = None) -> Dict[str, Any]:
+        """Pick a uniformly random member"""
+        if not self._users:
+            raise ValueError("Group has no members")
+        return self._users[int((rng or random).random() * len(self._users))]
+    
+    def to_list(self) -> List[Dict[str, Any]]:
+        """Members as a new list"""
+        return list(self._users)
+    
+    def copy(self) -> 'GroupMembers':
+        """Copy-on-write copy of the membership"""
+        members = GroupMembers.__new__(GroupMembers)
+        members._users = self._users
+        members._index = self._index
+        members._shared = self._shared = True
+        return members
+    
+    def _own(self):
+        """Take a private copy of shared storage before changing it"""
+        if self._shared:
+            self._users = list(self._users)
+            self._index = dict(self._index)
+            self._shared = False
+    
+    def __len__(self) -> int:
+        return len(self._users)
+    
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self._index
+    
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return iter(self._users)
+    
+    def __getitem__(self, position: int) -> Dict[str, Any]:
+        return self._users[position]
+
 
 class GroupChatSimulator:
     """Simulate group chat behavior for testing bots in group scenarios"""
     
     def __init__(self, mock_server):
         self.mock_server = mock_server
-        self.groups: Dict[int, Dict[str, Any]] = {}
-        self.group_id_counter = -1000000000  # Negative IDs for groups
-        self.members: Dict[int, List[Dict[str, Any]]] = {}  # group_id -> members
     
-    def create_group(self, title: str, member_count: int = 3) -> int:
+    @property
+    def groups(self) -> Dict[int, Dict[str, Any]]:
+        """Groups of the server's current state (group_id -> chat)"""
+        return self.mock_server.state.groups
+    
+    @property
+    def members(self) -> Dict[int, GroupMembers]:
+        """Group members of the server's current state (group_id -> members)"""
+        return self.mock_server.state.group_members
+    
+    @property
+    def users(self):
+        """Registry of all simulated users of the server's current state"""
+        return self.mock_server.state.users
+    
+    def create_group(self, title: str, member_count: int = 3, supergroup: bool = False) -> int:
         """
         Create a new group chat
         
+        Members are new users with IDs unique across all groups.
+        
         Args:
             title: Group title
             member_count: Number of members to create (default: 3)
+            supergroup: Create a supergroup (ID -100...) instead of a basic group
             
         Returns:
             Group chat ID
         """
-        group_id = self.group_id_counter
-        self.group_id_counter -= 1
-        
-        self.groups[group_id] = {
-            "id": group_id,
-            "type": "group",
-            "title": title,
-            "all_members_are_administrators": False
-        }
+        state = self.mock_server.state
+        group_id = state.ids.next_group_id(supergroup)
         
-        # Create members
-        members = []
-        for i in range(member_count):
-            member = {
-                "id": 10000 + i,
-                "is_bot": False,
-                "first_name": f"User{i+1}",
-                "username": f"user{i+1}"
+        if supergroup:
+            chat = {
+                "id": group_id,
+                "type": "supergroup",
+                "title": title
+            }
+        else:
+            chat = {
+                "id": group_id,
+                "type": "group",
+                "title": title,
+                "all_members_are_administrators": False
             }
-            members.append(member)
         
-        self.members[group_id] = members
+        self.groups[group_id] = chat
+        self.members[group_id] = GroupMembers(self.users.create_many(member_count))
         
         return group_id
     
-    def send_group_message(self, group_id: int, text: str, from_user: Optional[Dict] = None) -> Dict[str, Any]:
+    def send_group_message(self, group_id: int, text: str, from_user: Optional[Dict] = None,
+                           **fields: Any) -> Dict[str, Any]:
         """
         Send a message in a group chat
         
@@ -62,6 +159,7 @@ class GroupChatSimulator:
             group_id: Group chat ID
             text: Message text
             from_user: User sending the message (optional, random if not provided)
+            **fields: Extra message fields, e.g. entities or reply_to_message
             
         Returns:
             The created update object
@@ -71,22 +169,23 @@ class GroupChatSimulator:
         
         # Select a random member if user not specified
         if from_user is None:
-            from_user = random.choice(self.members[group_id])
+            from_user = self.members[group_id].sample()
         
         message = {
-            "message_id": self.mock_server._next_message_id(),
+            "message_id": self.mock_server._next_message_id(group_id),
             "from": from_user,
             "chat": self.groups[group_id],
-            "date": int(datetime.now().timestamp()),
+            "date": self.mock_server.clock.timestamp(),
             "text": text
         }
+        message.update(fields)
         
         update = {
             "update_id": self.mock_server._next_update_id(),
             "message": message
         }
         
-        self.mock_server.updates_queue.put(update)
+        self.mock_server.enqueue_update(update)
         self.mock_server.messages_history.append({
             "type": "user",
             "message": message
@@ -107,10 +206,54 @@ class GroupChatSimulator:
             The created update object
         """
         if mention_bot:
-            command = f"{command}@mock_bot"
+            command = f"{command}@{self.mock_server.settings.bot.username}"
         
         return self.send_group_message(group_id, command)
     
+    def simulate_chatter(self, group_id: int, rate: float, duration: Optional[float] = None,
+                         count: Optional[int] = None, mix: Optional[Dict[str, float]] = None,
+                         zipf_exponent: float = 1.1, seed: Optional[int] = None,
+                         background: bool = True) -> GroupChatter:
+        """
+        Generate realistic group traffic at a target rate
+        
+        Senders are picked by Zipf rank, so a few members write most
+        messages. The mix covers messages, replies to recent messages,
+        mentions, commands and members joining or leaving. Background
+        chatters of all groups share one scheduler thread.
+        
+        Args:
+            group_id: Group chat ID
+            rate: Target events per second
+            duration: Stop after this many seconds (default: until stopped)
+            count: Stop after this many events (default: until stopped)
+            mix: Relative weights of 'message', 'reply', 'mention', 'command',
+                'join' and 'leave' events
+            zipf_exponent: Skew of sender activity (default: 1.1)
+            seed: Seed for reproducible traffic
+            background: Run on the scheduler thread and return at once (True)
+                or block until done (False)
+            
+        Returns:
+            The chatter; use stop(), wait() and stats() to control it
+        """
+        chatter = GroupChatter(self, group_id, rate, duration=duration, count=count, mix=mix,
+                               zipf_exponent=zipf_exponent, seed=seed)
+        if background:
+            ChatterScheduler.shared().add(chatter)
+        else:
+            chatter.run()
+        return chatter
+    
+    async def simulate_chatter_async(self, group_id: int, rate: float, duration: Optional[float] = None,
+                                     count: Optional[int] = None, mix: Optional[Dict[str, float]] = None,
+                                     zipf_exponent: float = 1.1, seed: Optional[int] = None) -> GroupChatter:
+        """Coroutine variant of simulate_chatter() that runs on the current event loop"""
+        chatter = GroupChatter(self, group_id, rate, duration=duration, count=count, mix=mix,
+                               zipf_exponent=zipf_exponent, seed=seed)
+        await chatter.run_async()
+        return chatter
+    
     def add_member(self, group_id: int, user: Dict[str, Any]) -> bool:
         """
         Add a member to a group
@@ -120,16 +263,25 @@ class GroupChatSimulator:
             user: User information dict
             
         Returns:
-            True if successful
+            True if added, False if the group does not exist or the user is
+            already a member
         """
         if group_id not in self.groups:
             return False
         
         if group_id not in self.members:
-            self.members[group_id] = []
+            self.members[group_id] = GroupMembers()
         
-        self.members[group_id].append(user)
-        return True
+        return self.members[group_id].add(self.users.register(user))
+    
+    def add_members(self, group_id: int, users: Iterable[Dict[str, Any]]) -> int:
+        """
+        Add several members to a group
+        
+        Returns:
+            Number of users added
+        """
+        return sum(1 for user in users if self.add_member(group_id, user))
     
     def remove_member(self, group_id: int, user_id: int) -> bool:
         """
@@ -140,17 +292,44 @@ class GroupChatSimulator:
             user_id: User ID to remove
             
         Returns:
-            True if successful
+            True if the user was a member
         """
         if group_id not in self.members:
             return False
         
-        self.members[group_id] = [m for m in self.members[group_id] if m["id"] != user_id]
-        return True
+        return self.members[group_id].remove(user_id) is not None
+    
+    def is_member(self, group_id: int, user_id: int) -> bool:
+        """Check whether a user is a member of a group"""
+        members = self.members.get(group_id)
+        return members is not None and user_id in members
+    
+    def get_member(self, group_id: int, user_id: int) -> Optional[Dict[str, Any]]:
+        """Look up a group member by user ID"""
+        members = self.members.get(group_id)
+        return members.get(user_id) if members is not None else None
+    
+    def get_member_count(self, group_id: int) -> int:
+        """Number of members of a group"""
+        members = self.members.get(group_id)
+        return len(members) if members is not None else 0
+    
+    def random_member(self, group_id: int, rng: Optional[random.Random] = None) -> Dict[str, Any]:
+        """
+        Pick a uniformly random member in O(1)
+        
+        Args:
+            group_id: Group chat ID
+            rng: Random generator for reproducible picks (optional)
+        """
+        if group_id not in self.members:
+            raise ValueError(f"Group {group_id} does not exist")
+        return self.members[group_id].sample(rng)
     
     def get_group_members(self, group_id: int) -> List[Dict[str, Any]]:
         """Get all members of a group"""
-        return self.members.get(group_id, [])
+        members = self.members.get(group_id)
+        return members.to_list() if members is not None else []
     
     def get_group_info(self, group_id: int) -> Optional[Dict[str, Any]]:
         """Get group information"""
@@ -173,10 +352,10 @@ class GroupChatSimulator:
         self.add_member(group_id, user)
         
         message = {
-            "message_id": self.mock_server._next_message_id(),
+            "message_id": self.mock_server._next_message_id(group_id),
             "from": user,
             "chat": self.groups[group_id],
-            "date": int(datetime.now().timestamp()),
+            "date": self.mock_server.clock.timestamp(),
             "new_chat_members": [user]
         }
         
@@ -185,7 +364,7 @@ class GroupChatSimulator:
             "message": message
         }
         
-        self.mock_server.updates_queue.put(update)
+        self.mock_server.enqueue_update(update)
         
         return update
     
@@ -206,10 +385,10 @@ class GroupChatSimulator:
         self.remove_member(group_id, user["id"])
         
         message = {
-            "message_id": self.mock_server._next_message_id(),
+            "message_id": self.mock_server._next_message_id(group_id),
             "from": user,
             "chat": self.groups[group_id],
-            "date": int(datetime.now().timestamp()),
+            "date": self.mock_server.clock.timestamp(),
             "left_chat_member": user
         }
         
@@ -218,6 +397,47 @@ class GroupChatSimulator:
             "message": message
         }
         
-        self.mock_server.updates_queue.put(update)
+        self.mock_server.enqueue_update(update)
         
         return update
+    
+    def upgrade_to_supergroup(self, group_id: int) -> int:
+        """
+        Migrate a basic group to a new supergroup, as Telegram does
+        
+        Members move to the supergroup. A service message with
+        migrate_to_chat_id is sent in the old group and one with
+        migrate_from_chat_id in the new supergroup.
+        
+        Args:
+            group_id: Basic group chat ID
+            
+        Returns:
+            Supergroup chat ID
+        """
+        group = self.groups.get(group_id)
+        if group is None:
+            raise ValueError(f"Group {group_id} does not exist")
+        if group['type'] != 'group':
+            raise ValueError(f"Chat {group_id} is not a basic group")
+        
+        supergroup_id = self.create_group(group['title'], member_count=0, supergroup=True)
+        self.members[supergroup_id] = self.members.pop(group_id, GroupMembers())
+        sender = self.members[supergroup_id].sample() if len(self.members[supergroup_id]) else None
+        
+        for chat_id, field, value in ((group_id, "migrate_to_chat_id", supergroup_id),
+                                      (supergroup_id, "migrate_from_chat_id", group_id)):
+            message = {
+                "message_id": self.mock_server._next_message_id(chat_id),
+                "chat": self.groups[chat_id],
+                "date": self.mock_server.clock.timestamp(),
+                field: value
+            }
+            if sender is not None:
+                message["from"] = sender
+            self.mock_server.enqueue_update({
+                "update_id": self.mock_server._next_update_id(),
+                "message": message
+            })
+        
+        return supergroup_id
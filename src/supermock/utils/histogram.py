@@ -0,0 +1,129 @@
+"""
+Latency histograms for SuperMock
+
+HDR-style histograms: values are counted in log-linear buckets whose width
+grows with magnitude, so recording is O(1), memory stays small however many
+values are recorded, and every percentile is accurate to a fixed number of
+significant digits.
+"""
+
+import math
+from typing import Dict, Any, List, Optional
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of pre-sorted values (0.0 if there are none)"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class LatencyHistogram:
+    """Log-linear histogram of durations with microsecond resolution"""
+
+    __slots__ = ('sub_bucket_bits', 'sub_bucket_half', 'counts', 'count', 'total', 'min', 'max')
+
+    def __init__(self, significant_digits: int = 2):
+        """
+        Args:
+            significant_digits: Decimal digits of precision kept for every
+                value (2 means percentiles are within 1%)
+        """
+        if not 1 <= significant_digits <= 5:
+            raise ValueError("significant_digits must be between 1 and 5")
+        self.sub_bucket_bits = math.ceil(math.log2(2 * 10 ** significant_digits))
+        self.sub_bucket_half = 1 << (self.sub_bucket_bits - 1)
+        # Sparse bucket index -> count
+        self.counts: Dict[int, int] = {}
+        self.count = 0
+        self.total = 0
+        self.min: Optional[int] = None
+        self.max = 0
+
+    def record(self, seconds: float):
+        """Count a duration (negative durations count as zero)"""
+        value = int(seconds * 1_000_000) if seconds > 0 else 0
+        index = self._index(value)
+        counts = self.counts
+        counts[index] = counts.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def _index(self, value: int) -> int:
+        """Bucket index of a value in microseconds"""
+        shift = value.bit_length() - self.sub_bucket_bits
+        if shift <= 0:
+            return value
+        return (1 << self.sub_bucket_bits) + (shift - 1) * self.sub_bucket_half + (value >> shift) - self.sub_bucket_half
+
+    def _highest_equivalent(self, index: int) -> int:
+        """Largest value in microseconds that falls into a bucket"""
+        first = 1 << self.sub_bucket_bits
+        if index < first:
+            return index
+        shift = (index - first) // self.sub_bucket_half + 1
+        sub_bucket = (index - first) % self.sub_bucket_half + self.sub_bucket_half
+        return ((sub_bucket + 1) << shift) - 1
+
+    def percentile(self, fraction: float) -> float:
+        """
+        Nearest-rank percentile in milliseconds
+
+        Args:
+            fraction: Percentile as a fraction, e.g. 0.99
+
+        Returns:
+            The value at that rank, or 0.0 if nothing was recorded
+        """
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(fraction * self.count))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(self._highest_equivalent(index), self.max) / 1000
+        return self.max / 1000
+
+    def merge(self, other: 'LatencyHistogram'):
+        """Add another histogram's counts (both must use the same precision)"""
+        if other.sub_bucket_bits != self.sub_bucket_bits:
+            raise ValueError("Cannot merge histograms of different precision")
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.count += other.count
+        self.total += other.total
+        if other.min is not None and (self.min is None or other.min < self.min):
+            self.min = other.min
+        if other.max > self.max:
+            self.max = other.max
+
+    def copy(self) -> 'LatencyHistogram':
+        """Independent copy of the histogram"""
+        histogram = LatencyHistogram.__new__(LatencyHistogram)
+        histogram.sub_bucket_bits = self.sub_bucket_bits
+        histogram.sub_bucket_half = self.sub_bucket_half
+        histogram.counts = dict(self.counts)
+        histogram.count = self.count
+        histogram.total = self.total
+        histogram.min = self.min
+        histogram.max = self.max
+        return histogram
+
+    def summary(self) -> Dict[str, Any]:
+        """Count, mean, extremes and common percentiles in milliseconds"""
+        return {
+            "count": self.count,
+            "mean": round(self.total / self.count / 1000, 3) if self.count else 0.0,
+            "min": round((self.min or 0) / 1000, 3),
+            "p50": round(self.percentile(0.50), 3),
+            "p90": round(self.percentile(0.90), 3),
+            "p99": round(self.percentile(0.99), 3),
+            "p999": round(self.percentile(0.999), 3),
+            "max": round(self.max / 1000, 3)
+        }
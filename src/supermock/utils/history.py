@@ -3,21 +3,24 @@ History persistence for SuperMock
 """
 
 import json
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from pathlib import Path
 from datetime import datetime
 
+from .clock import Clock
+
 
 class HistoryManager:
     """Manager for saving and loading conversation history"""
     
-    def __init__(self, history_file: str = ".supermock_history.json"):
+    def __init__(self, history_file: str = ".supermock_history.json", clock: Optional[Clock] = None):
         self.history_file = Path(history_file)
+        self.clock = clock or Clock()
     
     def save_history(self, messages: List[Dict[str, Any]]):
         """Save messages history to file"""
         history_data = {
-            "saved_at": datetime.now().isoformat(),
+            "saved_at": self.clock.now().isoformat(),
             "messages": messages
         }
         
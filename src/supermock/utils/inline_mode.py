@@ -5,7 +5,9 @@ Allows testing bots with inline queries (when users type @botname in any chat).
 """
 
 from typing import Dict, List, Any, Optional
-from datetime import datetime
+import random
+import threading
+import time
 import uuid
 
 
@@ -14,7 +16,11 @@ class InlineModeSimulator:
     
     def __init__(self, mock_server):
         self.mock_server = mock_server
-        self.inline_results_cache: Dict[str, List[Dict[str, Any]]] = {}
+    
+    @property
+    def inline_results_cache(self):
+        """Inline results cache of the server's current state"""
+        return self.mock_server.state.inline_cache
     
     def send_inline_query(self, query: str, from_user: Optional[Dict] = None, offset: str = "") -> Dict[str, Any]:
         """
@@ -32,8 +38,8 @@ class InlineModeSimulator:
             from_user = {
                 "id": self.mock_server.chat_id,
                 "is_bot": False,
-                "first_name": "TestUser",
-                "username": "test_user"
+                "first_name": self.mock_server.settings.user.first_name,
+                "username": self.mock_server.settings.user.username
             }
         
         inline_query = {
@@ -49,10 +55,172 @@ class InlineModeSimulator:
             "inline_query": inline_query
         }
         
-        self.mock_server.updates_queue.put(update)
+        self.inline_results_cache.record_query(inline_query["id"], from_user.get("id"), query, offset)
+        self.mock_server.enqueue_update(update)
         
         return update
     
+    def request_results(self, query: str, from_user: Optional[Dict] = None, offset: str = "",
+                        timeout: float = 5.0) -> Dict[str, Any]:
+        """
+        Get results for a query the way a Telegram client does
+        
+        A cached answer is returned without sending anything to the bot;
+        otherwise the query is sent and the bot's answer awaited.
+        
+        Args:
+            query: The query text
+            from_user: User information (optional)
+            offset: Pagination offset (optional)
+            timeout: Seconds to wait for answerInlineQuery
+            
+        Returns:
+            {"query", "offset", "query_id", "results", "next_offset",
+            "is_personal", "cached"}
+            
+        Raises:
+            TimeoutError: If the bot does not answer in time
+            LookupError: If the answer was evicted or the server reset
+                before it could be read
+        """
+        user_id = from_user.get("id") if from_user else self.mock_server.chat_id
+        answer = self.inline_results_cache.lookup(user_id, query, offset)
+        if answer is not None:
+            return {"query": query, "offset": offset, **answer.to_dict(cached=True)}
+        
+        # Search from before the query, so the answer is found even if other
+        # updates are injected or other callers wait meanwhile
+        since = self.mock_server.state.calls.seq
+        update = self.send_inline_query(query, from_user, offset)
+        query_id = update["inline_query"]["id"]
+        self.mock_server.wait_for_call(
+            'answerInlineQuery',
+            predicate=lambda call: str(call['params'].get('inline_query_id')) == query_id,
+            timeout=timeout,
+            since=since
+        )
+        answer = self.inline_results_cache.answer(query_id)
+        if answer is None:
+            raise LookupError(f"Answer to inline query {query_id} is no longer cached")
+        return {"query": query, "offset": offset, **answer.to_dict()}
+    
+    def next_page(self, answer: Dict[str, Any], from_user: Optional[Dict] = None,
+                  timeout: float = 5.0) -> Optional[Dict[str, Any]]:
+        """
+        Get the page after an answer from request_results()
+        
+        Returns:
+            The next page, or None if the bot sent no next_offset
+        """
+        if not answer.get("next_offset"):
+            return None
+        return self.request_results(answer["query"], from_user, answer["next_offset"], timeout)
+    
+    def cache_stats(self) -> Dict[str, Any]:
+        """Inline results cache hits, misses and hit ratio"""
+        return self.inline_results_cache.report()
+    
+    def simulate_typing(self, text: str, from_user: Optional[Dict] = None, cps: float = 8.0,
+                        jitter: float = 0.3, use_cache: bool = True, timeout: float = 5.0,
+                        seed: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Type a query one keystroke at a time, like a user in a Telegram client
+        
+        Every keystroke sends the current prefix as a new inline query (or
+        is served from the inline cache), and only the answer to the latest
+        query can be shown. Answers to a query that arrive after the next
+        keystroke are late: the bot did the work, but the user never saw it.
+        
+        Args:
+            text: Final query text
+            from_user: User information (optional)
+            cps: Keystrokes per second
+            jitter: Random spread of keystroke gaps, as a fraction of 1/cps
+            use_cache: Serve prefixes from the inline cache when possible
+            timeout: Seconds to wait for outstanding answers after the last keystroke
+            seed: Seed for reproducible keystroke timing
+            
+        Returns:
+            {"keystrokes", "queries_sent", "cache_hits", "answered", "shown",
+            "late", "unanswered", "wasted_ratio", "typing_ms",
+            "time_to_final_answer_ms", "queries": per-keystroke details};
+            the final query is "final" once answered and counts as shown,
+            and time_to_final_answer_ms is measured from the last keystroke
+        """
+        if cps <= 0:
+            raise ValueError("cps must be positive")
+        if not text:
+            raise ValueError("text must not be empty")
+        
+        rng = random.Random(seed)
+        user_id = from_user.get("id") if from_user else self.mock_server.chat_id
+        recorder = _TypingRecorder()
+        self.mock_server.add_recorder(recorder)
+        try:
+            started = time.perf_counter()
+            keystrokes = []
+            for length in range(1, len(text) + 1):
+                if length > 1:
+                    gap = (1.0 + rng.uniform(-jitter, jitter)) / cps
+                    time.sleep(max(0.0, gap))
+                prefix = text[:length]
+                now = time.perf_counter()
+                answer = self.inline_results_cache.lookup(user_id, prefix, "") if use_cache else None
+                if answer is not None:
+                    keystrokes.append({"query": prefix, "query_id": None, "sent_at": now, "cached": True})
+                    continue
+                update = self.send_inline_query(prefix, from_user)
+                query_id = update["inline_query"]["id"]
+                recorder.track(query_id)
+                keystrokes.append({"query": prefix, "query_id": query_id, "sent_at": now, "cached": False})
+            recorder.wait_all(timeout)
+        finally:
+            self.mock_server.remove_recorder(recorder)
+        
+        answered_at = recorder.snapshot()
+        queries = []
+        counts = {"shown": 0, "late": 0, "unanswered": 0}
+        for index, keystroke in enumerate(keystrokes):
+            final = index == len(keystrokes) - 1
+            superseded_at = None if final else keystrokes[index + 1]["sent_at"]
+            answered = keystroke["sent_at"] if keystroke["cached"] else answered_at.get(keystroke["query_id"])
+            if keystroke["cached"]:
+                status = "final" if final else "cached"
+            elif answered is None:
+                status = "unanswered"
+            elif final:
+                status = "final"
+            elif answered <= superseded_at:
+                status = "shown"
+            else:
+                status = "late"
+            if not keystroke["cached"]:
+                counts["shown" if status == "final" else status] += 1
+            queries.append({
+                "query": keystroke["query"],
+                "query_id": keystroke["query_id"],
+                "status": status,
+                "sent_ms": round((keystroke["sent_at"] - started) * 1000, 3),
+                "answer_ms": round((answered - keystroke["sent_at"]) * 1000, 3) if answered is not None else None
+            })
+        
+        sent = sum(1 for keystroke in keystrokes if not keystroke["cached"])
+        answered_count = counts["shown"] + counts["late"]
+        final = queries[-1]
+        return {
+            "keystrokes": len(keystrokes),
+            "queries_sent": sent,
+            "cache_hits": len(keystrokes) - sent,
+            "answered": answered_count,
+            "shown": counts["shown"],
+            "late": counts["late"],
+            "unanswered": counts["unanswered"],
+            "wasted_ratio": round(counts["late"] / answered_count, 4) if answered_count else 0.0,
+            "typing_ms": final["sent_ms"],
+            "time_to_final_answer_ms": final["answer_ms"],
+            "queries": queries
+        }
+    
     def send_chosen_inline_result(self, result_id: str, query: str, from_user: Optional[Dict] = None) -> Dict[str, Any]:
         """
         Simulate user choosing an inline result
@@ -69,8 +237,8 @@ class InlineModeSimulator:
             from_user = {
                 "id": self.mock_server.chat_id,
                 "is_bot": False,
-                "first_name": "TestUser",
-                "username": "test_user"
+                "first_name": self.mock_server.settings.user.first_name,
+                "username": self.mock_server.settings.user.username
             }
         
         chosen_result = {
@@ -85,7 +253,7 @@ class InlineModeSimulator:
             "chosen_inline_result": chosen_result
         }
         
-        self.mock_server.updates_queue.put(update)
+        self.mock_server.enqueue_update(update)
         
         return update
     
@@ -97,12 +265,51 @@ class InlineModeSimulator:
             query_id: The inline query ID
             results: List of inline results
         """
-        self.inline_results_cache[query_id] = results
+        self.inline_results_cache.store(query_id, results)
     
     def get_cached_results(self, query_id: str) -> Optional[List[Dict[str, Any]]]:
         """Get cached inline results for a query"""
-        return self.inline_results_cache.get(query_id)
+        return self.inline_results_cache.results(query_id)
     
     def clear_cache(self):
         """Clear all cached inline results"""
         self.inline_results_cache.clear()
+
+
+class _TypingRecorder:
+    """Server recorder that timestamps answerInlineQuery calls for tracked queries"""
+    
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.pending = set()
+        self.answered_at: Dict[str, float] = {}
+    
+    def track(self, query_id: str):
+        with self.condition:
+            if query_id not in self.answered_at:
+                self.pending.add(query_id)
+    
+    def on_update(self, update: Dict[str, Any]):
+        """Recorder hook; queries are tracked by simulate_typing()"""
+    
+    def on_call(self, call: Dict[str, Any]):
+        if call['method'] != 'answerInlineQuery':
+            return
+        now = time.perf_counter()
+        query_id = str((call.get('params') or {}).get('inline_query_id'))
+        with self.condition:
+            # A fast bot can answer before the query is tracked
+            self.answered_at.setdefault(query_id, now)
+            if query_id in self.pending:
+                self.pending.discard(query_id)
+                if not self.pending:
+                    self.condition.notify_all()
+    
+    def wait_all(self, timeout: float) -> bool:
+        """Wait until every tracked query is answered; returns False on timeout"""
+        with self.condition:
+            return self.condition.wait_for(lambda: not self.pending, timeout)
+    
+    def snapshot(self) -> Dict[str, float]:
+        with self.condition:
+            return dict(self.answered_at)
@@ -0,0 +1,154 @@
+"""
+Latency and jitter injection for SuperMock
+
+Adds artificial per-method (and optionally per-bot) delays to Bot API calls so
+timeouts and concurrency settings can be tuned against realistic latencies.
+"""
+
+import json
+import math
+import random
+import threading
+from pathlib import Path
+from typing import Dict, List, Any, Optional, Tuple
+
+
+class LatencyModel:
+    """Distribution of artificial delays, in milliseconds"""
+
+    KINDS = ('fixed', 'uniform', 'lognormal', 'replay')
+
+    def __init__(self, kind: str = 'fixed', ms: float = 0.0, min_ms: float = 0.0, max_ms: float = 0.0,
+                 median_ms: float = 0.0, sigma: float = 0.5, samples: Optional[List[float]] = None):
+        if kind not in self.KINDS:
+            raise ValueError(f"Unsupported latency model: {kind}")
+        if kind == 'uniform' and min_ms > max_ms:
+            raise ValueError("Uniform latency needs min_ms <= max_ms")
+        if kind == 'lognormal' and median_ms <= 0:
+            raise ValueError("Lognormal latency needs a positive median_ms")
+        if kind == 'replay' and not samples:
+            raise ValueError("Replayed latency needs at least one sample")
+
+        self.kind = kind
+        self.ms = float(ms)
+        self.min_ms = float(min_ms)
+        self.max_ms = float(max_ms)
+        self.median_ms = float(median_ms)
+        self.sigma = float(sigma)
+        self.samples = [float(s) for s in samples] if samples else []
+
+    @classmethod
+    def from_spec(cls, spec: Dict[str, Any]) -> 'LatencyModel':
+        """
+        Build a model from a dict spec
+
+        A 'file' key on replay specs loads samples from a JSON list or a text
+        file with one millisecond value per line.
+        """
+        spec = dict(spec)
+        if spec.get('kind') == 'replay' and 'file' in spec:
+            spec['samples'] = load_samples(spec.pop('file'))
+        return cls(**spec)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Get the model as a dict spec"""
+        if self.kind == 'fixed':
+            return {"kind": "fixed", "ms": self.ms}
+        if self.kind == 'uniform':
+            return {"kind": "uniform", "min_ms": self.min_ms, "max_ms": self.max_ms}
+        if self.kind == 'lognormal':
+            return {"kind": "lognormal", "median_ms": self.median_ms, "sigma": self.sigma}
+        return {"kind": "replay", "samples": len(self.samples)}
+
+    def sample(self, rng: random.Random) -> float:
+        """Draw one delay in seconds"""
+        if self.kind == 'fixed':
+            ms = self.ms
+        elif self.kind == 'uniform':
+            ms = rng.uniform(self.min_ms, self.max_ms)
+        elif self.kind == 'lognormal':
+            ms = rng.lognormvariate(math.log(self.median_ms), self.sigma)
+        else:
+            ms = rng.choice(self.samples)
+        return max(0.0, ms) / 1000.0
+
+
+class LatencyInjector:
+    """Per-method and per-bot artificial latency rules"""
+
+    def __init__(self, seed: Optional[int] = None):
+        self.lock = threading.Lock()
+        self.rng = random.Random(seed)
+        self.rules: Dict[Tuple[Optional[str], str], LatencyModel] = {}
+
+    def set_latency(self, method: str = '*', model: Optional[LatencyModel] = None,
+                    token: Optional[str] = None, **spec):
+        """
+        Set the latency for a Bot API method
+
+        Args:
+            method: Bot API method name, or '*' for all methods
+            model: Latency model (built from **spec if omitted)
+            token: Only apply to this bot token (optional)
+            **spec: LatencyModel arguments, e.g. kind='fixed', ms=300
+        """
+        if model is None:
+            model = LatencyModel.from_spec(spec)
+        with self.lock:
+            self.rules[(token, method)] = model
+
+    def replace_rules(self, rules: List[Tuple[str, Optional[str], LatencyModel]]):
+        """Swap in a new rule set at once, e.g. on a config reload"""
+        new_rules = {(token, method): model for method, token, model in rules}
+        with self.lock:
+            self.rules = new_rules
+
+    def clear(self, method: Optional[str] = None, token: Optional[str] = None):
+        """Remove one rule, or all rules if no method is given"""
+        with self.lock:
+            if method is None:
+                self.rules.clear()
+            else:
+                self.rules.pop((token, method), None)
+
+    def seed(self, seed: Optional[int]):
+        """Reseed the delay generator"""
+        with self.lock:
+            self.rng.seed(seed)
+
+    def delay_for(self, method: str, token: Optional[str] = None) -> float:
+        """
+        Draw the delay for one call
+
+        Rules are matched from the most to the least specific: bot and method,
+        bot, method, then the '*' default.
+
+        Returns:
+            Delay in seconds (0 if no rule matches)
+        """
+        rules = self.rules
+        if not rules:
+            return 0.0
+
+        model = (rules.get((token, method)) or rules.get((token, '*'))
+                 or rules.get((None, method)) or rules.get((None, '*')))
+        if model is None:
+            return 0.0
+        with self.lock:
+            return model.sample(self.rng)
+
+    def describe(self) -> List[Dict[str, Any]]:
+        """List the configured rules"""
+        with self.lock:
+            return [
+                dict(model.to_dict(), method=method, token=token)
+                for (token, method), model in self.rules.items()
+            ]
+
+
+def load_samples(sample_file: str) -> List[float]:
+    """Load recorded latencies (ms) from a JSON list or one value per line"""
+    text = Path(sample_file).read_text()
+    if text.lstrip().startswith('['):
+        return [float(v) for v in json.loads(text)]
+    return [float(line) for line in text.split() if line]
@@ -1,55 +1,283 @@
 """
 Logging utilities for SuperMock
+
+With asynchronous=True, records go through a bounded queue to a background
+listener thread that does the formatting and I/O, so a slow terminal or disk
+never holds up request handling. When the queue is full, records are dropped
+and counted instead of blocking. Per-method sampling and level overrides
+thin out high-rate records (e.g. getUpdates) before they are queued.
 """
 
+import itertools
+import json
 import logging
+import logging.handlers
+import queue
 import sys
-from typing import Optional
+import threading
+from datetime import datetime, timezone
+from typing import Dict, Any, Optional, TextIO
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message and the record's fields"""
+    
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+        fields = getattr(record, 'fields', None)
+        if fields:
+            entry.update(fields)
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Classic text lines with the record's fields appended as key=value"""
+    
+    def __init__(self):
+        super().__init__('%(asctime)s - %(name)s - %(levelname)s - %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
+    
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = getattr(record, 'fields', None)
+        if fields:
+            line += ' ' + ' '.join(f"{key}={value}" for key, value in fields.items())
+        return line
+
+
+class MethodFilter(logging.Filter):
+    """
+    Per-method level overrides and 1-in-N sampling
+    
+    The method is taken from the record's "method" field; records without
+    one use the '*' entries.
+    """
+    
+    def __init__(self, sample: Optional[Dict[str, int]] = None, levels: Optional[Dict[str, str]] = None,
+                 counters: Optional[Dict[str, int]] = None, lock: Optional[threading.Lock] = None):
+        """
+        Args:
+            sample: Keep 1 in N records per method
+            levels: Minimum level (name or number) per method
+            counters: Dict whose "filtered" count is increased
+            lock: Lock guarding counters (shared with other users of the dict)
+            
+        Raises:
+            ValueError: For an unknown level name
+        """
+        super().__init__()
+        self.sample = {method: int(every) for method, every in (sample or {}).items() if int(every) > 1}
+        self.levels = {method: level_number(level) for method, level in (levels or {}).items()}
+        self.sequences: Dict[str, Any] = {}
+        self.lock = lock or threading.Lock()
+        self.counters = counters if counters is not None else {"filtered": 0}
+    
+    def filter(self, record: logging.LogRecord) -> bool:
+        fields = getattr(record, 'fields', None)
+        method = fields.get('method', '*') if fields else '*'
+        
+        level = self.levels.get(method, self.levels.get('*'))
+        if level is not None and record.levelno < level:
+            with self.lock:
+                self.counters["filtered"] += 1
+            return False
+        
+        every = self.sample.get(method, self.sample.get('*'))
+        if every is None:
+            return True
+        sequence = self.sequences.get(method)
+        if sequence is None:
+            with self.lock:
+                sequence = self.sequences.setdefault(method, itertools.count())
+        if next(sequence) % every:
+            with self.lock:
+                self.counters["filtered"] += 1
+            return False
+        return True
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops and counts records when the queue is full"""
+    
+    def __init__(self, log_queue: queue.Queue, counters: Dict[str, int], lock: threading.Lock):
+        super().__init__(log_queue)
+        self.counters = counters
+        self.counters_lock = lock
+    
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            counter = "dropped"
+        else:
+            counter = "queued"
+        with self.counters_lock:
+            self.counters[counter] += 1
+
+
+class DrainingQueueListener(logging.handlers.QueueListener):
+    """QueueListener whose stop() waits for room in a full queue instead of failing"""
+    
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)
 
 
 class Logger:
     """Logger for SuperMock"""
     
-    def __init__(self, name: str = "supermock", level: str = "INFO", log_file: Optional[str] = None):
+    def __init__(self, name: str = "supermock", level: str = "INFO", log_file: Optional[str] = None,
+                 json_format: bool = False, asynchronous: bool = False, queue_size: int = 10000,
+                 sample: Optional[Dict[str, int]] = None, method_levels: Optional[Dict[str, str]] = None,
+                 access_log: bool = False, stream: Optional[TextIO] = None):
+        """
+        Args:
+            name: Logger name
+            level: Minimum level
+            log_file: Also write to this file (optional)
+            json_format: Write JSON lines instead of text
+            asynchronous: Format and write on a background thread
+            queue_size: Records buffered before new ones are dropped (asynchronous only)
+            sample: Keep 1 in N records per method, e.g. {"getUpdates": 100}
+            method_levels: Minimum level per method, e.g. {"getUpdates": "WARNING"}
+            access_log: Log one record per Bot API request via access()
+            stream: Console stream (default: sys.stdout)
+            
+        Raises:
+            ValueError: For an unknown level name
+        """
+        level_no = level_number(level)
         self.logger = logging.getLogger(name)
-        self.logger.setLevel(getattr(logging, level.upper()))
+        self.logger.setLevel(level_no)
+        self.logger.propagate = False
+        self.access_log = access_log
+        # Updated from many request threads
+        self.counters = {"queued": 0, "dropped": 0, "filtered": 0}
+        self.counters_lock = threading.Lock()
+        self.listener: Optional[DrainingQueueListener] = None
         
         # Remove existing handlers
-        self.logger.handlers = []
+        for handler in list(self.logger.handlers):
+            self.logger.removeHandler(handler)
+            _close_handler(handler)
+        self.logger.filters = []
         
         # Console handler
-        console_handler = logging.StreamHandler(sys.stdout)
-        console_handler.setLevel(getattr(logging, level.upper()))
-        formatter = logging.Formatter(
-            '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-            datefmt='%Y-%m-%d %H:%M:%S'
-        )
+        formatter = JsonFormatter() if json_format else TextFormatter()
+        console_handler = logging.StreamHandler(stream or sys.stdout)
+        console_handler.setLevel(level_no)
         console_handler.setFormatter(formatter)
-        self.logger.addHandler(console_handler)
+        handlers = [console_handler]
         
         # File handler (optional)
         if log_file:
             file_handler = logging.FileHandler(log_file)
-            file_handler.setLevel(getattr(logging, level.upper()))
+            file_handler.setLevel(level_no)
             file_handler.setFormatter(formatter)
-            self.logger.addHandler(file_handler)
+            handlers.append(file_handler)
+        
+        if sample or method_levels:
+            self.logger.addFilter(MethodFilter(sample, method_levels, self.counters, self.counters_lock))
+        
+        if asynchronous:
+            self.queue: Optional[queue.Queue] = queue.Queue(queue_size)
+            queue_handler = DroppingQueueHandler(self.queue, self.counters, self.counters_lock)
+            queue_handler.listener_handlers = handlers
+            self.logger.addHandler(queue_handler)
+            self.listener = DrainingQueueListener(self.queue, *handlers, respect_handler_level=True)
+            queue_handler.listener = self.listener
+            self.listener.start()
+        else:
+            self.queue = None
+            for handler in handlers:
+                self.logger.addHandler(handler)
+    
+    @classmethod
+    def from_settings(cls, settings, name: str = "supermock") -> 'Logger':
+        """Create a logger from the logging section of compiled Settings"""
+        logging_settings = settings.logging
+        level = logging_settings.level if logging_settings.enabled else "CRITICAL"
+        return cls(
+            name,
+            level=level,
+            log_file=logging_settings.file,
+            json_format=logging_settings.format == "json",
+            asynchronous=logging_settings.asynchronous,
+            queue_size=logging_settings.queue_size,
+            sample=logging_settings.sample,
+            method_levels=logging_settings.method_levels,
+            access_log=logging_settings.access_log
+        )
     
-    def debug(self, message: str):
+    def log(self, level: int, message: str, **fields: Any):
+        """Log a message with structured fields"""
+        if self.logger.isEnabledFor(level):
+            self.logger.log(level, message, extra={"fields": fields} if fields else None)
+    
+    def debug(self, message: str, **fields: Any):
         """Log debug message"""
-        self.logger.debug(message)
+        self.log(logging.DEBUG, message, **fields)
     
-    def info(self, message: str):
+    def info(self, message: str, **fields: Any):
         """Log info message"""
-        self.logger.info(message)
+        self.log(logging.INFO, message, **fields)
     
-    def warning(self, message: str):
+    def warning(self, message: str, **fields: Any):
         """Log warning message"""
-        self.logger.warning(message)
+        self.log(logging.WARNING, message, **fields)
     
-    def error(self, message: str):
+    def error(self, message: str, **fields: Any):
         """Log error message"""
-        self.logger.error(message)
+        self.log(logging.ERROR, message, **fields)
     
-    def critical(self, message: str):
+    def critical(self, message: str, **fields: Any):
         """Log critical message"""
-        self.logger.critical(message)
+        self.log(logging.CRITICAL, message, **fields)
+    
+    def access(self, method: str, status: int, duration_ms: float, **fields: Any):
+        """Log one Bot API request, if access logging is on"""
+        if self.access_log:
+            self.log(logging.INFO, "request", method=method, status=status,
+                     duration_ms=round(duration_ms, 3), **fields)
+    
+    def stats(self) -> Dict[str, Any]:
+        """Records queued, dropped because the queue was full, and filtered by sampling or level overrides"""
+        with self.counters_lock:
+            stats = dict(self.counters)
+        stats["backlog"] = self.queue.qsize() if self.queue is not None else 0
+        return stats
+    
+    def close(self):
+        """Write out queued records and release the handlers"""
+        for handler in list(self.logger.handlers):
+            self.logger.removeHandler(handler)
+            _close_handler(handler)
+        self.listener = None
+
+
+def level_number(level: Any) -> int:
+    """Numeric logging level of a level name such as "warning", or of a number"""
+    if isinstance(level, str):
+        number = logging.getLevelName(level.upper())
+        if not isinstance(number, int):
+            raise ValueError(f"Unknown log level: {level}")
+        return number
+    return int(level)
+
+
+def _close_handler(handler: logging.Handler):
+    """Close a handler; a queue handler's listener is drained and stopped first (streams stay open)"""
+    listener = getattr(handler, 'listener', None)
+    if listener is not None:
+        handler.listener = None
+        listener.stop()
+    for inner in getattr(handler, 'listener_handlers', ()):
+        inner.close()
+    handler.close()
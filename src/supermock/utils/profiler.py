@@ -0,0 +1,268 @@
+"""
+Request profiling for SuperMock
+
+Sampled cProfile capture across the mock server's request handlers and
+tracemalloc snapshots, so a running server can be profiled without a restart.
+"""
+
+import cProfile
+import io
+import pstats
+import threading
+import tracemalloc
+from pathlib import Path
+from typing import Dict, List, Any, Optional, Tuple
+
+
+# Modules whose allocations are reported separately in memory snapshots
+TRACKED_MODULES = ('mock_server', 'group_chat', 'inline_mode', 'history')
+
+
+class RequestProfiler:
+    """Sampled cProfile capture for the mock server request path"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.active = False
+        self.sample_every = 1
+        self.request_counter = 0
+        self.profiled_requests = 0
+        self.skipped_requests = 0
+        self.stats: Optional[pstats.Stats] = None
+
+    def start(self, sample_every: int = 1):
+        """
+        Start capturing profiles, discarding any previous capture
+
+        Args:
+            sample_every: Profile one request out of every N (default: 1)
+        """
+        with self.lock:
+            self.sample_every = max(1, int(sample_every))
+            self.request_counter = 0
+            self.profiled_requests = 0
+            self.skipped_requests = 0
+            self.stats = None
+            self.active = True
+
+    def stop(self) -> Dict[str, Any]:
+        """Stop capturing profiles, keeping the collected stats for reporting"""
+        with self.lock:
+            self.active = False
+        return self.status()
+
+    def status(self) -> Dict[str, Any]:
+        """Get the current profiler state"""
+        return {
+            "active": self.active,
+            "sample_every": self.sample_every,
+            "requests_seen": self.request_counter,
+            "requests_profiled": self.profiled_requests,
+            "requests_skipped": self.skipped_requests
+        }
+
+    def begin_request(self) -> Optional[cProfile.Profile]:
+        """
+        Start profiling the current request if it is sampled
+
+        Returns:
+            The running profile, or None if this request is not profiled
+        """
+        if not self.active:
+            return None
+
+        with self.lock:
+            self.request_counter += 1
+            if self.request_counter % self.sample_every:
+                return None
+
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Python 3.12+ allows only one active profiler per process, so
+            # concurrent requests are skipped rather than failed
+            with self.lock:
+                self.skipped_requests += 1
+            return None
+        return profile
+
+    def end_request(self, profile: cProfile.Profile):
+        """Stop a request profile and merge it into the collected stats"""
+        profile.disable()
+
+        with self.lock:
+            if self.stats is None:
+                self.stats = pstats.Stats(profile)
+            else:
+                self.stats.add(profile)
+            self.profiled_requests += 1
+
+    def report(self, format: str = 'pstats', sort: str = 'cumulative', limit: int = 50) -> str:
+        """
+        Render the collected profile
+
+        Args:
+            format: 'pstats' for a pstats table or 'collapsed' for
+                flame graph collapsed stacks
+            sort: pstats sort key (pstats format only)
+            limit: Number of rows to print (pstats format only)
+
+        Returns:
+            The report text (empty if nothing was captured)
+
+        Raises:
+            ValueError: For an unknown format or sort key
+        """
+        if format not in ('pstats', 'collapsed'):
+            raise ValueError(f"Unsupported profile format: {format}")
+        if sort not in pstats.Stats.sort_arg_dict_default:
+            raise ValueError(f"Unsupported sort key: {sort}")
+
+        with self.lock:
+            if self.stats is None:
+                return ""
+
+            if format == 'collapsed':
+                stacks = _collapse_stacks(self.stats.stats)
+                return "".join(f"{stack} {value}\n" for stack, value in sorted(stacks.items()))
+            stream = io.StringIO()
+            self.stats.stream = stream
+            self.stats.sort_stats(sort).print_stats(limit)
+            return stream.getvalue()
+
+    def dump(self, output_file: str):
+        """
+        Write the collected profile to a file
+
+        Files ending in .collapsed or .folded get collapsed stacks, anything
+        else gets a binary pstats dump usable with snakeviz or pstats.
+        """
+        if output_file.endswith('.collapsed') or output_file.endswith('.folded'):
+            with open(output_file, 'w') as f:
+                f.write(self.report(format='collapsed'))
+            return
+
+        with self.lock:
+            if self.stats is not None:
+                self.stats.dump_stats(output_file)
+
+    def start_memory_tracing(self, frames: int = 1):
+        """Start tracemalloc if it is not already tracing"""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+
+    def stop_memory_tracing(self):
+        """Stop tracemalloc and free its traces"""
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def memory_snapshot(self, limit: int = 10) -> Dict[str, Any]:
+        """
+        Report top allocation sites grouped by SuperMock module
+
+        Tracing is started on the first call, so the first snapshot is empty.
+
+        Args:
+            limit: Number of allocation sites to report per module
+
+        Returns:
+            Traced memory totals and per-module allocation sites
+        """
+        if not tracemalloc.is_tracing():
+            self.start_memory_tracing()
+            return {"tracing_started": True, "current": 0, "peak": 0, "modules": {}}
+
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+        ))
+        current, peak = tracemalloc.get_traced_memory()
+
+        modules: Dict[str, Dict[str, Any]] = {
+            name: {"size": 0, "count": 0, "top": []}
+            for name in TRACKED_MODULES + ('other',)
+        }
+        for stat in snapshot.statistics('lineno'):
+            frame = stat.traceback[0]
+            group = modules[_module_group(frame.filename)]
+            group["size"] += stat.size
+            group["count"] += stat.count
+            # statistics() is sorted by size, so the first sites are the top ones
+            if len(group["top"]) < limit:
+                group["top"].append({
+                    "file": frame.filename,
+                    "line": frame.lineno,
+                    "size": stat.size,
+                    "count": stat.count
+                })
+
+        return {"tracing_started": False, "current": current, "peak": peak, "modules": modules}
+
+
+def _module_group(filename: str) -> str:
+    """Map an allocation site to its SuperMock module group"""
+    path = Path(filename)
+    if path.stem in TRACKED_MODULES and 'supermock' in path.parts:
+        return path.stem
+    return 'other'
+
+
+def _frame_label(func: Tuple[str, int, str]) -> str:
+    """Format a pstats function key as a flame graph frame"""
+    filename, lineno, name = func
+    if filename == '~':
+        label = name
+    else:
+        label = f"{Path(filename).stem}:{name}:{lineno}"
+    return label.replace(';', ',').replace(' ', '_')
+
+
+def _collapse_stacks(stats: Dict, max_depth: int = 64, max_frames: int = 50000) -> Dict[str, int]:
+    """
+    Rebuild collapsed stacks (microseconds of self time) from pstats data
+
+    pstats only keeps caller/callee edges, so the time of a function is split
+    across its call paths in proportion to the cumulative time of each edge.
+    The number of paths can grow exponentially with the call graph, so
+    branches worth less than a microsecond are skipped and, once max_frames
+    frames have been visited, each remaining callee is reported as a leaf
+    holding its whole share of time.
+    """
+    callees: Dict[Any, List[Tuple[Any, float]]] = {}
+    for func, (_, _, _, _, callers) in stats.items():
+        for caller, edge in callers.items():
+            callees.setdefault(caller, []).append((func, edge[3]))
+
+    stacks: Dict[str, int] = {}
+    budget = max_frames
+
+    def walk(func, path: Tuple[str, ...], seen: frozenset, scale: float):
+        nonlocal budget
+        budget -= 1
+        _, _, tottime, cumtime, _ = stats[func]
+        path = path + (_frame_label(func),)
+        own = int(tottime * scale * 1e6)
+        if own > 0:
+            key = ';'.join(path)
+            stacks[key] = stacks.get(key, 0) + own
+        if len(path) >= max_depth:
+            return
+        for callee, edge_cumtime in callees.get(func, ()):
+            callee_cumtime = stats[callee][3]
+            if callee in seen or callee_cumtime <= 0:
+                continue
+            # Seconds of the callee's time spent below this path
+            share = scale * edge_cumtime
+            if share < 1e-6:
+                continue
+            if budget <= 0:
+                key = ';'.join(path + (_frame_label(callee),))
+                stacks[key] = stacks.get(key, 0) + int(share * 1e6)
+                continue
+            walk(callee, path, seen | {callee}, share / callee_cumtime)
+
+    for func, (_, _, _, _, callers) in stats.items():
+        if not callers:
+            walk(func, (), frozenset((func,)), 1.0)
+
+    return stacks
@@ -0,0 +1,166 @@
+"""
+Telegram rate-limit emulation for SuperMock
+
+Token-bucket limiters that mimic the Bot API flood limits (global, per private
+chat and per group), so bots can exercise their 429 retry_after handling.
+"""
+
+import math
+import threading
+import time
+from typing import Dict, Any, Optional
+
+
+# Bot API methods that count against the flood limits
+RATE_LIMITED_METHODS = frozenset((
+    'sendMessage', 'sendPhoto', 'sendDocument', 'sendVideo', 'sendAudio',
+    'sendVoice', 'sendSticker', 'sendLocation', 'sendPoll'
+))
+
+# Idle buckets are pruned once this many chats are tracked
+MAX_TRACKED_CHATS = 65536
+
+
+class TokenBucket:
+    """Lazily refilled token bucket"""
+
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated')
+
+    def __init__(self, rate: float, capacity: float, now: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+
+    def refill(self, now: float) -> float:
+        """Refill the bucket up to now and return the seconds until a token is available"""
+        tokens = self.tokens + (now - self.updated) * self.rate
+        self.tokens = tokens if tokens < self.capacity else self.capacity
+        self.updated = now
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def is_full(self, now: float) -> bool:
+        """Check whether the bucket would be full at the given time"""
+        return self.tokens + (now - self.updated) * self.rate >= self.capacity
+
+
+class RateLimiter:
+    """Global, per-chat and per-group flood limits keyed by bot token"""
+
+    DEFAULTS = {
+        "global_rate": 30.0,
+        "global_burst": 30,
+        "chat_rate": 1.0,
+        "chat_burst": 1,
+        "group_rate": 20 / 60,
+        "group_burst": 20
+    }
+
+    def __init__(self, enabled: bool = False, **limits):
+        self.lock = threading.Lock()
+        self.enabled = enabled
+        self.limits = dict(self.DEFAULTS)
+        self.global_buckets: Dict[str, TokenBucket] = {}
+        self.chat_buckets: Dict[Any, TokenBucket] = {}
+        self.counters: Dict[str, Dict[str, int]] = {}
+        self.configure(**limits)
+
+    def configure(self, enabled: Optional[bool] = None, **limits):
+        """
+        Update the limiter settings, resetting all buckets
+
+        Args:
+            enabled: Turn rate limiting on or off (unchanged if None)
+            **limits: Any of global_rate, global_burst, chat_rate, chat_burst,
+                group_rate and group_burst (rates are messages per second)
+        """
+        unknown = set(limits) - set(self.DEFAULTS)
+        if unknown:
+            raise ValueError(f"Unknown rate limit settings: {', '.join(sorted(unknown))}")
+
+        for key, value in limits.items():
+            if float(value) <= 0:
+                raise ValueError(f"Rate limit setting {key} must be positive")
+
+        with self.lock:
+            if enabled is not None:
+                self.enabled = bool(enabled)
+            for key, value in limits.items():
+                self.limits[key] = float(value)
+            self.global_buckets.clear()
+            self.chat_buckets.clear()
+
+    def check(self, token: str, chat_id: Any, now: Optional[float] = None) -> int:
+        """
+        Account for one message sent by a bot
+
+        Args:
+            token: Bot token making the call
+            chat_id: Target chat (negative IDs and @usernames are groups)
+            now: Monotonic timestamp (defaults to time.monotonic())
+
+        Returns:
+            0 if the message is allowed, otherwise retry_after in seconds
+        """
+        if now is None:
+            now = time.monotonic()
+        limits = self.limits
+        is_group = isinstance(chat_id, str) or (chat_id is not None and chat_id < 0)
+        scope = "group" if is_group else "chat"
+
+        with self.lock:
+            global_bucket = self.global_buckets.get(token)
+            if global_bucket is None:
+                global_bucket = TokenBucket(limits["global_rate"], limits["global_burst"], now)
+                self.global_buckets[token] = global_bucket
+
+            key = (token, chat_id)
+            chat_bucket = self.chat_buckets.get(key)
+            if chat_bucket is None:
+                if len(self.chat_buckets) >= MAX_TRACKED_CHATS:
+                    self._prune(now)
+                chat_bucket = TokenBucket(limits[scope + "_rate"], limits[scope + "_burst"], now)
+                self.chat_buckets[key] = chat_bucket
+
+            counters = self.counters.get(token)
+            if counters is None:
+                counters = {"requests": 0, "limited": 0, "global": 0, "chat": 0, "group": 0}
+                self.counters[token] = counters
+            counters["requests"] += 1
+
+            global_wait = global_bucket.refill(now)
+            chat_wait = chat_bucket.refill(now)
+            if global_wait or chat_wait:
+                counters["limited"] += 1
+                if global_wait:
+                    counters["global"] += 1
+                if chat_wait:
+                    counters[scope] += 1
+                return max(1, math.ceil(max(global_wait, chat_wait)))
+
+            global_bucket.tokens -= 1
+            chat_bucket.tokens -= 1
+            return 0
+
+    def _prune(self, now: float):
+        """Drop chat buckets that have refilled completely"""
+        for key in [k for k, bucket in self.chat_buckets.items() if bucket.is_full(now)]:
+            del self.chat_buckets[key]
+
+    def stats(self) -> Dict[str, Any]:
+        """Get the limiter settings and per-bot counters"""
+        with self.lock:
+            return {
+                "enabled": self.enabled,
+                "limits": dict(self.limits),
+                "bots": {token: dict(counters) for token, counters in self.counters.items()}
+            }
+
+    def reset(self):
+        """Reset all buckets and counters"""
+        with self.lock:
+            self.global_buckets.clear()
+            self.chat_buckets.clear()
+            self.counters.clear()
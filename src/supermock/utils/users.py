@@ -0,0 +1,209 @@
+"""
+Simulated user registry for SuperMock
+
+Hands out unique user IDs to every simulated user, so members of different
+groups never collide, and looks users up by ID in O(1). Every user has a
+private chat with the bot, derived from the user on lookup.
+
+Users created with default names are not stored one by one: the registry
+keeps the ID ranges they were allocated from and builds a user's object
+when it is looked up, so a population of 100k users costs a few bytes.
+"""
+
+import bisect
+import threading
+from typing import Dict, Iterable, List, Any, Optional, Union
+
+
+# Lowest ID handed out to simulated users
+FIRST_USER_ID = 10000
+
+
+class UserRegistry:
+    """All simulated users of a server, by ID"""
+
+    def __init__(self, first_id: int = FIRST_USER_ID):
+        self.lock = threading.Lock()
+        self.first_id = first_id
+        self.next_id = first_id
+        # Users with their own objects (registered, or created with custom fields)
+        self.users: Dict[int, Dict[str, Any]] = {}
+        # Users created with default names, as ascending [start, stop) ID ranges
+        self.range_starts: List[int] = []
+        self.range_stops: List[int] = []
+        self.generated = 0
+
+    def create(self, first_name: Optional[str] = None, username: Optional[str] = None,
+               **fields: Any) -> Dict[str, Any]:
+        """
+        Create a user with a fresh ID
+
+        Args:
+            first_name: First name (default: "User<n>")
+            username: Username (default: "user<n>")
+            **fields: Extra user fields, e.g. language_code
+
+        Returns:
+            The new user
+        """
+        if first_name is None and username is None and not fields:
+            return self._build(self.create_ids(1)[0])
+        with self.lock:
+            user_id = self._allocate(1)
+            user = self._build(user_id)
+            if first_name:
+                user["first_name"] = first_name
+            if username:
+                user["username"] = username
+            user.update(fields)
+            self.users[user_id] = user
+        return user
+
+    def create_many(self, count: int) -> List[Dict[str, Any]]:
+        """Create count users with consecutive fresh IDs"""
+        return [self._build(user_id) for user_id in self.create_ids(count)]
+
+    def create_ids(self, count: int) -> range:
+        """
+        Create count users with default names without building their objects
+
+        Returns:
+            The new users' IDs
+        """
+        with self.lock:
+            first = self._allocate(count)
+            if self.range_stops and self.range_stops[-1] == first:
+                self.range_stops[-1] = first + count
+            else:
+                self.range_starts.append(first)
+                self.range_stops.append(first + count)
+            self.generated += count
+        return range(first, first + count)
+
+    def register(self, user: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Add an externally built user, keeping later IDs unique
+
+        Returns:
+            The registered user (the existing one if the ID is taken)
+        """
+        with self.lock:
+            existing = self.get(user['id'])
+            if existing is not None:
+                return existing
+            self.users[user['id']] = user
+            if isinstance(user['id'], int) and user['id'] >= self.next_id:
+                self.next_id = user['id'] + 1
+            return user
+
+    def register_many(self, users: Iterable[Dict[str, Any]]):
+        """Register several users"""
+        for user in users:
+            self.register(user)
+
+    def get(self, user_id: int) -> Optional[Dict[str, Any]]:
+        """Look a user up by ID"""
+        user = self.users.get(user_id)
+        if user is None and self._is_generated(user_id):
+            return self._build(user_id)
+        return user
+
+    def private_chat(self, user_id: int) -> Optional[Dict[str, Any]]:
+        """The user's private chat with the bot, or None for an unknown user"""
+        user = self.get(user_id)
+        if user is None:
+            return None
+        chat = {
+            "id": user['id'],
+            "type": "private",
+            "first_name": user.get('first_name', '')
+        }
+        for field in ('last_name', 'username'):
+            if user.get(field):
+                chat[field] = user[field]
+        return chat
+
+    def _is_generated(self, user_id: Any) -> bool:
+        if not isinstance(user_id, int):
+            return False
+        index = bisect.bisect_right(self.range_starts, user_id) - 1
+        return index >= 0 and user_id < self.range_stops[index]
+
+    def _build(self, user_id: int) -> Dict[str, Any]:
+        """Object of a user with default names"""
+        number = user_id - self.first_id + 1
+        return {
+            "id": user_id,
+            "is_bot": False,
+            "first_name": f"User{number}",
+            "username": f"user{number}"
+        }
+
+    def _allocate(self, count: int) -> int:
+        """Reserve count consecutive IDs (caller holds the lock)"""
+        first = self.next_id
+        self.next_id += count
+        return first
+
+    def copy(self) -> 'UserRegistry':
+        """Copy the registry, sharing the user objects"""
+        registry = UserRegistry(self.first_id)
+        with self.lock:
+            registry.next_id = self.next_id
+            registry.users = dict(self.users)
+            registry.range_starts = list(self.range_starts)
+            registry.range_stops = list(self.range_stops)
+            registry.generated = self.generated
+        return registry
+
+    def __len__(self) -> int:
+        return len(self.users) + self.generated
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self.users or self._is_generated(user_id)
+
+
+class SimulatedUser:
+    """
+    Handle of one simulated user with a private chat with the bot
+
+    Handles are two references, so tests can hold one for each of many
+    thousands of users; the user itself lives in the server's registry.
+    """
+
+    __slots__ = ('server', 'id')
+
+    def __init__(self, server, user_id: int):
+        self.server = server
+        self.id = user_id
+
+    @property
+    def user(self) -> Dict[str, Any]:
+        """The user object"""
+        return self.server.state.users.get(self.id)
+
+    @property
+    def chat(self) -> Dict[str, Any]:
+        """The user's private chat with the bot"""
+        return self.server.state.users.private_chat(self.id)
+
+    def send_message(self, text: str) -> Dict[str, Any]:
+        """Send a message to the bot in the private chat; returns the update"""
+        return self.server.send_user_message(text, user=self)
+
+    def press_button(self, data: str, message_id: Optional[int] = None) -> Dict[str, Any]:
+        """Press an inline button (default: on the chat's latest message); returns the update"""
+        return self.server.send_callback_query(data, message_id, user=self)
+
+    def __eq__(self, other: Any) -> bool:
+        return isinstance(other, SimulatedUser) and other.id == self.id and other.server is self.server
+
+    def __hash__(self) -> int:
+        return hash(self.id)
+
+    def __repr__(self) -> str:
+        return f"SimulatedUser({self.id})"
+
+
+# A user given to an injection API: handle, user ID or user object
+UserRef = Union[SimulatedUser, int, Dict[str, Any]]
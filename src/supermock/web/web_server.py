@@ -92,6 +92,7 @@ class WebUIServer:
             messages = self.mock_server.get_messages_history()
             user_messages = [m for m in messages if m['type'] == 'user']
             bot_messages = [m for m in messages if m['type'] == 'bot']
+            response_times = self.mock_server.response_stats()
             
             return jsonify({
                 'success': True,
@@ -100,6 +101,7 @@ class WebUIServer:
                     'user_messages': len(user_messages),
                     'bot_messages': len(bot_messages),
                     'server_uptime': 'N/A',  # TODO: implement
+                    'response_times': response_times,
                     'api_base_url': f"http://{self.mock_server.host}:{self.mock_server.port}"
                 }
             })
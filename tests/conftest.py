@@ -8,3 +8,8 @@ from pathlib import Path
 # Add src to path so we can import supermock
 src_path = Path(__file__).parent.parent / 'src'
 sys.path.insert(0, str(src_path))
+
+from supermock.pytest_plugin import (  # noqa: E402,F401
+    supermock_worker_server, supermock_server, supermock_base_url, supermock_live_url,
+    supermock_session, supermock_groups, supermock_inline
+)
@@ -2,30 +2,54 @@
 Unit tests for group chat and inline mode simulators
 """
 
+import threading
+
 import pytest
-from supermock.api import TelegramMockServer
+from supermock.api import TelegramMockServer, LoadGenerator, Scenario, ScenarioRecorder, ScenarioReplayer, create_session, IN_PROCESS_BASE_URL, diff_sessions, format_diff
 from supermock.utils import GroupChatSimulator, InlineModeSimulator
-import threading
-import time
 
 
 @pytest.fixture
 def mock_server():
     """Create a mock server for testing"""
-    import random
-    port = random.randint(9500, 9999)
-    server = TelegramMockServer(host='localhost', port=port)
-    
-    # Start server in background
-    server_thread = threading.Thread(target=lambda: server.run(debug=False), daemon=True)
-    server_thread.start()
-    time.sleep(1.5)
+    server = TelegramMockServer()
     
     yield server
     
     server.clear_messages()
 
 
+def start_echo_bot(server):
+    """Run a polling bot that echoes messages and answers button presses; returns a stop function"""
+    session = create_session(server)
+    running = threading.Event()
+    running.set()
+    
+    def bot():
+        offset = 0
+        while running.is_set():
+            updates = session.post(f'{IN_PROCESS_BASE_URL}/botTOKEN/getUpdates',
+                                   json={'offset': offset, 'timeout': 0.2}).json()['result']
+            for update in updates:
+                offset = update['update_id'] + 1
+                if 'callback_query' in update:
+                    session.post(f'{IN_PROCESS_BASE_URL}/botTOKEN/answerCallbackQuery',
+                                 json={'callback_query_id': update['callback_query']['id']})
+                    continue
+                message = update['message']
+                session.post(f'{IN_PROCESS_BASE_URL}/botTOKEN/sendMessage',
+                             json={'chat_id': message['chat']['id'], 'text': message['text']})
+    
+    thread = threading.Thread(target=bot)
+    thread.start()
+    
+    def stop():
+        running.clear()
+        thread.join(5)
+    
+    return stop
+
+
 def test_group_chat_creation(mock_server):
     """Test creating a group chat"""
     group_sim = GroupChatSimulator(mock_server)
@@ -81,6 +105,98 @@ def test_add_remove_member(mock_server):
     assert len(group_sim.get_group_members(group_id)) == 2
 
 
+def test_group_membership_is_unique_and_indexed(mock_server):
+    """Test unique member IDs across groups, duplicate-free adds and O(1) lookups"""
+    group_sim = GroupChatSimulator(mock_server)
+    
+    first = group_sim.create_group("First", member_count=3)
+    second = group_sim.create_group("Second", member_count=3)
+    ids = [m['id'] for m in group_sim.get_group_members(first) + group_sim.get_group_members(second)]
+    assert len(set(ids)) == 6
+    assert all(group_sim.users.get(user_id) for user_id in ids)
+    
+    user = group_sim.get_group_members(first)[0]
+    assert group_sim.add_member(first, user) is False
+    assert group_sim.add_member(second, user) is True
+    assert group_sim.get_member_count(second) == 4
+    assert group_sim.is_member(second, user['id'])
+    
+    # Removing from the middle keeps the index consistent
+    middle = group_sim.get_group_members(second)[1]
+    assert group_sim.remove_member(second, middle['id']) is True
+    assert group_sim.remove_member(second, middle['id']) is False
+    for member in group_sim.get_group_members(second):
+        assert group_sim.get_member(second, member['id']) is member
+
+
+def test_supergroup_with_200k_members(mock_server):
+    """Test creating, sampling and migrating to large supergroups"""
+    import random
+    group_sim = GroupChatSimulator(mock_server)
+    
+    supergroup_id = group_sim.create_group("Community", member_count=200000, supergroup=True)
+    assert str(supergroup_id).startswith('-100')
+    assert group_sim.get_group_info(supergroup_id)['type'] == 'supergroup'
+    assert group_sim.get_member_count(supergroup_id) == 200000
+    
+    def picks(seed):
+        rng = random.Random(seed)
+        return [group_sim.random_member(supergroup_id, rng)['id'] for _ in range(5)]
+    
+    assert picks(1) == picks(1)
+    assert all(group_sim.is_member(supergroup_id, user_id) for user_id in picks(2))
+    assert group_sim.send_group_message(supergroup_id, "hi")['message']['chat']['type'] == 'supergroup'
+    
+    group_id = group_sim.create_group("Small Group", member_count=2)
+    new_id = group_sim.upgrade_to_supergroup(group_id)
+    assert group_sim.get_member_count(new_id) == 2
+    assert group_sim.get_member_count(group_id) == 0
+    updates = mock_server.updates_queue.fetch()
+    assert updates[-2]['message']['migrate_to_chat_id'] == new_id
+    assert updates[-1]['message']['migrate_from_chat_id'] == group_id
+
+
+def test_group_chatter_generation(mock_server):
+    """Test seeded, Zipf-skewed chatter in the foreground, background and asyncio"""
+    import asyncio
+    from collections import Counter
+    group_sim = GroupChatSimulator(mock_server)
+    
+    def run(seed):
+        server = TelegramMockServer()
+        sim = GroupChatSimulator(server)
+        group_id = sim.create_group("Chatty", member_count=1000, supergroup=True)
+        chatter = sim.simulate_chatter(group_id, rate=100000, count=2000, seed=seed, background=False)
+        messages = [u['message'] for u in server.updates_queue.fetch(limit=100)]
+        return chatter, [(m['from']['id'], m.get('text')) for m in messages]
+    
+    chatter, messages = run(5)
+    assert chatter.sent == 2000
+    assert sum(chatter.stats()['counts'].values()) == 2000
+    assert all(chatter.counts[kind] > 0 for kind in ('message', 'reply', 'mention', 'command', 'join', 'leave'))
+    assert messages == run(5)[1]
+    
+    # The most active sender writes far more than an average member
+    senders = Counter(user_id for user_id, text in messages if text is not None)
+    assert senders.most_common(1)[0][1] >= 5
+    
+    # Many groups share one background thread and stop promptly
+    groups = [group_sim.create_group(f"Group {i}", member_count=20) for i in range(200)]
+    chatters = [group_sim.simulate_chatter(g, rate=50, seed=i) for i, g in enumerate(groups)]
+    finite = group_sim.simulate_chatter(groups[0], rate=200, count=10, seed=1)
+    assert finite.wait(5)
+    for chatter in chatters:
+        chatter.stop()
+        sent = chatter.sent
+        assert not chatter.running
+        assert chatter.sent == sent
+    
+    async def chat():
+        return await group_sim.simulate_chatter_async(groups[1], rate=1000, count=20, seed=2)
+    
+    assert asyncio.run(chat()).sent == 20
+
+
 def test_user_joined_event(mock_server):
     """Test user joined event"""
     group_sim = GroupChatSimulator(mock_server)
@@ -154,5 +270,340 @@ def test_inline_results_cache(mock_server):
     assert inline_sim.get_cached_results(query_id) is None
 
 
+def test_inline_answers_served_from_cache(mock_server):
+    """Test repeated inline queries are answered from cache, with pagination"""
+    mock_server.clock.freeze()
+    inline_sim = InlineModeSimulator(mock_server)
+    session = create_session(mock_server)
+    running = threading.Event()
+    running.set()
+    
+    def inline_bot():
+        offset = 0
+        while running.is_set():
+            updates = session.post(f'{IN_PROCESS_BASE_URL}/botTOKEN/getUpdates',
+                                   json={'offset': offset, 'timeout': 0.2}).json()['result']
+            for update in updates:
+                offset = update['update_id'] + 1
+                query = update['inline_query']
+                page = int(query['offset'] or 0)
+                session.post(f'{IN_PROCESS_BASE_URL}/botTOKEN/answerInlineQuery', json={
+                    'inline_query_id': query['id'],
+                    'results': [{'type': 'article', 'id': str(page + i), 'title': query['query']} for i in range(2)],
+                    'cache_time': 60,
+                    'is_personal': query['query'] == 'mine',
+                    'next_offset': str(page + 2) if page < 2 else ''
+                })
+    
+    thread = threading.Thread(target=inline_bot)
+    thread.start()
+    try:
+        first = inline_sim.request_results("cats")
+        assert not first['cached']
+        assert [r['id'] for r in first['results']] == ['0', '1']
+    
+        # Same query from another user: shared answer, the bot sees nothing
+        other = {"id": 777, "is_bot": False, "first_name": "Other"}
+        again = inline_sim.request_results("cats", from_user=other)
+        assert again['cached'] and again['query_id'] == first['query_id']
+    
+        second = inline_sim.next_page(first)
+        assert [r['id'] for r in second['results']] == ['2', '3']
+        assert inline_sim.next_page(second) is None
+    
+        # Personal answers are not shared
+        inline_sim.request_results("mine")
+        assert not inline_sim.request_results("mine", from_user=other)['cached']
+        assert inline_sim.request_results("mine")['cached']
+    
+        # Entries expire after cache_time
+        mock_server.clock.advance(61)
+        assert not inline_sim.request_results("cats")['cached']
+    finally:
+        running.clear()
+        thread.join(5)
+    
+    stats = inline_sim.cache_stats()
+    assert stats['answers'] == 5
+    assert stats['hits'] == 2 and stats['misses'] == 5 and stats['expired'] == 1
+
+
+def test_inline_answer_found_after_later_injection(mock_server):
+    """Test that an inline answer is found when another update is injected before the wait starts"""
+    inline_sim = InlineModeSimulator(mock_server)
+    session = create_session(mock_server)
+    enqueue_update = mock_server.enqueue_update
+    
+    def answer_then_inject(update):
+        # The bot answers at once and another driver injects right after
+        enqueue_update(update)
+        if 'inline_query' in update:
+            session.post(f'{IN_PROCESS_BASE_URL}/botTOKEN/answerInlineQuery', json={
+                'inline_query_id': update['inline_query']['id'],
+                'results': [{'type': 'article', 'id': '1', 'title': 'fast'}]
+            })
+            mock_server.send_user_message("unrelated")
+    
+    mock_server.enqueue_update = answer_then_inject
+    try:
+        answer = inline_sim.request_results("quick", timeout=1)
+    finally:
+        del mock_server.enqueue_update
+    assert [r['id'] for r in answer['results']] == ['1']
+
+
+def test_inline_answer_evicted_or_invalid(mock_server):
+    """Test an answer evicted before it is read, and a malformed cache_time"""
+    inline_sim = InlineModeSimulator(mock_server)
+    session = create_session(mock_server)
+    enqueue_update = mock_server.enqueue_update
+    url = f'{IN_PROCESS_BASE_URL}/botTOKEN/answerInlineQuery'
+    
+    def answer_then_evict(update):
+        enqueue_update(update)
+        query_id = update['inline_query']['id']
+        session.post(url, json={'inline_query_id': query_id, 'results': []})
+        inline_sim.inline_results_cache.answers.pop(query_id)
+    
+    mock_server.enqueue_update = answer_then_evict
+    try:
+        with pytest.raises(LookupError):
+            inline_sim.request_results("gone", timeout=1)
+    finally:
+        del mock_server.enqueue_update
+    
+    response = session.post(url, json={'inline_query_id': '1', 'results': [], 'cache_time': 'soon'})
+    assert response.status_code == 400
+    assert response.json()['description'] == "Bad Request: cache_time must be an integer"
+
+
+def test_inline_typing_simulation(mock_server):
+    """Test per-keystroke inline queries, late answers and time to the final answer"""
+    import time
+    inline_sim = InlineModeSimulator(mock_server)
+    session = create_session(mock_server)
+    running = threading.Event()
+    running.set()
+    
+    def slow_inline_bot():
+        offset = 0
+        while running.is_set():
+            updates = session.post(f'{IN_PROCESS_BASE_URL}/botTOKEN/getUpdates',
+                                   json={'offset': offset, 'timeout': 0.2}).json()['result']
+            for update in updates:
+                offset = update['update_id'] + 1
+                time.sleep(0.03)
+                session.post(f'{IN_PROCESS_BASE_URL}/botTOKEN/answerInlineQuery', json={
+                    'inline_query_id': update['inline_query']['id'],
+                    'results': [{'type': 'article', 'id': '1', 'title': update['inline_query']['query']}]
+                })
+    
+    thread = threading.Thread(target=slow_inline_bot)
+    thread.start()
+    try:
+        report = inline_sim.simulate_typing("hello", cps=200, seed=1)
+        assert report['keystrokes'] == report['queries_sent'] == 5
+        assert [q['query'] for q in report['queries']] == ["h", "he", "hel", "hell", "hello"]
+        assert report['late'] >= 1 and report['unanswered'] == 0
+        assert report['shown'] + report['late'] == report['answered'] == 5
+        assert report['queries'][-1]['status'] == 'final'
+        assert report['time_to_final_answer_ms'] > 0
+        
+        # Typing it again is served entirely from the inline cache
+        again = inline_sim.simulate_typing("hello", cps=200)
+        assert again['queries_sent'] == 0 and again['cache_hits'] == 5
+        assert again['time_to_final_answer_ms'] == 0
+    finally:
+        running.clear()
+        thread.join(5)
+
+
+def test_snapshot_restore(mock_server):
+    """Test branching scenarios from a shared snapshot"""
+    group_sim = GroupChatSimulator(mock_server)
+    inline_sim = InlineModeSimulator(mock_server)
+    
+    group_id = group_sim.create_group("Warm Group", member_count=500)
+    group_sim.send_group_message(group_id, "warm-up")
+    inline_sim.cache_inline_results("q1", [{"id": "1"}])
+    snap = mock_server.snapshot()
+    
+    # Branch 1 diverges from the snapshot
+    group_sim.add_member(group_id, {"id": 1, "first_name": "Extra"})
+    group_sim.create_group("Branch Group")
+    mock_server.send_user_message("branch 1")
+    inline_sim.clear_cache()
+    
+    mock_server.restore(snap)
+    assert len(group_sim.get_group_members(group_id)) == 500
+    assert len(group_sim.groups) == 1
+    assert [m['message']['text'] for m in mock_server.get_messages_history()] == ["warm-up"]
+    assert mock_server.updates_queue.qsize() == 1
+    assert inline_sim.get_cached_results("q1") == [{"id": "1"}]
+    
+    # Branch 2 continues with the same IDs branch 1 would have used
+    update = mock_server.send_user_message("branch 2")
+    mock_server.restore(snap)
+    assert mock_server.send_user_message("branch 3")['update_id'] == update['update_id']
+    
+    # Restoring twice never mutates the snapshot
+    mock_server.restore(snap)
+    assert len(mock_server.get_messages_history()) == 1
+
+
+def test_scenario_record_and_replay(mock_server, tmp_path):
+    """Test replaying a recorded scenario faster than real time"""
+    mock_server.clock.use_manual(start=1_700_000_000)
+    with ScenarioRecorder(mock_server) as recorder:
+        for text in ("one", "two", "three"):
+            mock_server.send_user_message(text)
+            mock_server.clock.advance(60)
+    
+    path = tmp_path / "scenario.jsonl"
+    recorder.scenario.save(path)
+    scenario = Scenario.load(path)
+    assert len(scenario.updates) == 3
+    assert scenario.duration == 120
+    
+    # Reset before the bot starts, so it never sees the recording's updates
+    mock_server.reset()
+    stop_bot = start_echo_bot(mock_server)
+    try:
+        replayer = ScenarioReplayer(mock_server, scenario)
+        report = replayer.replay(speed=1200, settle=5)
+        assert report['speed'] == 1200
+        assert report['updates'] == 3
+        assert report['responses'] == 3
+        assert report['response_ms']['max'] >= report['response_ms']['p50'] > 0
+        
+        # Dates follow the recording, not the wall clock
+        user_dates = [m['message']['date'] for m in mock_server.get_messages_history() if m['type'] == 'user']
+        assert user_dates == [1_700_000_000, 1_700_000_060, 1_700_000_120]
+        assert mock_server.clock.mode == 'real'
+        
+        reports = replayer.compare(speeds=[2400, None], settle=5)
+        assert [r['speed'] for r in reports] == [2400, 'max']
+        assert [r['unanswered'] for r in reports] == [0, 0]
+    finally:
+        stop_bot()
+
+
+def test_session_diff(tmp_path):
+    """Test comparing two captured runs with volatile fields normalized and chats aligned"""
+    def run(path, replies, format='jsonl'):
+        server = TelegramMockServer()
+        session = create_session(server)
+        server.capture.start(path=str(path), format=format)
+        for chat_id, text in replies:
+            session.post(f'{IN_PROCESS_BASE_URL}/botTOKEN/getUpdates', json={'timeout': 0})
+            sent = session.post(f'{IN_PROCESS_BASE_URL}/botTOKEN/sendMessage',
+                                json={'chat_id': chat_id, 'text': text}).json()['result']
+            session.post(f'{IN_PROCESS_BASE_URL}/botTOKEN/editMessageText',
+                         json={'chat_id': chat_id, 'message_id': sent['message_id'], 'text': text + '!'})
+        server.capture.stop()
+        session.close()
+    
+    baseline = [(1, 'hi'), (2, 'hello'), (1, 'bye')]
+    run(tmp_path / 'a.jsonl.gz', baseline)
+    # Same behaviour, chats interleaved differently and other message IDs
+    run(tmp_path / 'b.har', [(2, 'hello'), (1, 'hi'), (1, 'bye')], format='har')
+    # An extra reply in chat 1 and a changed text in chat 2
+    run(tmp_path / 'c.jsonl', [(1, 'hi'), (1, 'extra'), (2, 'HELLO'), (1, 'bye')])
+    
+    same = diff_sessions(tmp_path / 'a.jsonl.gz', tmp_path / 'b.har')
+    assert same['identical'] is True
+    assert same['compared'] == 6
+    send = next(row for row in same['methods'] if row['method'] == 'sendMessage')
+    assert (send['baseline'], send['current'], send['delta']) == (3, 3, 0)
+    assert 'delta' in send['latency_ms']
+    
+    report = diff_sessions(tmp_path / 'a.jsonl.gz', tmp_path / 'c.jsonl')
+    assert report['identical'] is False
+    assert report['by_kind'] == {'extra': 2, 'changed': 2}
+    assert report['chats']['differing'] == 2
+    assert sorted(report['chats']['sample']) == [1, 2]
+    changed = [diff for diff in report['diffs'] if diff['kind'] == 'changed']
+    assert {tuple(diff['fields']) for diff in changed} == {('params.text',)}
+    assert all(diff['chat_id'] == 2 for diff in changed)
+    updates = next(row for row in report['methods'] if row['method'] == 'getUpdates')
+    assert updates['delta'] == 1
+    assert 'params.text' in format_diff(report)
+    
+    # In-memory histories compare the same way
+    history = [{"type": "bot", "message": {"message_id": i, "date": i, "chat": {"id": 1}, "text": "x"}}
+               for i in range(3)]
+    shifted = [{"type": "bot", "message": {**entry["message"], "message_id": entry["message"]["message_id"] + 100}}
+               for entry in history]
+    assert diff_sessions(history, shifted)['identical'] is True
+    
+    # Runs that poll a different number of times stay aligned
+    sends = [{"method": "sendMessage", "params": {"chat_id": 1, "text": str(i)}} for i in range(1500)]
+    polls = [{"method": "getUpdates", "params": {}}] * 1500
+    report = diff_sessions(polls + sends, sends, max_pending=100)
+    assert report['identical'] is True
+    assert report['compared'] == 1500
+    polled = [event for send in sends for event in ({"method": "getUpdates", "params": {}},) * 3 + (send,)]
+    assert diff_sessions(sends, polled, max_pending=100)['identical'] is True
+    
+    # Caught-up chats drop their queues; differing chats are counted, with a capped sample
+    many = [{"method": "sendMessage", "params": {"chat_id": i, "text": "x"}} for i in range(500)]
+    changed = [{"method": "sendMessage", "params": {"chat_id": i, "text": "y" if i % 2 else "x"}} for i in range(500)]
+    report = diff_sessions(many, changed, max_diffs=10)
+    assert report['chats']['differing'] == 250
+    assert report['chats']['sample'] == [1, 3, 5, 7, 9, 11, 13, 15, 17, 19]
+    assert [(d['baseline_index'], d['current_index']) for d in report['diffs'][:2]] == [(1, 1), (3, 3)]
+
+
+def test_loadgen_open_loop(mock_server):
+    """Test open-loop load against a bot across private chats and groups"""
+    generator = LoadGenerator(mock_server, users=20, private_chats=10, groups=2, seed=7)
+    assert len(generator.groups) == 2
+    assert all(generator.user_chats[i] for i in range(20))
+    # Load users live in the registry, so the bot can look them up
+    user_id = generator.users[0]['id']
+    assert mock_server.get_chat(user_id)['type'] == 'private'
+    assert mock_server.state.users.get(user_id) == generator.users[0]
+    
+    stop_bot = start_echo_bot(mock_server)
+    try:
+        summary = generator.run(rate=500, events=100, settle=5)
+    finally:
+        stop_bot()
+    
+    assert summary['events'] == 100
+    assert summary['responses'] == 100
+    assert summary['unanswered'] == 0
+    assert summary['achieved_rate'] <= 600
+    assert summary['latency_ms']['max'] >= summary['latency_ms']['p50'] > 0
+    # Events go through the server's injection API, so its own tracking sees them
+    stats = mock_server.response_stats()
+    assert stats['total']['delivery']['count'] == 100
+    assert stats['pending']['undelivered'] == 0
+    messages = [m for m in mock_server.get_messages_history() if m['type'] == 'user']
+    commands = [m['message'] for m in messages if m['message']['text'].startswith('/')]
+    assert messages and all(c['entities'][0]['type'] == 'bot_command' for c in commands)
+
+
+def test_loadgen_closed_loop_and_seed(mock_server):
+    """Test closed-loop load and reproducible traffic"""
+    def texts(seed):
+        server = TelegramMockServer()
+        LoadGenerator(server, users=5, seed=seed).run(events=50, settle=0)
+        return [(m['message']['from']['id'], m['message']['text']) for m in server.get_messages_history()]
+    
+    assert texts(3) == texts(3)
+    assert texts(3) != texts(4)
+    
+    generator = LoadGenerator(mock_server, users=5, mix={'message': 1}, seed=1)
+    stop_bot = start_echo_bot(mock_server)
+    try:
+        summary = generator.run(mode='closed', think_time=0.01, events=30, settle=5)
+    finally:
+        stop_bot()
+    
+    assert summary['mode'] == 'closed'
+    assert summary['responses'] == 30
+
+
 if __name__ == '__main__':
     pytest.main([__file__, '-v'])
@@ -0,0 +1,41 @@
+"""
+Unit tests for the benchmark suite and regression comparison
+"""
+
+import pytest
+from benchmarks.compare import compare_results
+from benchmarks.suite import run_suite
+
+
+def test_run_suite_in_process():
+    """Test a short in-process run of selected benchmarks"""
+    results = run_suite(('inprocess',), iterations=20, only=['get_updates', 'memory'])
+    
+    names = [(r['name'], r['transport']) for r in results['results']]
+    assert ('getUpdates[backlog=100]', 'inprocess') in names
+    assert ('memory per message', 'any') in names
+    assert all(r['ops'] > 0 for r in results['results'])
+    
+    with pytest.raises(ValueError):
+        run_suite(only=['unknown'])
+
+
+def test_compare_flags_regressions():
+    """Test that throughput drops and latency growth beyond the threshold are flagged"""
+    def run(ops_per_s, p99, bytes_per_message):
+        return {"results": [
+            {"name": "sendMessage", "transport": "inprocess", "ops_per_s": ops_per_s,
+             "latency_ms": {"p50": 1.0, "p99": p99}},
+            {"name": "memory per message", "transport": "any", "bytes_per_message": bytes_per_message}
+        ]}
+    
+    rows = compare_results(run(1000, 2.0, 500), run(950, 2.1, 500), threshold=0.10)
+    assert not any(row['regression'] for row in rows)
+    
+    rows = compare_results(run(1000, 2.0, 500), run(800, 3.0, 600), threshold=0.10)
+    flagged = {row['metric'] for row in rows if row['regression']}
+    assert flagged == {'ops_per_s', 'p99_ms', 'bytes_per_message'}
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
@@ -6,23 +6,16 @@ import pytest
 import threading
 import time
 import requests
-from supermock.api import TelegramMockServer
+from supermock.api import TelegramMockServer, create_session, IN_PROCESS_BASE_URL
+
+
+BASE_URL = IN_PROCESS_BASE_URL
 
 
 @pytest.fixture
 def mock_server():
-    """Fixture to create and start a mock server for testing"""
-    # Use a different port for each test to avoid conflicts
-    import random
-    port = random.randint(9000, 9999)
-    server = TelegramMockServer(host='localhost', port=port)
-    
-    # Start server in background thread
-    server_thread = threading.Thread(target=lambda: server.run(debug=False), daemon=True)
-    server_thread.start()
-    
-    # Wait for server to start
-    time.sleep(1.5)
+    """Fixture to create a mock server served in-process"""
+    server = TelegramMockServer()
     
     yield server
     
@@ -30,10 +23,18 @@ def mock_server():
     server.clear_messages()
 
 
-def test_get_me_endpoint(mock_server):
+@pytest.fixture
+def api(mock_server):
+    """requests session routed straight into the mock server"""
+    session = create_session(mock_server)
+    yield session
+    session.close()
+
+
+def test_get_me_endpoint(mock_server, api):
     """Test the /getMe endpoint"""
-    url = f'http://localhost:{mock_server.port}/bot_test_token/getMe'
-    response = requests.get(url)
+    url = f'{BASE_URL}/bot_test_token/getMe'
+    response = api.get(url)
     assert response.status_code == 200
     
     data = response.json()
@@ -43,17 +44,14 @@ def test_get_me_endpoint(mock_server):
     assert data['result']['first_name'] == 'MockBot'
 
 
-def test_get_updates_endpoint(mock_server):
+def test_get_updates_endpoint(mock_server, api):
     """Test the /getUpdates endpoint"""
     # Send a user message first
     mock_server.send_user_message("Test message")
     
-    # Give a moment for the message to be queued
-    time.sleep(0.2)
-    
     # Get updates
-    url = f'http://localhost:{mock_server.port}/bot_test_token/getUpdates'
-    response = requests.post(url, json={'offset': 0, 'timeout': 1})
+    url = f'{BASE_URL}/bot_test_token/getUpdates'
+    response = api.post(url, json={'offset': 0, 'timeout': 1})
     assert response.status_code == 200
     
     data = response.json()
@@ -63,10 +61,10 @@ def test_get_updates_endpoint(mock_server):
     assert isinstance(data['result'], list)
 
 
-def test_send_message_endpoint(mock_server):
+def test_send_message_endpoint(mock_server, api):
     """Test the /sendMessage endpoint"""
-    url = f'http://localhost:{mock_server.port}/bot_test_token/sendMessage'
-    response = requests.post(
+    url = f'{BASE_URL}/bot_test_token/sendMessage'
+    response = api.post(
         url,
         json={
             'chat_id': 12345,
@@ -80,10 +78,10 @@ def test_send_message_endpoint(mock_server):
     assert data['result']['text'] == 'Hello from bot!'
 
 
-def test_set_webhook_endpoint(mock_server):
+def test_set_webhook_endpoint(mock_server, api):
     """Test the /setWebhook endpoint"""
-    url = f'http://localhost:{mock_server.port}/bot_test_token/setWebhook'
-    response = requests.post(
+    url = f'{BASE_URL}/bot_test_token/setWebhook'
+    response = api.post(
         url,
         json={'url': 'https://example.com/webhook'}
     )
@@ -94,10 +92,10 @@ def test_set_webhook_endpoint(mock_server):
     assert data['result'] is True
 
 
-def test_send_photo_endpoint(mock_server):
+def test_send_photo_endpoint(mock_server, api):
     """Test the /sendPhoto endpoint"""
-    url = f'http://localhost:{mock_server.port}/bot_test_token/sendPhoto'
-    response = requests.post(
+    url = f'{BASE_URL}/bot_test_token/sendPhoto'
+    response = api.post(
         url,
         json={
             'chat_id': 12345,
@@ -112,7 +110,7 @@ def test_send_photo_endpoint(mock_server):
     assert 'photo' in data['result']
 
 
-def test_message_history(mock_server):
+def test_message_history(mock_server, api):
     """Test message history tracking"""
     # Initially empty
     assert len(mock_server.get_messages_history()) == 0
@@ -122,15 +120,12 @@ def test_message_history(mock_server):
     assert len(mock_server.get_messages_history()) == 1
     
     # Send bot message via API
-    url = f'http://localhost:{mock_server.port}/bot_test_token/sendMessage'
-    requests.post(
+    url = f'{BASE_URL}/bot_test_token/sendMessage'
+    api.post(
         url,
         json={'chat_id': 12345, 'text': 'Bot response'}
     )
     
-    # Wait a bit for message to be recorded
-    time.sleep(0.2)
-    
     history = mock_server.get_messages_history()
     assert len(history) >= 1  # At least the user message should be there
     assert history[0]['type'] == 'user'
@@ -150,6 +145,90 @@ def test_callback_query_creation(mock_server):
     assert update['callback_query']['message']['message_id'] == 123
 
 
+def test_id_allocation_is_per_chat_and_thread_safe(mock_server, api):
+    """Test per-chat message IDs, separate callback query IDs and concurrent allocation"""
+    url = f'{BASE_URL}/bot_test_token/sendMessage'
+    first = api.post(url, json={'chat_id': 1, 'text': 'a'}).json()['result']
+    other = api.post(url, json={'chat_id': '2', 'text': 'b'}).json()['result']
+    second = api.post(url, json={'chat_id': 1, 'text': 'c'}).json()['result']
+    assert (first['message_id'], other['message_id'], second['message_id']) == (1, 1, 2)
+    
+    mock_server.send_user_message("hello")
+    update = mock_server.send_callback_query("press")
+    assert update['callback_query']['id'] == '1'
+    assert update['callback_query']['message']['message_id'] == 1
+    assert update['update_id'] == 2
+    
+    snap = mock_server.snapshot()
+    update_ids = []
+    message_ids = []
+    
+    def allocate():
+        for _ in range(2000):
+            update_ids.append(mock_server._next_update_id())
+            message_ids.append(mock_server._next_message_id(99))
+    
+    threads = [threading.Thread(target=allocate) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(update_ids) == list(range(3, 16003))
+    assert sorted(message_ids) == list(range(1, 16001))
+    
+    mock_server.restore(snap)
+    assert mock_server.update_id_counter == 3
+    assert mock_server._next_message_id(99) == 1
+    assert mock_server._next_message_id(1) == 3
+
+
+def test_many_private_chats(mock_server, api):
+    """Test 100k users with private chats, getChat/getChatMember and user handles"""
+    users = mock_server.create_users(100_000)
+    registry = mock_server.state.users
+    assert len(registry) == 100_001
+    # Only the default user has a stored object; the rest are ID ranges
+    assert len(registry.users) == 1
+    
+    alice, bob, last = users[0], users[1], users[-1]
+    assert alice.id != mock_server.chat_id
+    first = alice.send_message("hi")['message']
+    assert first['chat'] == alice.chat
+    assert first['from'] == alice.user
+    assert first['message_id'] == 1
+    assert bob.send_message("hello")['message']['message_id'] == 1
+    press = alice.press_button("ok")['callback_query']
+    assert press['from']['id'] == alice.id
+    assert press['message']['message_id'] == 1
+    
+    updates = mock_server.inject_batch([{"text": "batch", "user": last}, {"callback_data": "go", "user": last.id}])
+    assert updates[0]['message']['chat']['id'] == last.id
+    assert updates[1]['callback_query']['message']['message_id'] == updates[0]['message']['message_id']
+    
+    url = f'{BASE_URL}/bot_test_token'
+    chat = api.post(f'{url}/getChat', json={'chat_id': last.id}).json()['result']
+    assert chat == {'id': last.id, 'type': 'private', 'first_name': 'User100000', 'username': 'user100000'}
+    default = api.get(f'{url}/getChat').json()['result']
+    assert default['first_name'] == 'TestUser'
+    assert api.post(f'{url}/getChat', json={'chat_id': 1}).status_code == 400
+    
+    member = api.post(f'{url}/getChatMember', json={'chat_id': bob.id, 'user_id': bob.id}).json()['result']
+    assert (member['user']['id'], member['status']) == (bob.id, 'member')
+    other = api.post(f'{url}/getChatMember', json={'chat_id': bob.id, 'user_id': alice.id}).json()['result']
+    assert other['status'] == 'left'
+    assert api.post(f'{url}/getChatMember', json={'chat_id': bob.id, 'user_id': 1}).status_code == 400
+    
+    created = api.post(f'{BASE_URL}/admin/users', json={'count': 10}).json()['result']
+    assert created['last_id'] - created['first_id'] == 9
+    assert api.get(f'{BASE_URL}/admin/users/{created["last_id"]}').json()['result']['chat']['type'] == 'private'
+    
+    with pytest.raises(ValueError):
+        mock_server.send_user_message("ghost", user=1)
+    
+    mock_server.reset()
+    assert mock_server.get_user(alice.id) is None
+
+
 def test_clear_messages(mock_server):
     """Test clearing message history"""
     mock_server.send_user_message("Message 1")
@@ -162,5 +241,548 @@ def test_clear_messages(mock_server):
     assert len(mock_server.get_messages_history()) == 0
 
 
+def test_profiler_admin_endpoints(mock_server, api):
+    """Test sampled request profiling through the admin API"""
+    
+    # Bad arguments are rejected even before anything is captured
+    response = api.get(f'{BASE_URL}/admin/profile/report', params={'format': 'bogus'})
+    assert response.status_code == 400
+    response = api.get(f'{BASE_URL}/admin/profile/report', params={'sort': 'bogus'})
+    assert response.status_code == 400
+    
+    response = api.post(f'{BASE_URL}/admin/profile/start', json={'sample_every': 2})
+    assert response.json()['result']['active'] is True
+    
+    for _ in range(4):
+        api.get(f'{BASE_URL}/bot_test_token/getMe')
+    
+    status = api.post(f'{BASE_URL}/admin/profile/stop').json()['result']
+    assert status['active'] is False
+    assert status['requests_seen'] == 4
+    assert status['requests_profiled'] + status['requests_skipped'] == 2
+    
+    collapsed = api.get(f'{BASE_URL}/admin/profile/report', params={'format': 'collapsed'}).text
+    assert 'mock_server:get_me' in collapsed
+    
+    table = api.get(f'{BASE_URL}/admin/profile/report', params={'format': 'pstats'}).text
+    assert 'get_me' in table
+    
+    response = api.get(f'{BASE_URL}/admin/profile/report', params={'format': 'svg'})
+    assert response.status_code == 400
+
+
+def test_memory_snapshot_endpoint(mock_server, api):
+    """Test tracemalloc snapshots grouped by module"""
+    
+    try:
+        api.get(f'{BASE_URL}/admin/memory/snapshot')
+        mock_server.send_user_message("Allocate something")
+        
+        result = api.get(f'{BASE_URL}/admin/memory/snapshot', params={'limit': 3}).json()['result']
+        assert result['tracing_started'] is False
+        assert set(result['modules']) == {'mock_server', 'group_chat', 'inline_mode', 'history', 'other'}
+        assert len(result['modules']['other']['top']) <= 3
+    finally:
+        api.post(f'{BASE_URL}/admin/memory/stop')
+
+
+def test_rate_limit_returns_429(mock_server, api):
+    """Test flood limit emulation on sendMessage"""
+    api.post(f'{BASE_URL}/admin/rate-limits', json={'enabled': True, 'chat_rate': 0.5})
+    
+    url = f'{BASE_URL}/bot_test_token/sendMessage'
+    first = api.post(url, json={'chat_id': 12345, 'text': 'one'})
+    second = api.post(url, json={'chat_id': '12345', 'text': 'two'})
+    other_chat = api.post(url, json={'chat_id': 54321, 'text': 'three'})
+    
+    assert first.json()['ok'] is True
+    assert second.status_code == 429
+    assert second.json()['error_code'] == 429
+    assert second.json()['parameters']['retry_after'] == 2
+    assert other_chat.json()['ok'] is True
+    
+    stats = api.get(f'{BASE_URL}/admin/rate-limits').json()['result']
+    assert stats['bots']['_test_token']['chat'] == 1
+    
+    bad = api.post(f'{BASE_URL}/admin/rate-limits', json={'chat_rate': -1})
+    assert bad.status_code == 400
+
+
+def test_latency_injection(mock_server, api):
+    """Test per-method latency configured through the admin API"""
+    api.post(f'{BASE_URL}/admin/latency', json={'method': 'getMe', 'kind': 'fixed', 'ms': 300})
+    
+    started = time.monotonic()
+    api.get(f'{BASE_URL}/bot_test_token/getMe')
+    assert time.monotonic() - started >= 0.3
+    
+    rules = api.post(f'{BASE_URL}/admin/latency/clear').json()['result']
+    assert rules == []
+    
+    bad = api.post(f'{BASE_URL}/admin/latency', json={'kind': 'lognormal', 'median_ms': 0})
+    assert bad.status_code == 400
+    
+    from_file = api.post(f'{BASE_URL}/admin/latency', json={'kind': 'replay', 'file': '/etc/hostname'})
+    assert from_file.status_code == 400
+    assert 'samples' in from_file.json()['description']
+    
+    replay = api.post(f'{BASE_URL}/admin/latency', json={'kind': 'replay', 'samples': [1, 2]})
+    assert replay.json()['result'][0]['samples'] == 2
+    api.post(f'{BASE_URL}/admin/latency/clear')
+
+
+def test_traffic_capture(mock_server, api, tmp_path):
+    """Test capturing filtered traffic to a compressed file and reading it through the admin API"""
+    import gzip
+    import json
+    
+    path = tmp_path / 'capture.jsonl.gz'
+    refused = api.post(f'{BASE_URL}/admin/capture/start', json={'path': str(path)})
+    assert refused.status_code == 400
+    assert not path.exists()
+    
+    status = mock_server.capture.start(path=str(path), methods=['sendMessage', 'sendDocument'], chats=[12345])
+    assert status['active'] is True
+    
+    api.post(f'{BASE_URL}/bot_test_token/sendMessage', json={'chat_id': 12345, 'text': 'one'})
+    api.post(f'{BASE_URL}/bot_test_token/sendMessage', json={'chat_id': 54321, 'text': 'other chat'})
+    api.get(f'{BASE_URL}/bot_test_token/getMe')
+    api.post(f'{BASE_URL}/bot_test_token/sendDocument', data={'chat_id': '12345'},
+             files={'document': ('report.txt', b'hello')})
+    
+    entries = api.get(f'{BASE_URL}/admin/capture/entries', params={'chat_id': 12345}).json()['result']
+    assert [entry['method'] for entry in entries] == ['sendMessage', 'sendDocument']
+    assert entries[0]['params']['text'] == 'one'
+    assert entries[0]['response']['ok'] is True
+    assert entries[0]['duration_ms'] >= 0
+    upload, = entries[1]['uploads']
+    assert (upload['field'], upload['filename'], upload['size']) == ('document', 'report.txt', 5)
+    
+    status = api.post(f'{BASE_URL}/admin/capture/stop').json()['result']
+    assert status['active'] is False
+    assert (status['seen'], status['captured'], status['filtered']) == (4, 2, 2)
+    assert status['file']['written'] == 2
+    
+    with gzip.open(path, 'rt') as f:
+        records = [json.loads(line) for line in f]
+    assert [record['seq'] for record in records] == [1, 2]
+    assert records[0]['token'] == '_test_token'
+    
+    har_path = tmp_path / 'capture.har'
+    mock_server.capture.start(path=str(har_path), format='har', capacity=2)
+    for i in range(3):
+        api.post(f'{BASE_URL}/bot_test_token/sendMessage', json={'chat_id': 12345, 'text': str(i)})
+    mock_server.capture.stop()
+    har = json.loads(har_path.read_text())
+    assert [entry['request']['url'] for entry in har['log']['entries']] == ['/bot_test_token/sendMessage'] * 2
+    
+    bad = api.post(f'{BASE_URL}/admin/capture/start', json={'format': 'pcap'})
+    assert bad.status_code == 400
+    
+    status = api.post(f'{BASE_URL}/admin/capture/start', json={'methods': ['getMe']}).json()['result']
+    assert status['active'] is True and status['file'] is None
+    api.post(f'{BASE_URL}/admin/capture/stop')
+
+
+def test_in_process_multipart_upload(mock_server, api):
+    """Test multipart file uploads through the in-process adapter"""
+    response = api.post(
+        f'{BASE_URL}/bot_test_token/sendDocument',
+        data={'chat_id': '12345', 'caption': 'Report'},
+        files={'document': ('report.txt', b'hello')}
+    )
+    
+    assert response.status_code == 200
+    assert response.json()['result']['caption'] == 'Report'
+    assert response.json()['result']['chat']['id'] == 12345
+
+
+def test_pytest_plugin_fixtures(supermock_server, supermock_session, supermock_base_url):
+    """Test the in-process fixtures shipped with the pytest plugin"""
+    supermock_server.send_user_message("ping")
+    
+    response = supermock_session.post(f'{supermock_base_url}/bot_test_token/getUpdates')
+    
+    assert response.json()['result'][0]['message']['text'] == "ping"
+
+
+def test_httpx_transports(mock_server):
+    """Test the sync and async httpx in-process transports"""
+    httpx = pytest.importorskip('httpx')
+    import asyncio
+    from supermock.api.httpx_transport import InProcessTransport, AsyncInProcessTransport
+    
+    with httpx.Client(transport=InProcessTransport(mock_server), base_url=BASE_URL) as client:
+        assert client.get('/bot_test_token/getMe').json()['result']['username'] == 'mock_bot'
+    
+    async def send():
+        async with httpx.AsyncClient(transport=AsyncInProcessTransport(mock_server), base_url=BASE_URL) as client:
+            response = await client.post('/bot_test_token/sendMessage', data={'chat_id': 1, 'text': 'async'})
+            return response.json()
+    
+    assert asyncio.run(send())['result']['text'] == 'async'
+
+
+def test_get_updates_offset_confirmation(mock_server, api):
+    """Test that updates stay pending until confirmed with an offset"""
+    first = mock_server.send_user_message("one")
+    second = mock_server.send_user_message("two")
+    url = f'{BASE_URL}/bot_test_token/getUpdates'
+    
+    result = api.post(url, json={'offset': 0}).json()['result']
+    assert [u['update_id'] for u in result] == [first['update_id'], second['update_id']]
+    
+    result = api.post(url, json={'offset': second['update_id']}).json()['result']
+    assert [u['update_id'] for u in result] == [second['update_id']]
+    
+    result = api.post(url, json={'offset': second['update_id'] + 1}).json()['result']
+    assert result == []
+    assert mock_server.updates_queue.empty()
+
+
+def test_start_stop_ephemeral_port():
+    """Test non-blocking start on an ephemeral port and clean shutdown"""
+    server = TelegramMockServer()
+    host, port = server.start()
+    
+    assert port != 0
+    assert server.ready.is_set()
+    response = requests.get(f'http://{host}:{port}/bot_test_token/getMe', timeout=5)
+    assert response.json()['ok'] is True
+    
+    server.stop()
+    assert not server.ready.is_set()
+    with pytest.raises(requests.ConnectionError):
+        requests.get(f'http://{host}:{port}/bot_test_token/getMe', timeout=5)
+
+
+def test_stop_drains_long_polls():
+    """Test that stop() wakes long-polling getUpdates requests"""
+    results = []
+    
+    with TelegramMockServer() as server:
+        url = f'http://{server.host}:{server.port}/bot_test_token/getUpdates'
+        poller = threading.Thread(
+            target=lambda: results.append(requests.post(url, json={'timeout': 30}, timeout=10).json())
+        )
+        poller.start()
+        while not server._inflight:
+            time.sleep(0.01)
+        started = time.monotonic()
+    
+    poller.join(5)
+    assert time.monotonic() - started < 5
+    assert results == [{'ok': True, 'result': []}]
+
+
+def test_reset_swaps_state(mock_server):
+    """Test that reset() drops updates, history, counters and settings"""
+    mock_server.send_user_message("before reset")
+    mock_server.rate_limiter.configure(enabled=True)
+    mock_server.latency.set_latency('*', kind='fixed', ms=100)
+    generation = mock_server.state.generation
+    
+    mock_server.reset()
+    
+    assert mock_server.state.generation == generation + 1
+    assert mock_server.get_messages_history() == []
+    assert mock_server.updates_queue.empty()
+    assert mock_server.message_id_counter == 1
+    assert mock_server.send_user_message("after reset")['update_id'] == 1
+    assert mock_server.rate_limiter.enabled is False
+    assert mock_server.latency.delay_for('getMe') == 0.0
+
+
+def test_recorders_added_concurrently(mock_server, api):
+    """Test that recorders added and removed from many threads are all kept or dropped"""
+    class Recorder:
+        def __init__(self):
+            self.updates = []
+            self.calls = []
+        
+        def on_update(self, update):
+            self.updates.append(update)
+        
+        def on_call(self, call):
+            self.calls.append(call)
+    
+    recorders = [Recorder() for _ in range(50)]
+    threads = [threading.Thread(target=mock_server.add_recorder, args=(r,)) for r in recorders]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    mock_server.add_recorder(recorders[0])
+    assert len(mock_server.recorders) == 50
+    
+    mock_server.send_user_message("hi")
+    api.post(f'{BASE_URL}/bot_test_token/getMe')
+    assert all(len(r.updates) == 1 and len(r.calls) == 1 for r in recorders)
+    
+    threads = [threading.Thread(target=mock_server.remove_recorder, args=(r,)) for r in recorders[:25]]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert mock_server.recorders == recorders[25:]
+
+
+def test_worker_server_fixtures(supermock_server, supermock_live_url, supermock_groups, supermock_inline):
+    """Test the shared worker server and simulator fixtures"""
+    assert supermock_server.get_messages_history() == []
+    
+    group_id = supermock_groups.create_group("Fixture Group")
+    supermock_groups.send_group_message(group_id, "hello")
+    supermock_inline.send_inline_query("query")
+    
+    response = requests.post(f'{supermock_live_url}/bot_test_token/getUpdates', timeout=5)
+    assert len(response.json()['result']) == 2
+    
+    # Leave state behind; the next test using the fixture must not see it
+    supermock_server.send_user_message("leaked?")
+
+
+def test_worker_server_is_reset(supermock_server, supermock_session, supermock_base_url):
+    """Test that resetting the worker server drops all state"""
+    supermock_server.send_user_message("pending")
+    supermock_session.post(f'{supermock_base_url}/bot_test_token/sendMessage',
+                           json={'chat_id': supermock_server.chat_id, 'text': 'reply'})
+    assert supermock_server.message_id_counter == 3
+    assert supermock_server.get_messages_history()
+    
+    supermock_server.reset()
+    
+    response = supermock_session.post(f'{supermock_base_url}/bot_test_token/getUpdates')
+    assert response.json()['result'] == []
+    assert supermock_server.get_messages_history() == []
+    assert supermock_server.message_id_counter == 1
+
+
+def test_wait_for_bot_message(mock_server, api):
+    """Test waking on bot replies instead of sleeping"""
+    url = f'{BASE_URL}/bot_test_token/sendMessage'
+    mock_server.send_user_message("/start")
+    
+    # A reply that arrives before the wait starts is still found
+    api.post(url, json={'chat_id': 12345, 'text': 'Welcome'})
+    assert mock_server.wait_for_bot_message(chat_id=12345, timeout=1)['text'] == 'Welcome'
+    
+    # The next wait returns the next reply, sent later from another thread
+    timer = threading.Timer(0.1, lambda: api.post(url, json={'chat_id': 12345, 'text': 'Menu'}))
+    timer.start()
+    started = time.monotonic()
+    message = mock_server.wait_for_bot_message(chat_id=12345, predicate=lambda m: 'Menu' in m['text'], timeout=5)
+    assert message['text'] == 'Menu'
+    assert time.monotonic() - started < 1
+    timer.join()
+    
+    with pytest.raises(TimeoutError):
+        mock_server.wait_for_bot_message(chat_id=12345, timeout=0.05)
+
+
+def test_wait_for_call_and_async_variants(mock_server, api):
+    """Test waiting for arbitrary calls, sync and async"""
+    import asyncio
+    
+    mock_server.send_callback_query("button_data")
+    api.post(f'{BASE_URL}/bot_test_token/answerCallbackQuery', json={'callback_query_id': '1'})
+    call = mock_server.wait_for_call('answerCallbackQuery', timeout=1)
+    assert call['params'] == {'callback_query_id': '1'}
+    assert call['ok'] is True
+    
+    async def scenario():
+        mock_server.send_user_message("edit please")
+        waiter = asyncio.ensure_future(mock_server.wait_for_bot_message_async(chat_id=7, timeout=5))
+        await asyncio.sleep(0)
+        threading.Thread(target=lambda: api.post(
+            f'{BASE_URL}/bot_test_token/editMessageText',
+            json={'chat_id': 7, 'message_id': 1, 'text': 'edited'}
+        )).start()
+        message = await waiter
+        
+        with pytest.raises(TimeoutError):
+            await mock_server.wait_for_call_async('deleteMessage', timeout=0.05)
+        return message
+    
+    assert asyncio.run(scenario())['text'] == 'edited'
+
+
+def test_wait_predicate_error_reaches_the_waiter(mock_server, api):
+    """Test that a raising wait predicate fails its own wait, not the bot's call"""
+    def broken(call):
+        raise KeyError('missing')
+    
+    mock_server.send_user_message("hi")
+    results = {}
+    
+    def wait(name, predicate):
+        try:
+            results[name] = mock_server.wait_for_call('sendMessage', predicate=predicate, timeout=5)
+        except Exception as e:
+            results[name] = e
+    
+    waiters = [threading.Thread(target=wait, args=('broken', broken)),
+               threading.Thread(target=wait, args=('other', None))]
+    for waiter in waiters:
+        waiter.start()
+    while len(mock_server.state.calls.waiters) < 2:
+        time.sleep(0.001)
+    
+    response = api.post(f'{BASE_URL}/bot_test_token/sendMessage', json={'chat_id': 12345, 'text': 'reply'})
+    assert response.status_code == 200
+    for waiter in waiters:
+        waiter.join(5)
+    assert isinstance(results['broken'], KeyError)
+    assert results['other']['params']['text'] == 'reply'
+    assert mock_server.state.calls.waiters == []
+
+
+def test_virtual_clock_dates_and_long_polls(mock_server, api):
+    """Test that dates, long-poll timeouts and update expiry follow the clock"""
+    mock_server.clock.use_manual(start=1_700_000_000)
+    
+    update = mock_server.send_user_message("tick")
+    assert update['message']['date'] == 1_700_000_000
+    
+    sent = api.post(f'{BASE_URL}/bot_test_token/sendMessage', json={'chat_id': 1, 'text': 'tock'}).json()
+    assert sent['result']['date'] == 1_700_000_000
+    
+    # A 30s long-poll completes as soon as 30 virtual seconds pass
+    url = f'{BASE_URL}/bot_test_token/getUpdates'
+    results = []
+    poller = threading.Thread(target=lambda: results.append(
+        api.post(url, json={'offset': update['update_id'] + 1, 'timeout': 30}).json()
+    ))
+    poller.start()
+    time.sleep(0.05)
+    assert poller.is_alive()
+    mock_server.clock.advance(30)
+    poller.join(2)
+    assert results == [{'ok': True, 'result': []}]
+    
+    # Unconfirmed updates expire after 24 hours
+    mock_server.send_user_message("stale")
+    mock_server.clock.advance(24 * 60 * 60 + 1)
+    assert api.post(url, json={}).json()['result'] == []
+
+
+def test_response_latency_correlation(mock_server, api):
+    """Test that updates are timed through delivery, first reply and last edit"""
+    url = f'{BASE_URL}/bot_test_token'
+    first = mock_server.send_user_message("/start@mock_bot")
+    second = mock_server.send_user_message("hello")
+    callback = mock_server.send_callback_query("button")
+    api.post(f'{url}/getUpdates', json={})
+    
+    # Reply to the second message explicitly, then answer the first one
+    api.post(f'{url}/sendMessage', json={'chat_id': 12345, 'text': 'Hi',
+                                         'reply_to_message_id': second['message']['message_id']})
+    sent = api.post(f'{url}/sendMessage', json={'chat_id': 12345, 'text': 'Welcome'}).json()['result']
+    api.post(f'{url}/editMessageText', json={'chat_id': 12345, 'message_id': sent['message_id'], 'text': 'Menu'})
+    api.post(f'{url}/answerCallbackQuery', json={'callback_query_id': callback['callback_query']['id']})
+    
+    stats = api.get(f'{BASE_URL}/admin/responses').json()['result']
+    assert stats['total']['delivery']['count'] == 3
+    assert stats['total']['first_reply']['count'] == 3
+    assert stats['total']['last_edit']['count'] == 1
+    assert stats['pending'] == {'undelivered': 0, 'unanswered': 0}
+    
+    groups = {(g['update_type'], g['command']): g for g in stats['groups']}
+    assert set(groups) == {('message', '/start'), ('message', None), ('callback_query', None)}
+    assert groups[('message', '/start')]['last_edit']['count'] == 1
+    assert first['update_id'] < second['update_id']
+    
+    mock_server.reset()
+    assert mock_server.response_stats()['total']['delivery']['count'] == 0
+
+
+def test_inject_batch_and_jsonl_endpoint(mock_server, api):
+    """Test bulk injection from Python and over the admin endpoint"""
+    mock_server.send_user_message("before")
+    updates = mock_server.inject_batch([
+        "one",
+        {"text": "two", "chat_id": 777},
+        {"callback_data": "press"},
+        {"update": {"inline_query": {"id": "q1", "from": {"id": 1}, "query": "cats", "offset": ""}}},
+        {"text": "three", "chat_id": "777"}
+    ])
+    
+    assert [u['update_id'] for u in updates] == [2, 3, 4, 5, 6]
+    assert updates[1]['message']['chat']['id'] == 777
+    # Message IDs are numbered per chat, and string chat IDs share the numeric chat
+    assert updates[0]['message']['message_id'] == 2
+    assert updates[1]['message']['message_id'] == 1
+    assert updates[4]['message']['chat'] is updates[1]['message']['chat']
+    assert updates[4]['message']['message_id'] == 2
+    assert updates[2]['callback_query']['message']['message_id'] == updates[0]['message']['message_id']
+    assert mock_server.message_id_counter == 3
+    assert len(mock_server.get_messages_history()) == 4
+    
+    body = '\n'.join('{"text": "bulk %d"}' % i for i in range(1000))
+    response = api.post(f'{BASE_URL}/admin/updates/batch', data=body,
+                        headers={'Content-Type': 'application/x-ndjson'})
+    assert response.json()['result'] == {'count': 1000, 'first_update_id': 7, 'last_update_id': 1006}
+    
+    fetched = api.post(f'{BASE_URL}/bot_test_token/getUpdates', json={'offset': 7, 'limit': 100}).json()['result']
+    assert [u['message']['text'] for u in fetched[:2]] == ['bulk 0', 'bulk 1']
+    assert mock_server.updates_queue.qsize() == 1000
+    
+    response = api.post(f'{BASE_URL}/admin/updates/batch', data='not json')
+    assert response.status_code == 400
+
+
+def test_admin_control_plane(mock_server, api):
+    """Test driving every simulator through the /admin/ API"""
+    admin = f'{BASE_URL}/admin'
+    
+    def call(method, path, **kwargs):
+        body = api.request(method, f'{admin}{path}', **kwargs).json()
+        assert body['ok'], body
+        return body['result']
+    
+    # Private messages from any user, and button presses
+    update = call('POST', '/messages', json={'text': 'hi', 'user_id': 4242})
+    assert update['message']['chat']['id'] == 4242
+    assert update['message']['from']['id'] == 4242
+    press = call('POST', '/callbacks', json={'data': 'yes', 'user_id': 4242})
+    assert press['callback_query']['data'] == 'yes'
+    assert call('GET', '/messages', params={'since': 0})[0]['message']['text'] == 'hi'
+    
+    # Groups
+    snapshot_id = call('POST', '/snapshots')['snapshot_id']
+    group = call('POST', '/groups', json={'title': 'Team', 'member_count': 5, 'supergroup': True})
+    group_id = group['chat']['id']
+    assert group['member_count'] == 5
+    assert call('POST', f'/groups/{group_id}/messages', json={'text': 'yo'})['message']['chat']['id'] == group_id
+    command = call('POST', f'/groups/{group_id}/commands', json={'command': '/help'})
+    assert command['message']['text'] == '/help@mock_bot'
+    assert call('POST', f'/groups/{group_id}/members', json={'count': 3})['member_count'] == 8
+    joined = call('POST', f'/groups/{group_id}/join', json={})['message']['new_chat_members'][0]
+    call('POST', f'/groups/{group_id}/leave', json={'user_id': joined['id']})
+    assert call('DELETE', f'/groups/{group_id}/members/{joined["id"]}') is False
+    assert len(call('GET', f'/groups/{group_id}', params={'members': 1})['members']) == 8
+    chatter = call('POST', f'/groups/{group_id}/chatter', json={'rate': 1000, 'count': 5, 'seed': 1})
+    assert mock_server.control_plane.chatters[chatter['chatter_id']].wait(5)
+    assert call('GET', f'/chatter/{chatter["chatter_id"]}')['sent'] == 5
+    
+    # Inline mode
+    query = call('POST', '/inline/queries', json={'query': 'cats', 'user_id': 4242})
+    assert query['inline_query']['from']['id'] == 4242
+    call('POST', '/inline/chosen', json={'result_id': '1', 'query': 'cats'})
+    
+    # Waiting for the bot
+    api.post(f'{BASE_URL}/bot_test_token/sendMessage', json={'chat_id': 4242, 'text': 'hello'})
+    assert call('POST', '/wait', json={'chat_id': 4242, 'timeout': 1})['text'] == 'hello'
+    assert api.post(f'{admin}/wait', json={'method': 'deleteMessage', 'timeout': 0.05}).status_code == 408
+    
+    # Errors, restore and reset
+    assert api.post(f'{admin}/groups/-1/messages', json={'text': 'x'}).status_code == 404
+    call('POST', f'/snapshots/{snapshot_id}/restore')
+    assert call('GET', '/groups') == []
+    assert len(call('GET', '/messages')) == 1
+    call('POST', '/reset')
+    assert call('GET', '/messages') == []
+
+
 if __name__ == '__main__':
     pytest.main([__file__, '-v'])
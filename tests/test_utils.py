@@ -5,8 +5,12 @@ Unit tests for utility modules
 import pytest
 import json
 import tempfile
+import threading
+import time
+from datetime import datetime
 from pathlib import Path
-from supermock.utils import Config, HistoryManager
+from supermock.utils import Config, HistoryManager, RateLimiter, LatencyInjector, Clock, LatencyHistogram, Logger
+from supermock.api import TelegramMockServer, create_session, IN_PROCESS_BASE_URL
 
 
 def test_config_default():
@@ -49,6 +53,162 @@ def test_config_load_from_json():
         Path(config_file).unlink()
 
 
+def test_settings_are_compiled_and_isolated():
+    """Test that configs do not share defaults and compile to read-only settings"""
+    config = Config()
+    config.set('bot.username', 'other_bot')
+    assert Config().get('bot.username') == 'mock_bot'
+    assert Config.DEFAULT_CONFIG['bot']['username'] == 'mock_bot'
+    
+    settings = config.settings()
+    assert settings.bot.username == 'other_bot'
+    assert settings.bot_user == {"id": 123456789, "is_bot": True, "first_name": "MockBot", "username": "other_bot"}
+    assert settings.get('server.port') == 8081
+    assert config.settings() is settings
+    with pytest.raises(AttributeError):
+        settings.bot.username = 'changed'
+    with pytest.raises(AttributeError):
+        settings.bot_user = {}
+    assert not hasattr(settings.bot, 'missing')
+    
+    server = TelegramMockServer(settings=settings)
+    assert server.send_user_message("/start")['message']['chat']['id'] == settings.user.id
+    assert server.port == 8081
+
+
+def test_server_hot_reloads_config():
+    """Test that latency, rate-limit and retention changes apply to a running server"""
+    with tempfile.NamedTemporaryFile(mode='w', suffix='.json', delete=False) as f:
+        json.dump({'bot': {'username': 'first_bot'}}, f)
+        config_file = f.name
+    
+    try:
+        server = TelegramMockServer(settings=Config(config_file).settings())
+        watcher = server.watch_config(config_file, interval=60)
+        assert server.latency.delay_for('sendMessage') == 0.0
+        assert not server.rate_limiter.enabled
+        
+        with open(config_file, 'w') as f:
+            json.dump({
+                'bot': {'username': 'second_bot'},
+                'latency': {'rules': [{'method': 'sendMessage', 'kind': 'fixed', 'ms': 250}]},
+                'rate_limit': {'enabled': True, 'chat_rate': 5},
+                'retention': {'calls': 10}
+            }, f)
+        assert watcher.check()
+        
+        assert server.latency.delay_for('sendMessage') == 0.25
+        assert server.rate_limiter.enabled and server.rate_limiter.limits['chat_rate'] == 5
+        assert server.state.calls.calls.maxlen == 10
+        # Identity settings need a restart
+        assert server.settings.bot.username == 'first_bot'
+        
+        # A broken file keeps the current settings
+        Path(config_file).write_text('{not json')
+        assert not watcher.check()
+        assert watcher.last_error is not None
+        assert server.latency.delay_for('sendMessage') == 0.25
+        
+        # Reset returns to the configured settings, not the built-in defaults
+        server.reset()
+        assert server.latency.delay_for('sendMessage') == 0.25
+        server.stop()
+        assert server.config_watcher is None
+    finally:
+        Path(config_file).unlink()
+
+
+def test_cli_server_options_survive_reset_and_reload():
+    """Test that --rate-limit and --latency are kept by reset() and config reloads"""
+    import argparse
+    from supermock.cli import apply_server_options
+    
+    args = argparse.Namespace(access_log=False, log_format=None, rate_limit=True, latency=300.0, latency_jitter=0.0)
+    with tempfile.NamedTemporaryFile(mode='w', suffix='.json', delete=False) as f:
+        json.dump({'latency': {'rules': [{'method': '*', 'kind': 'fixed', 'ms': 10}]}}, f)
+        config_file = f.name
+    
+    try:
+        config = Config(config_file)
+        apply_server_options(config, args)
+        server = TelegramMockServer(settings=config.settings())
+        server.reset()
+        assert server.rate_limiter.enabled
+        assert server.latency.delay_for('getMe') == 0.3
+        
+        watcher = server.watch_config(config_file, interval=60,
+                                      customize=lambda reloaded: apply_server_options(reloaded, args))
+        with open(config_file, 'w') as f:
+            json.dump({'latency': {'rules': [{'method': 'sendMessage', 'kind': 'fixed', 'ms': 50}]}}, f)
+        assert watcher.check()
+        assert server.rate_limiter.enabled
+        assert server.latency.delay_for('getMe') == 0.3
+        assert server.latency.delay_for('sendMessage') == 0.05
+        server.stop()
+    finally:
+        Path(config_file).unlink()
+
+
+def test_async_logger_drops_instead_of_blocking():
+    """Test that a full log queue drops and counts records while the writer is stuck"""
+    class SlowStream:
+        def __init__(self):
+            self.lines = []
+            self.release = threading.Event()
+        
+        def write(self, text):
+            self.release.wait(5)
+            self.lines.append(text)
+        
+        def flush(self):
+            pass
+    
+    stream = SlowStream()
+    logger = Logger("supermock.test.drop", json_format=True, asynchronous=True, queue_size=2, stream=stream)
+    started = time.perf_counter()
+    for i in range(100):
+        logger.info("event", seq=i)
+    assert time.perf_counter() - started < 1.0
+    
+    stream.release.set()
+    logger.close()
+    stats = logger.stats()
+    assert stats['dropped'] > 0
+    assert stats['queued'] + stats['dropped'] == 100
+    records = [json.loads(line) for line in ''.join(stream.lines).splitlines()]
+    assert len(records) == stats['queued']
+    assert records[0]['message'] == "event" and records[0]['seq'] == 0
+
+
+def test_server_access_log_sampling():
+    """Test structured access records with per-method sampling and level overrides"""
+    import io
+    stream = io.StringIO()
+    logger = Logger("supermock.test.access", json_format=True, asynchronous=True, access_log=True,
+                    sample={"getUpdates": 10}, method_levels={"getMe": "WARNING"}, stream=stream)
+    server = TelegramMockServer(logger=logger)
+    session = create_session(server)
+    for _ in range(20):
+        session.post(f"{IN_PROCESS_BASE_URL}/botTOKEN/getUpdates", json={'timeout': 0})
+    session.post(f"{IN_PROCESS_BASE_URL}/botTOKEN/getMe")
+    session.post(f"{IN_PROCESS_BASE_URL}/botTOKEN/sendMessage", json={'chat_id': 42, 'text': 'hi'})
+    logger.close()
+    
+    records = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert [r['method'] for r in records] == ['getUpdates', 'getUpdates', 'sendMessage']
+    assert records[-1]['status'] == 200 and records[-1]['chat_id'] == 42
+    assert records[-1]['duration_ms'] >= 0
+    assert logger.stats()['filtered'] == 19
+    
+    # Unknown level names are rejected up front, not on the first request
+    with pytest.raises(ValueError):
+        Logger("supermock.test.bad", method_levels={"sendMessage": "VERBOSE"}, access_log=True)
+    config = Config()
+    config.set('logging.method_levels', {"sendMessage": "VERBOSE"})
+    with pytest.raises(ValueError):
+        config.settings()
+
+
 def test_history_manager_save_load():
     """Test saving and loading history"""
     with tempfile.NamedTemporaryFile(delete=False, suffix='.json') as f:
@@ -128,5 +288,164 @@ def test_history_manager_export_txt():
         Path(export_file).unlink(missing_ok=True)
 
 
+def test_rate_limiter_per_chat_and_group():
+    """Test per-chat and per-group token buckets"""
+    limiter = RateLimiter(enabled=True, chat_rate=1, chat_burst=1, group_rate=1, group_burst=2)
+    
+    assert limiter.check('bot', 12345, now=0.0) == 0
+    assert limiter.check('bot', 12345, now=0.1) == 1
+    assert limiter.check('bot', 12345, now=1.1) == 0
+    
+    assert limiter.check('bot', -100, now=2.0) == 0
+    assert limiter.check('bot', -100, now=2.0) == 0
+    assert limiter.check('bot', -100, now=2.0) == 1
+    
+    counters = limiter.stats()['bots']['bot']
+    assert counters['requests'] == 6
+    assert counters['chat'] == 1
+    assert counters['group'] == 1
+
+
+def test_rate_limiter_global_limit():
+    """Test the global limit and retry_after rounding"""
+    limiter = RateLimiter(enabled=True, global_rate=0.25, global_burst=2, chat_burst=100)
+    
+    assert limiter.check('bot', 1, now=0.0) == 0
+    assert limiter.check('bot', 2, now=0.0) == 0
+    assert limiter.check('bot', 3, now=0.0) == 4
+    assert limiter.check('other_bot', 3, now=0.0) == 0
+    assert limiter.stats()['bots']['bot']['global'] == 1
+    
+    with pytest.raises(ValueError):
+        limiter.configure(chat_rate=0)
+    with pytest.raises(ValueError):
+        limiter.configure(unknown_rate=1)
+
+
+def test_latency_rule_precedence():
+    """Test latency rules from most to least specific"""
+    injector = LatencyInjector(seed=1)
+    assert injector.delay_for('sendMessage') == 0.0
+    
+    injector.set_latency('*', kind='fixed', ms=100)
+    injector.set_latency('sendMessage', kind='fixed', ms=300)
+    injector.set_latency('*', token='slow_bot', kind='fixed', ms=1000)
+    
+    assert injector.delay_for('getMe') == 0.1
+    assert injector.delay_for('sendMessage') == 0.3
+    assert injector.delay_for('sendMessage', token='slow_bot') == 1.0
+    
+    injector.clear()
+    assert injector.delay_for('sendMessage') == 0.0
+
+
+def test_latency_models():
+    """Test sampled latency distributions"""
+    injector = LatencyInjector(seed=42)
+    
+    injector.set_latency('getUpdates', kind='uniform', min_ms=10, max_ms=20)
+    assert all(0.01 <= injector.delay_for('getUpdates') <= 0.02 for _ in range(100))
+    
+    injector.set_latency('getUpdates', kind='replay', samples=[5, 7])
+    assert {injector.delay_for('getUpdates') for _ in range(100)} == {0.005, 0.007}
+    
+    injector.set_latency('getUpdates', kind='lognormal', median_ms=300, sigma=0.5)
+    delays = sorted(injector.delay_for('getUpdates') for _ in range(1001))
+    assert 0.25 < delays[500] < 0.35
+    
+    with pytest.raises(ValueError):
+        injector.set_latency('getUpdates', kind='gaussian')
+
+
+def test_clock_modes():
+    """Test real, frozen and manual clock modes"""
+    clock = Clock()
+    assert abs(clock.time() - time.time()) < 1
+    
+    clock.freeze(at=1_000_000)
+    assert clock.timestamp() == 1_000_000
+    clock.advance(5)
+    assert clock.timestamp() == 1_000_005
+    
+    clock.use_manual(start=2_000_000)
+    clock.advance(3600)
+    assert clock.time() == 2_003_600
+    assert clock.monotonic() == 2_003_600
+    assert clock.now().year == datetime.fromtimestamp(2_003_600).year
+    
+    with pytest.raises(ValueError):
+        clock.advance(-1)
+    
+    clock.use_real()
+    with pytest.raises(RuntimeError):
+        clock.advance(1)
+
+
+def test_clock_manual_sleep_wakes_on_advance():
+    """Test that manual-mode sleeps complete when time is advanced"""
+    clock = Clock(Clock.MANUAL, start=0)
+    sleeper = threading.Thread(target=clock.sleep, args=(3600,))
+    sleeper.start()
+    
+    # The sleeper registers after computing its deadline
+    started = time.monotonic()
+    while not clock._waiting and time.monotonic() - started < 2:
+        time.sleep(0.001)
+    clock.advance(1800)
+    sleeper.join(0.1)
+    assert sleeper.is_alive()
+    
+    clock.advance(1800)
+    sleeper.join(2)
+    assert not sleeper.is_alive()
+
+
+def test_latency_histogram_percentiles():
+    """Test that histogram percentiles stay within the configured precision"""
+    histogram = LatencyHistogram(significant_digits=2)
+    for ms in range(1, 10001):
+        histogram.record(ms / 1000)
+    
+    summary = histogram.summary()
+    assert summary['count'] == 10000
+    assert summary['min'] == 1.0
+    assert summary['max'] == 10000.0
+    assert abs(summary['p50'] - 5000) <= 50
+    assert abs(summary['p99'] - 9900) <= 99
+    assert len(histogram.counts) < 2000
+    
+    other = LatencyHistogram()
+    other.record(20)
+    histogram.merge(other)
+    assert histogram.percentile(1.0) == 20000.0
+    assert LatencyHistogram().summary()['p50'] == 0.0
+
+
+
+def test_collapsed_stacks_bounded_on_dense_call_graphs():
+    """Test that collapsing a call graph with exponentially many paths stays bounded and keeps the time"""
+    from supermock.utils.profiler import _collapse_stacks
+    
+    # Every function of a layer calls both functions of the next: 2**40 paths
+    layers = 40
+    funcs = [[('app.py', i * 10 + j, f'f{i}_{j}') for j in range(2)] for i in range(layers)]
+    root = ('app.py', 1, 'main')
+    stats = {root: (1, 1, 1.0, 1.0 + 2 * layers, {})}
+    for i in range(layers):
+        cumtime = float(layers - i)
+        if i == 0:
+            callers = {root: (1, 1, 1.0, cumtime)}
+        else:
+            callers = {caller: (1, 1, 0.5, cumtime / 2) for caller in funcs[i - 1]}
+        for func in funcs[i]:
+            stats[func] = (1, 1, 1.0, cumtime, callers)
+    
+    started = time.perf_counter()
+    stacks = _collapse_stacks(stats, max_frames=5000)
+    assert time.perf_counter() - started < 5
+    assert len(stacks) < 5000
+    assert abs(sum(stacks.values()) / 1e6 - stats[root][3]) < 1
+
+
 if __name__ == '__main__':
     pytest.main([__file__, '-v'])